@@ -0,0 +1,181 @@
+"""
+Background artifact loading and hot reload for cps_app.py and prediction_service.py.
+
+Loading the encoders imports sklearn and loading the model reads hundreds of
+MB, so the app starts both on a thread and renders its static tabs meanwhile.
+The encoders load first along with the small cutoff index, which can answer
+before the forest is loaded. The Predict button only waits if the chosen
+engine is still loading.
+
+With a watch interval the same thread then polls predictor.model_version().
+When the artifacts on disk change and stay unchanged for one more interval (so
+a retrain that is still writing files is not picked up), the new version is
+loaded off to the side, checked against the model bundle's checksums and
+with predictor.smoke_test(), and swapped in by replacing one reference.
+Requests that already took the old artifacts finish on them. A version that
+fails to load or validate is skipped until the files change again, and the
+old one keeps serving.
+
+Startup events are timestamped in EVENTS (time.perf_counter seconds, first
+occurrence per process) so bench_startup.py can report time to first render.
+
+Configuration (environment variables):
+    CPS_RELOAD_INTERVAL  Seconds between version checks, 0 disables hot reload (default: 10)
+    CPS_MODEL_URL        Fetch the model bundle from here at startup if it is missing (see download_models.py)
+"""
+
+import os
+import threading
+import time
+
+EVENTS = {}
+DEFAULT_RELOAD_INTERVAL = 10.0
+
+
+def mark(event):
+    """Record when event first happened in this process"""
+    EVENTS.setdefault(event, time.perf_counter())
+
+
+class ArtifactLoader:
+    """Loads the encoders and cutoff index, then the model, on a daemon thread that then watches for new versions"""
+
+    def __init__(self, prefer_engine=True, watch_interval=0, on_swap=None):
+        self.prefer_engine = prefer_engine
+        self.watch_interval = watch_interval
+        self.on_swap = on_swap
+        # (label_encoders, le_target, cutoff_index) and
+        # (model, label_encoders, le_target, lookup_table, version); each replaced whole on reload
+        self.encoders = None
+        self.artifacts = None
+        self.error = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.reload_failures = 0
+        self.reload_error = None
+        self.placeholder = False
+        self._encoders_ready = threading.Event()
+        self._model_ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='artifact-loader', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, prefer_engine=True, on_swap=None):
+        """Build a loader that hot reloads every CPS_RELOAD_INTERVAL seconds"""
+        interval = float(os.environ.get('CPS_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL))
+        return cls(prefer_engine, interval, on_swap)
+
+    def _run(self):
+        try:
+            # Imported here so numpy and the forest engine load off the render path too
+            from model_bundle import BUNDLE_DIR, is_placeholder
+            from predictor import (check_model, load_cutoff_index, load_encoders, load_lookup_table, load_model,
+                                   model_version)
+
+            model_url = os.environ.get('CPS_MODEL_URL')
+            if model_url and not os.path.exists(BUNDLE_DIR):
+                # A fresh replica; others on the host share the download through the fetch cache
+                from download_models import fetch_bundle
+                stats = fetch_bundle(model_url)
+                print(f"✅ {BUNDLE_DIR} fetched in {stats['time_to_ready_seconds']:.2f}s")
+            version = model_version()
+            label_encoders, le_target = load_encoders()
+            self.encoders = (label_encoders, le_target, load_cutoff_index(label_encoders, le_target))
+            mark('encoders_ready')
+            self._encoders_ready.set()
+            model = load_model(self.prefer_engine)
+            check_model(model, label_encoders, le_target)
+            self.placeholder = is_placeholder()
+            self.artifacts = (model, label_encoders, le_target, load_lookup_table(label_encoders, le_target), version)
+            self.loaded_at = time.time()
+            mark('model_ready')
+        except Exception as e:
+            self.error = e
+        finally:
+            self._encoders_ready.set()
+            self._model_ready.set()
+        if self.error is None and self.watch_interval > 0:
+            self._watch()
+
+    def _watch(self):
+        """Poll the artifact version and reload once a new one has settled"""
+        from predictor import model_version
+
+        pending = failed = None
+        while True:
+            time.sleep(self.watch_interval)
+            version = model_version()
+            if version in (self.artifacts[-1], failed):
+                pending = None
+                continue
+            if version != pending:
+                # Changed since the last check; give a retrain one more interval to finish writing
+                pending = version
+                continue
+            pending = None
+            try:
+                self.reload()
+            except Exception as e:
+                failed = version
+                self.reload_failures += 1
+                self.reload_error = f'{type(e).__name__}: {e}'
+                print(f"⚠️  Reload of model version {version} failed, still serving "
+                      f"{self.artifacts[-1]}: {self.reload_error}")
+
+    def reload(self):
+        """Load the artifacts on disk, smoke test them and swap them in; returns the new version"""
+        from model_bundle import BUNDLE_DIR, is_placeholder, verify_bundle
+        from predictor import (load_cutoff_index, load_encoders, load_lookup_table, load_model, model_version,
+                               smoke_test)
+
+        # Read before loading: if the files change meanwhile, the next check sees a newer version
+        version = model_version()
+        if os.path.exists(BUNDLE_DIR):
+            # Off the request path, so every checksum is checked, not only the small files'
+            verify_bundle(BUNDLE_DIR)
+        label_encoders, le_target = load_encoders()
+        cutoff_index = load_cutoff_index(label_encoders, le_target)
+        model = load_model(self.prefer_engine)
+        smoke_test(model, label_encoders, le_target, cutoff_index)
+        artifacts = (model, label_encoders, le_target, load_lookup_table(label_encoders, le_target), version)
+
+        self.artifacts = artifacts
+        self.encoders = (label_encoders, le_target, cutoff_index)
+        self.placeholder = is_placeholder()
+        self.loaded_at = time.time()
+        self.reloads += 1
+        self.reload_error = None
+        if self.on_swap is not None:
+            self.on_swap(artifacts)
+        print(f"✅ Model version {version} loaded and swapped in")
+        return version
+
+    @property
+    def ready(self):
+        """True once the model has loaded successfully"""
+        return self._model_ready.is_set() and self.error is None
+
+    def wait_encoders(self, timeout=None):
+        """Block until the encoders are loaded; returns (label_encoders, le_target, cutoff_index)"""
+        self._encoders_ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.encoders
+
+    def wait_model(self, timeout=None):
+        """Block until everything is loaded; returns (model, label_encoders, le_target, lookup_table, version)"""
+        self._model_ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.artifacts
+
+    def status(self):
+        """Active version and reload counters, for the UI and health checks"""
+        return {
+            'version': self.artifacts[-1] if self.artifacts is not None else None,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'reload_failures': self.reload_failures,
+            'reload_error': self.reload_error,
+            'placeholder': self.placeholder,
+        }
@@ -0,0 +1,76 @@
+"""
+Memory-mappable array artifacts.
+
+An artifact is a directory holding one uncompressed .npy file per array plus a
+small meta.json. Loading with mmap maps each array read-only, so every process
+on a host shares the same pages through the OS page cache and cold load does
+not copy the arrays into the process heap. Saving writes a new directory and
+renames it into place, so processes that mapped the old files keep working.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+
+def save_arrays(path, arrays, meta=None):
+    """Write a dict of arrays and JSON metadata to an artifact directory, replacing it in whole"""
+    # Never rewrite a .npy in place: other processes may have it memory-mapped,
+    # and truncating a mapped file kills them with SIGBUS on their next read
+    path = os.path.normpath(path)
+    staging = path + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(array))
+    meta = dict(meta or {})
+    meta['format_version'] = FORMAT_VERSION
+    meta['arrays'] = sorted(arrays)
+    with open(os.path.join(staging, META_FILE), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    replace_dir(staging, path)
+
+
+def replace_dir(staging, path):
+    """Rename a complete directory over path; processes mapping the old files keep reading them"""
+    old = f'{path}.old{os.getpid()}'
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(staging, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def load_arrays(path, mmap=True):
+    """Return (arrays, meta) from an artifact directory, memory-mapped read-only by default"""
+    with open(os.path.join(path, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format in {path}: {meta.get('format_version')}")
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in meta['arrays']
+    }
+    return arrays, meta
+
+
+def artifact_version(paths):
+    """Fingerprint files and artifact directories by name, size and modification time"""
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            # Recursive, so a file rewritten inside the model bundle's subdirectories counts
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file_path in files:
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                digest.update(f'{file_path}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
@@ -0,0 +1,106 @@
+"""
+Benchmark the vectorized cleaning pipeline against the row-wise reference.
+
+Builds a synthetic raw dataset with the same quirks as the CAP-round dumps
+(institute codes, stray whitespace and symbols, messy locations, missing values,
+duplicates), cleans it both ways and checks that the CSV output is byte-identical.
+
+Usage:
+    python bench_clean_data.py                 # 10M rows
+    python bench_clean_data.py --rows 1000000
+"""
+
+import argparse
+import hashlib
+import time
+
+import numpy as np
+import pandas as pd
+
+from clean_data import clean_dataset
+
+CITIES = [
+    'Pune', 'Mumbai City', 'Navi Mumbai', 'Nashik Road', 'Nagpur.', 'Thane (W)', 'Aurangabad',
+    'Kolhapur', 'Raigad.', 'Savitribai Phule Pune University', 'Amravati', 'Solapur  Dist',
+    'Sangli!', 'Jalgaon', 'Ratnagiri', '', '  Latur, MH ',
+]
+COURSES = [
+    'Computer Engineering', 'Information  Technology', 'Mechanical Engineering',
+    'Electronics & Telecommunication Engg', 'Civil Engineering',
+    'Artificial Intelligence (AI) and Data Science', 'Chemical\nEngineering', 'Electrical Engg.',
+    'Instrumentation & Control', 'IT', 'Automobile Engineering *',
+]
+
+
+class _HashWriter:
+    """File-like object that hashes whatever is written to it"""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        self.digest.update(text.encode())
+
+
+def make_raw_dataset(n_rows, n_institutes=600, seed=0):
+    """Build a synthetic raw dataset with realistic repetition and noise"""
+    rng = np.random.default_rng(seed)
+    institutes = np.array([
+        f"{1000 + i} - {'Govt. ' if i % 7 == 0 else ''}Institute  of Technology #{i}, "
+        f"{CITIES[i % len(CITIES)]}" if i % 50 else 'X'
+        for i in range(n_institutes)
+    ], dtype=object)
+    institute = rng.integers(0, n_institutes, n_rows)
+    base = rng.uniform(20, 99, n_institutes)
+    percentiles = np.clip(base[institute] + rng.normal(0, 3, n_rows), 0, 100).round(4)
+
+    data = pd.DataFrame({
+        'Institute Name': institutes[institute],
+        'Course Name': np.array(COURSES, dtype=object)[rng.integers(0, len(COURSES), n_rows)],
+        'Location': np.array(CITIES, dtype=object)[institute % len(CITIES)],
+        'Percentile': pd.Series(percentiles).astype(str) + ' (' + pd.Series(institute).astype(str) + ')',
+    })
+    missing = rng.random(n_rows) < 0.005
+    data.loc[missing, 'Location'] = np.nan
+    return data
+
+
+def csv_digest(data):
+    writer = _HashWriter()
+    data.to_csv(writer, index=False)
+    return writer.digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark clean_data.py pipelines')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    print(f"Building synthetic dataset with {args.rows:,} rows...")
+    raw = make_raw_dataset(args.rows)
+
+    print("Cleaning row-wise...")
+    start = time.perf_counter()
+    rowwise = clean_dataset(raw.copy(), vectorized=False, verbose=False)
+    rowwise_time = time.perf_counter() - start
+
+    print("Cleaning vectorized...")
+    start = time.perf_counter()
+    vectorized = clean_dataset(raw.copy(), vectorized=True, verbose=False)
+    vectorized_time = time.perf_counter() - start
+
+    identical = csv_digest(rowwise) == csv_digest(vectorized)
+
+    print("\n" + "="*60)
+    print("CLEANING BENCHMARK")
+    print("="*60)
+    print(f"Rows in:              {args.rows:,}")
+    print(f"Rows out:             {len(vectorized):,}")
+    print(f"Row-wise apply:       {rowwise_time:.2f}s")
+    print(f"Vectorized:           {vectorized_time:.2f}s")
+    print(f"Speedup:              {rowwise_time / vectorized_time:.1f}x")
+    print(f"Byte-identical CSV:   {'✅ yes' if identical else '❌ NO'}")
+
+
+if __name__ == '__main__':
+    main()
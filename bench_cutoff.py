@@ -0,0 +1,139 @@
+"""
+Benchmark the cutoff-index engine against the forest.
+
+On the held-out split used by train_model.py, compares:
+    - single-query latency (p50/p95/p99) of the cutoff index, the live forest
+      and, if it was built, the precomputed lookup table
+    - batch throughput of the cutoff index and the forest
+    - agreement: how often both engines rank the same college first, and the
+      share of the cutoff index's results that are also in the forest's top 7
+    - top-1 and top-7 hit rates of each engine against the actual institute
+
+The served index is built from every row, so agreement and hit rates use an
+index built from the forest's training split instead.
+
+Usage:
+    python bench_cutoff.py
+    python bench_cutoff.py --val-rows 2000 --output cutoff_results.json
+"""
+
+import argparse
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+
+from compress_model import sample_rows, split_features
+from cutoff_index import CutoffIndex
+from predictor import (TOP_K, check_model, load_cutoff_index, load_encoders, load_lookup_table, load_model,
+                       predict_one, predict_top_k)
+
+
+def latency_ms(predict, queries):
+    """p50/p95/p99 of predict(course, location, score) over the queries, in milliseconds"""
+    predict(*queries[0])
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        predict(*query)
+        timings.append(time.perf_counter() - start)
+    p50, p95, p99 = np.percentile(np.array(timings) * 1000, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def hit_rates(codes, targets):
+    return {f'top{k}': float((codes[:, :k] == targets[:, None]).any(axis=1).mean()) for k in (1, TOP_K)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the cutoff-index engine with the forest')
+    parser.add_argument('--data', default=None,
+                        help='Cleaned dataset (default: dataset_cleaned.parquet, else dataset_cleaned.csv)')
+    parser.add_argument('--val-rows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=1000, help='Single queries to time per engine')
+    parser.add_argument('--sklearn', action='store_true', help='Compare against model.pkl instead of the engine')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    label_encoders, le_target = load_encoders()
+    cutoff_index = load_cutoff_index(label_encoders, le_target)
+    if cutoff_index is None:
+        print("❌ cutoff_index not found or built for another model. Run train_model.py first.")
+        return
+    model = load_model(prefer_engine=not args.sklearn)
+    check_model(model, label_encoders, le_target)
+    lookup_table = load_lookup_table(label_encoders, le_target)
+    data_file = args.data or ('dataset_cleaned.parquet' if os.path.exists('dataset_cleaned.parquet')
+                              else 'dataset_cleaned.csv')
+
+    print("="*60)
+    print("CUTOFF INDEX VS FOREST")
+    print("="*60)
+    X_train, X, y_train, y = split_features(data_file, label_encoders, le_target)
+    X, y = sample_rows(X, y, args.val_rows)
+    scores, courses, locations = X[:, 0], X[:, 1].astype(np.int64), X[:, 2].astype(np.int64)
+    print(f"Validation rows: {len(X)}")
+    print(f"Cutoff index: {cutoff_index.n_groups} distributions, {cutoff_index.nbytes / 1e6:.2f}MB")
+    # The served index holds every row, held-out ones included, so accuracy is measured
+    # on one built the same way from the forest's training split
+    held_out_index = CutoffIndex.build(
+        X_train[:, 0], X_train[:, 1].astype(np.int64), X_train[:, 2].astype(np.int64), y_train,
+        len(label_encoders['Course Name'].classes_), len(label_encoders['Location'].classes_),
+        len(le_target.classes_), bandwidth=cutoff_index.bandwidth,
+    )
+
+    queries = [(courses[i], locations[i], scores[i]) for i in range(min(args.requests, len(X)))]
+    results = {'latency': {
+        'cutoff_index': latency_ms(cutoff_index.predict_one, queries),
+        'forest': latency_ms(lambda c, l, s: predict_one(model, None, c, l, s), queries),
+    }}
+    if lookup_table is not None:
+        # Snap to the grid so every query is a table hit
+        grid_queries = [(c, l, round(s / lookup_table.step) * lookup_table.step) for c, l, s in queries]
+        results['latency']['lookup_table'] = latency_ms(
+            lambda c, l, s: predict_one(model, lookup_table, c, l, s), grid_queries)
+    print(f"\n{'single query':<16} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for engine, values in results['latency'].items():
+        print(f"{engine:<16} {values['p50_ms']:>8.4f}ms {values['p95_ms']:>8.4f}ms {values['p99_ms']:>8.4f}ms")
+
+    start = time.perf_counter()
+    cutoff_codes, _ = held_out_index.predict_top_k(courses, locations, scores, TOP_K)
+    cutoff_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    forest_codes, _ = predict_top_k(model, X, TOP_K)
+    forest_seconds = time.perf_counter() - start
+    forest_codes = model.classes_[forest_codes]
+    results['rows_per_sec'] = {'cutoff_index': len(X) / cutoff_seconds, 'forest': len(X) / forest_seconds}
+    print(f"\n{'batch':<16} {'rows/sec':>12}")
+    for engine, rate in results['rows_per_sec'].items():
+        print(f"{engine:<16} {rate:>12,.0f}")
+
+    returned = cutoff_codes >= 0
+    answered = returned[:, 0]
+    in_forest = (cutoff_codes[:, :, None] == forest_codes[:, None, :]).any(axis=2)
+    results['agreement'] = {
+        'top1': float((cutoff_codes[:, 0] == forest_codes[:, 0]).mean()),
+        'cutoff_in_forest_top7': float(in_forest[returned].mean()) if returned.any() else 0.0,
+        'mean_results': float(returned.sum(axis=1).mean()),
+        'unanswered': float(1 - answered.mean()),
+    }
+    results['hit_rates'] = {'cutoff_index': hit_rates(cutoff_codes, y), 'forest': hit_rates(forest_codes, y)}
+    agreement = results['agreement']
+    print(f"\nSame first college:              {agreement['top1'] * 100:.2f}%")
+    print(f"Cutoff results in forest top {TOP_K}:  {agreement['cutoff_in_forest_top7'] * 100:.2f}%")
+    print(f"Cutoff results per query:        {agreement['mean_results']:.2f} "
+          f"({agreement['unanswered'] * 100:.2f}% with none reachable)")
+    for engine, rates in results['hit_rates'].items():
+        print(f"{engine:<16} top-1 {rates['top1'] * 100:6.2f}%   top-{TOP_K} {rates[f'top{TOP_K}'] * 100:6.2f}%")
+
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
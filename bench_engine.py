@@ -0,0 +1,164 @@
+"""
+Benchmark the flat-array engine against RandomForestClassifier.predict_proba.
+
+Usage:
+    python bench_engine.py
+    python bench_engine.py --batch-sizes 1 100 10000 --repeats 20
+    python bench_engine.py --memory       # artifact size and peak RSS vs model.pkl
+"""
+
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from forest_engine import ENGINE_DIR, FlatForest
+from predictor import load_encoders, top_k_from_proba
+
+
+def random_inputs(label_encoders, n_rows, seed=0):
+    """Draw random encoded (percentile, course, location) rows"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        np.round(rng.uniform(0, 100, n_rows), 1),
+        rng.integers(0, len(label_encoders['Course Name'].classes_), n_rows),
+        rng.integers(0, len(label_encoders['Location'].classes_), n_rows),
+    ]).astype(float)
+
+
+def time_call(fn, X, repeats):
+    """Return the median wall time of fn(X) in seconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+# Loads one model in a fresh interpreter, scores one row and prints its peak RSS
+# and current private (anonymous) RSS in KB; mapped file pages are shared, not private
+_RSS_CHILD = """
+import pickle, resource, sys, warnings
+import numpy as np
+from forest_engine import FlatForest
+warnings.filterwarnings('ignore')
+source, mmap = sys.argv[1], sys.argv[2] == 'mmap'
+if source == 'model.pkl':
+    with open(source, 'rb') as model_file:
+        model = pickle.load(model_file)
+    model.verbose = 0
+    model.predict_proba(np.array([[90.0, 0, 0]]))
+elif source != 'none':
+    model = FlatForest.load(source, mmap=mmap)
+    model.predict_proba(np.array([[90.0, 0, 0]]))
+private = 0
+with open('/proc/self/status') as status:
+    for line in status:
+        if line.startswith('RssAnon:'):
+            private = int(line.split()[1])
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, private)
+"""
+
+
+def peak_rss_mb(source, mmap=True):
+    """(peak RSS, private RSS) in MB of a fresh process that loads `source` and scores one row"""
+    output = subprocess.run([sys.executable, '-c', _RSS_CHILD, source, 'mmap' if mmap else 'copy'],
+                            capture_output=True, text=True, check=True).stdout
+    peak, private = output.split()[-2:]
+    return int(peak) / 1024, int(private) / 1024
+
+
+def disk_size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1e6
+    return os.path.getsize(path) / 1e6
+
+
+def memory_report():
+    """Compare artifact size and peak RSS of model.pkl and the flat-array engine"""
+    print("="*60)
+    print("MODEL MEMORY FOOTPRINT")
+    print("="*60)
+    engine = FlatForest.load(ENGINE_DIR)
+    n_leaves = len(engine.leaf_ptr) - 1
+    dense_leaf_mb = n_leaves * len(engine.classes_) * 8 / 1e6
+    sparse_leaf_mb = (engine.leaf_ptr.nbytes + engine.leaf_classes.nbytes + engine.leaf_probs.nbytes) / 1e6
+    print(f"Leaves: {n_leaves}, {len(engine.leaf_probs) / n_leaves:.2f} stored classes per leaf "
+          f"(of {len(engine.classes_)}), {engine.leaf_probs.dtype}")
+    print(f"Leaf distributions: {sparse_leaf_mb:.1f}MB sparse vs {dense_leaf_mb:.1f}MB dense")
+
+    baseline_peak, baseline_private = peak_rss_mb('none')
+    rows = [('model.pkl', 'model.pkl', True), (f'{ENGINE_DIR} (mmap)', ENGINE_DIR, True),
+            (f'{ENGINE_DIR} (copy)', ENGINE_DIR, False)]
+    pickle_size = disk_size_mb('model.pkl')
+    pickle_private = None
+    print(f"\n{'artifact':<22} {'on disk':>10} {'peak RSS':>10} {'private':>10} {'disk/private vs pkl':>20}")
+    for label, source, mmap in rows:
+        size = disk_size_mb(source)
+        peak, private = peak_rss_mb(source, mmap)
+        peak -= baseline_peak
+        private -= baseline_private
+        pickle_private = pickle_private or private
+        print(f"{label:<22} {size:>8.1f}MB {peak:>8.1f}MB {private:>8.1f}MB "
+              f"{size / pickle_size * 100:>9.1f}% / {private / pickle_private * 100:.1f}%")
+    print(f"\nRSS is measured above a bare interpreter with numpy imported ({baseline_peak:.1f}MB).")
+    print("Memory-mapped pages are shared page cache: every process on the host maps the same copy.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the flat-array forest engine')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10000])
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--memory', action='store_true',
+                        help='Report artifact size and peak RSS against model.pkl instead')
+    args = parser.parse_args()
+    if args.memory:
+        memory_report()
+        return
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    start = time.perf_counter()
+    with open('model.pkl', 'rb') as model_file:
+        model = pickle.load(model_file)
+    pickle_load_time = time.perf_counter() - start
+    model.verbose = 0
+    label_encoders, _ = load_encoders()
+
+    if os.path.exists(ENGINE_DIR):
+        start = time.perf_counter()
+        engine = FlatForest.load(ENGINE_DIR)
+        engine_load_time = time.perf_counter() - start
+    else:
+        print(f"{ENGINE_DIR} not found, flattening model.pkl in memory...")
+        engine = FlatForest.from_sklearn(model)
+        engine_load_time = None
+
+    print("="*60)
+    print("FLAT ENGINE vs SKLEARN predict_proba")
+    print("="*60)
+    print(f"Load model.pkl: {pickle_load_time * 1000:.1f}ms")
+    if engine_load_time is not None:
+        print(f"Load {ENGINE_DIR} (mmap): {engine_load_time * 1000:.1f}ms")
+    print(f"{'batch':>8} {'sklearn':>12} {'flat':>12} {'speedup':>9} {'top-7 match':>12}")
+    for batch_size in args.batch_sizes:
+        X = random_inputs(label_encoders, batch_size)
+        repeats = args.repeats if batch_size <= 1000 else max(1, args.repeats // 5)
+        sklearn_time = time_call(model.predict_proba, X, repeats)
+        flat_time = time_call(engine.predict_proba, X, repeats)
+
+        expected, _ = top_k_from_proba(model.predict_proba(X))
+        actual, _ = top_k_from_proba(engine.predict_proba(X))
+        match = (model.classes_[expected] == engine.classes_[actual]).all(axis=1).mean()
+
+        print(f"{batch_size:>8} {sklearn_time * 1000:>10.2f}ms {flat_time * 1000:>10.2f}ms "
+              f"{sklearn_time / flat_time:>8.1f}x {match * 100:>11.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Benchmark suite for the serving path of cps_app.py.
+
+Measures:
+    - load_artifacts() time in a fresh process (cold) and again in the same process (warm)
+    - per-stage latency of one prediction: label encoding, predict_proba, argsort
+      and inverse_transform, as p50/p95/p99 for batch size 1
+    - latency of multi-course, multi-location queries (one batch per query)
+    - end-to-end throughput for larger batches
+    - peak RSS of a process holding each model artifact
+
+Results are written as JSON. Pass an earlier result file with --baseline to fail
+(exit code 1) when any metric regresses by more than --threshold.
+
+Usage:
+    python bench_serving.py --output bench_results.json
+    python bench_serving.py --baseline bench_results.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from bench_engine import peak_rss_mb
+from forest_engine import COMPACT_DIR, ENGINE_DIR
+from predictor import (TOP_K, encode_inputs, load_artifacts, model_version, predict_combinations, predict_proba,
+                       top_k_from_proba)
+
+STAGES = ['encode', 'predict_proba', 'argsort', 'inverse_transform']
+DEFAULT_BATCH_SIZES = [100, 1000, 10000]
+# (courses, locations) selected in one query
+COMBINATION_SHAPES = [(5, 3), (10, 10)]
+DEFAULT_THRESHOLD = 0.2
+
+# Imports and loads the artifacts in a fresh interpreter, as the first app session does
+_COLD_LOAD_CHILD = """
+import sys, time
+start = time.perf_counter()
+from predictor import load_artifacts
+load_artifacts(prefer_engine=sys.argv[1] == 'engine')
+print(time.perf_counter() - start)
+"""
+
+
+def random_queries(label_encoders, n_rows, seed=0):
+    """Draw raw (score, course, location) queries the way users enter them"""
+    rng = np.random.default_rng(seed)
+    return (
+        np.round(rng.uniform(0, 100, n_rows), 1),
+        rng.choice(label_encoders['Course Name'].classes_, n_rows),
+        rng.choice(label_encoders['Location'].classes_, n_rows),
+    )
+
+
+def predict_stages(model, label_encoders, le_target, scores, courses, locations, k=TOP_K):
+    """Run the live prediction path once and return per-stage wall times in seconds"""
+    timings = {}
+    start = time.perf_counter()
+    features = encode_inputs(label_encoders, scores, courses, locations)
+    timings['encode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = predict_proba(model, features)
+    timings['predict_proba'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    top, _ = top_k_from_proba(proba, k)
+    timings['argsort'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    le_target.inverse_transform(model.classes_[top].ravel())
+    timings['inverse_transform'] = time.perf_counter() - start
+    return timings
+
+
+def percentiles_ms(samples):
+    samples = np.asarray(samples) * 1000
+    return {f'p{q}_ms': float(np.percentile(samples, q)) for q in (50, 95, 99)}
+
+
+def bench_load(prefer_engine):
+    """Cold load in a fresh interpreter, then the median of warm reloads in this one"""
+    output = subprocess.run([sys.executable, '-c', _COLD_LOAD_CHILD, 'engine' if prefer_engine else 'sklearn'],
+                            capture_output=True, text=True, check=True).stdout
+    cold = float(output.split()[-1])
+    warm = []
+    for _ in range(3):
+        start = time.perf_counter()
+        load_artifacts(prefer_engine=prefer_engine)
+        warm.append(time.perf_counter() - start)
+    return {'cold_seconds': cold, 'warm_seconds': float(np.median(warm))}
+
+
+def bench_latency(model, label_encoders, le_target, n_requests):
+    """Per-stage and total latency percentiles for single-row requests"""
+    scores, courses, locations = random_queries(label_encoders, n_requests)
+    predict_stages(model, label_encoders, le_target, scores[:1], courses[:1], locations[:1])
+    samples = {stage: [] for stage in STAGES + ['total']}
+    for i in range(n_requests):
+        timings = predict_stages(model, label_encoders, le_target,
+                                 scores[i:i + 1], courses[i:i + 1], locations[i:i + 1])
+        for stage, seconds in timings.items():
+            samples[stage].append(seconds)
+        samples['total'].append(sum(timings.values()))
+    return {stage: percentiles_ms(values) for stage, values in samples.items()}
+
+
+def bench_combinations(model, label_encoders, n_requests, shapes=COMBINATION_SHAPES, seed=0):
+    """Latency percentiles of multi-selection queries, one predict_proba batch each"""
+    rng = np.random.default_rng(seed)
+    n_courses = len(label_encoders['Course Name'].classes_)
+    n_locations = len(label_encoders['Location'].classes_)
+    results = {}
+    for n_selected_courses, n_selected_locations in shapes:
+        samples = []
+        for _ in range(n_requests):
+            courses = rng.choice(n_courses, min(n_selected_courses, n_courses), replace=False)
+            locations = rng.choice(n_locations, min(n_selected_locations, n_locations), replace=False)
+            score = round(float(rng.uniform(0, 100)), 1)
+            start = time.perf_counter()
+            predict_combinations(model, courses, locations, score)
+            samples.append(time.perf_counter() - start)
+        results[f'{n_selected_courses}x{n_selected_locations}'] = percentiles_ms(samples[1:])
+    return results
+
+
+def bench_throughput(model, label_encoders, le_target, batch_sizes, repeats=3):
+    """End-to-end rows per second for each batch size"""
+    results = {}
+    for batch_size in batch_sizes:
+        scores, courses, locations = random_queries(label_encoders, batch_size, seed=batch_size)
+        totals = [sum(predict_stages(model, label_encoders, le_target, scores, courses, locations).values())
+                  for _ in range(repeats)]
+        results[str(batch_size)] = {'rows_per_sec': batch_size / float(np.median(totals))}
+    return results
+
+
+def bench_memory():
+    """Peak and private RSS of a fresh process holding each artifact that exists"""
+    baseline_peak, baseline_private = peak_rss_mb('none')
+    results = {}
+    for source in ['model.pkl', ENGINE_DIR, COMPACT_DIR]:
+        if os.path.exists(source):
+            peak, private = peak_rss_mb(source)
+            results[source] = {'peak_rss_mb': peak - baseline_peak, 'private_rss_mb': private - baseline_private}
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """Flatten nested result dicts into {'a.b.c': value} for comparison"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def regressions(current, baseline, threshold):
+    """Metrics that got worse than the baseline by more than threshold (as a fraction)"""
+    current, baseline = flatten(current['metrics']), flatten(baseline['metrics'])
+    found = []
+    for name, old in baseline.items():
+        new = current.get(name)
+        if new is None or old <= 0:
+            continue
+        higher_is_better = name.endswith('rows_per_sec')
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > threshold:
+            found.append((name, old, new, change))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the serving path of the app')
+    parser.add_argument('--requests', type=int, default=1000, help='Single-row requests to time')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--sklearn', action='store_true', help='Benchmark model.pkl instead of the engine')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the per-artifact RSS measurements')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='Earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed regression as a fraction (default: 0.2 = 20%%)')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    prefer_engine = not args.sklearn
+    model, label_encoders, le_target, _ = load_artifacts(prefer_engine=prefer_engine)
+
+    print("="*60)
+    print("SERVING BENCHMARK")
+    print("="*60)
+    metrics = {'load': bench_load(prefer_engine)}
+    print(f"Load (cold, fresh process): {metrics['load']['cold_seconds'] * 1000:.1f}ms")
+    print(f"Load (warm):                {metrics['load']['warm_seconds'] * 1000:.1f}ms")
+
+    metrics['latency'] = bench_latency(model, label_encoders, le_target, args.requests)
+    print(f"\n{'stage (batch 1)':<20} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, values in metrics['latency'].items():
+        print(f"{stage:<20} {values['p50_ms']:>7.3f}ms {values['p95_ms']:>7.3f}ms {values['p99_ms']:>7.3f}ms")
+
+    metrics['combinations'] = bench_combinations(model, label_encoders, max(2, args.requests // 10))
+    print(f"\n{'courses x locations':<20} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for shape, values in metrics['combinations'].items():
+        print(f"{shape:<20} {values['p50_ms']:>7.3f}ms {values['p95_ms']:>7.3f}ms {values['p99_ms']:>7.3f}ms")
+
+    metrics['throughput'] = bench_throughput(model, label_encoders, le_target, args.batch_sizes)
+    print(f"\n{'batch':>8} {'rows/sec':>12}")
+    for batch_size, values in metrics['throughput'].items():
+        print(f"{batch_size:>8} {values['rows_per_sec']:>12,.0f}")
+
+    if not args.no_memory:
+        metrics['memory'] = bench_memory()
+        print(f"\n{'artifact':<18} {'peak RSS':>10} {'private':>10}")
+        for source, values in metrics['memory'].items():
+            print(f"{source:<18} {values['peak_rss_mb']:>8.1f}MB {values['private_rss_mb']:>8.1f}MB")
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'model_version': model_version(),
+        'model': type(model).__name__,
+        'n_trees': getattr(model, 'n_trees', getattr(model, 'n_estimators', None)),
+        'host': {'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'metrics': metrics,
+    }
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        found = regressions(results, baseline, args.threshold)
+        print(f"\nCompared with {args.baseline} (threshold {args.threshold * 100:.0f}%):")
+        for name, old, new, change in found:
+            print(f"   ❌ {name}: {old:.4g} -> {new:.4g} ({change * 100:+.0f}% worse)")
+        if found:
+            sys.exit(1)
+        print("   ✅ No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Startup benchmark for cps_app.py.
+
+Each run starts a fresh interpreter, as a new app server does, and reports
+seconds from interpreter start to:
+    - first render: the CSS, header, Home and Resources tabs have been sent
+    - form ready: the Predict form is shown (from model_metadata.json when present)
+    - encoders ready: the encoders and cutoff index are loaded
+    - model ready: the model and lookup table are loaded
+    - script done: the first run of the app script has finished
+
+For comparison, "blocking load" is the time the app used to spend before
+anything rendered: importing streamlit and pandas and loading every artifact.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 5 --output startup_results.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+# Runs the app script once, as the first browser session does, and reports the startup events
+_APP_CHILD = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file('cps_app.py', default_timeout=600).run()
+done = time.perf_counter()
+import app_loader
+deadline = time.perf_counter() + 600
+while 'model_ready' not in app_loader.EVENTS and time.perf_counter() < deadline:
+    time.sleep(0.01)
+events = {name: when - start for name, when in app_loader.EVENTS.items()}
+events['script_done'] = done - start
+events['errors'] = [element.value for element in at.error] + [str(e.value) for e in at.exception]
+print(json.dumps(events))
+"""
+
+# What the app used to do before anything rendered
+_BLOCKING_CHILD = """
+import time
+start = time.perf_counter()
+import streamlit
+import pandas
+from predictor import load_artifacts, model_version
+model_version()
+load_artifacts()
+print(time.perf_counter() - start)
+"""
+
+STAGES = [('first_render', 'First render'), ('form_ready', 'Form ready'), ('encoders_ready', 'Encoders ready'),
+          ('model_ready', 'Model ready'), ('script_done', 'Script done')]
+
+
+def run_child(code):
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark app time to first render')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh processes per measurement')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    print("="*60)
+    print("APP STARTUP BENCHMARK")
+    print("="*60)
+
+    runs = []
+    for _ in range(args.runs):
+        events = json.loads(run_child(_APP_CHILD).strip().splitlines()[-1])
+        if events['errors']:
+            print(f"⚠️  App reported errors: {events['errors']}")
+        runs.append(events)
+    blocking = [float(run_child(_BLOCKING_CHILD).split()[-1]) for _ in range(args.runs)]
+
+    results = {'runs': args.runs, 'blocking_load_seconds': float(np.median(blocking))}
+    print(f"{'stage':<16} {'median':>9} {'min':>9} {'max':>9}")
+    for key, label in STAGES:
+        values = [events[key] for events in runs if key in events]
+        if not values:
+            continue
+        results[f'{key}_seconds'] = float(np.median(values))
+        print(f"{label:<16} {np.median(values):>8.3f}s {min(values):>8.3f}s {max(values):>8.3f}s")
+    print(f"{'Blocking load':<16} {np.median(blocking):>8.3f}s {min(blocking):>8.3f}s {max(blocking):>8.3f}s")
+
+    if 'first_render_seconds' in results:
+        print(f"\n✅ First render {results['blocking_load_seconds'] - results['first_render_seconds']:.3f}s "
+              f"sooner than loading everything up front")
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Latency benchmark for serving-time thread control.
+
+Compares model.pkl as pickled by training (n_jobs=-1, verbose=1: every call
+fans out to all cores) against the per-call policy in predictor.inference_jobs
+(serial for small requests, idle cores for big batches). Single-row requests
+are sent from several concurrent sessions, like app users, and a large batch
+is scored once, like batch_predict.py.
+
+Usage:
+    python bench_threads.py
+    python bench_threads.py --sessions 1 4 16 --requests 200 --batch-size 100000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from bench_engine import random_inputs
+from predictor import inference_jobs, load_encoders, predict_proba
+
+
+def as_pickled(model, features):
+    """predict_proba with the settings training pickled"""
+    return model.predict_proba(features)
+
+
+def quiet_if(pickled):
+    """Swallow the progress log of verbose=1 (it is still produced, so its cost is kept)"""
+    return contextlib.redirect_stderr(io.StringIO()) if pickled else contextlib.nullcontext()
+
+
+def run_sessions(predict, model, X, n_sessions):
+    """Send the rows of X one at a time from n_sessions threads; return latencies and rows/sec"""
+    latencies = []
+    lock = threading.Lock()
+
+    def session(rows):
+        local = []
+        for i in rows:
+            start = time.perf_counter()
+            predict(model, X[i:i + 1])
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=session, args=(range(s, len(X), n_sessions),))
+               for s in range(n_sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return np.array(latencies) * 1000, len(X) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark serving-time thread control')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--requests', type=int, default=400, help='Single-row requests per run')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    with open('model.pkl', 'rb') as model_file:
+        pickled = pickle.load(model_file)
+    label_encoders, _ = load_encoders()
+    # What load_artifacts() serves: parallelism left to the per-call policy
+    served = pickle.loads(pickle.dumps(pickled))
+    served.n_jobs = None
+    served.verbose = 0
+
+    print("="*60)
+    print("THREAD CONTROL BENCHMARK")
+    print("="*60)
+    print(f"CPUs: {os.cpu_count()}, pickled n_jobs={pickled.n_jobs}, verbose={pickled.verbose}")
+    print(f"Policy: batch of 1 -> {inference_jobs(1)} thread(s), "
+          f"batch of {args.batch_size} -> {inference_jobs(args.batch_size)} thread(s)")
+
+    X = random_inputs(label_encoders, args.requests)
+    print(f"\n{'single-row':<14} {'sessions':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8}")
+    for n_sessions in args.sessions:
+        for label, predict, model in [('as pickled', as_pickled, pickled), ('policy', predict_proba, served)]:
+            with quiet_if(model is pickled):
+                latencies, throughput = run_sessions(predict, model, X, n_sessions)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"{label:<14} {n_sessions:>8} {p50:>7.2f}ms {p95:>7.2f}ms {p99:>7.2f}ms {throughput:>8,.0f}")
+
+    X = random_inputs(label_encoders, args.batch_size, seed=1)
+    print(f"\n{'batch':<14} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+    for label, predict, model in [('as pickled', as_pickled, pickled), ('policy', predict_proba, served)]:
+        with quiet_if(model is pickled):
+            start = time.perf_counter()
+            predict(model, X)
+            elapsed = time.perf_counter() - start
+        print(f"{label:<14} {args.batch_size:>8} {elapsed:>8.2f}s {args.batch_size / elapsed:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,40 @@
 import pandas as pd
+import numpy as np
+import argparse
+import hashlib
+import io
+import json
+import os
 import re
+import shutil
 
-# Load the dataset
-print("Loading dataset...")
-data = pd.read_csv('dataset_with_location.csv')
+from artifacts import load_arrays, save_arrays
 
-print(f"Original dataset size: {len(data)} rows")
+INPUT_FILE = 'dataset_with_location.csv'
+OUTPUT_FILE = 'dataset_cleaned.parquet'
+CSV_OUTPUT_FILE = 'dataset_cleaned.csv'
+STORE_DIR = 'cleaned_store'
+NAME_COLUMNS = ['Institute Name', 'Course Name', 'Location']
+KEY_COLUMNS = ['Percentile', 'Course Name', 'Location', 'Institute Name']
+MIN_INSTITUTE_SAMPLES = 5
+DEFAULT_CHUNK_SIZE = 500000
 
-# Clean Percentile column
-print("\nCleaning Percentile column...")
-data['Percentile'] = data['Percentile'].astype(str).str.extract(r'([\d\.]+)').astype(float)
+# Checked in order; the first city contained in a location wins
+LOCATION_FIXES = [
+    ('Mumbai', 'Mumbai'),
+    ('Pune', 'Pune'),
+    ('Nashik', 'Nashik'),
+    ('Nagpur', 'Nagpur'),
+    ('Thane', 'Thane'),
+    ('Navi Mumbai', 'Navi Mumbai'),
+    ('Aurangabad', 'Aurangabad'),
+    ('Kolhapur', 'Kolhapur'),
+    ('Raigad', 'Raigad'),
+    ('University', 'Pune'),  # Most university locations are Pune
+]
 
-# Clean Institute Name - extract just the college name without codes
-print("Cleaning Institute Name...")
+
+# Row-wise reference cleaners. The vectorized versions below must match them exactly.
 def clean_institute_name(name):
     if pd.isna(name):
         return name
@@ -24,10 +46,7 @@ def clean_institute_name(name):
     name = re.sub(r'[^\w\s\-\'\,\.\(\)&]', '', name)
     return name.strip()
 
-data['Institute Name'] = data['Institute Name'].apply(clean_institute_name)
 
-# Clean Course Name
-print("Cleaning Course Name...")
 def clean_course_name(course):
     if pd.isna(course):
         return course
@@ -40,10 +59,7 @@ def clean_course_name(course):
     course = re.sub(r'[^\w\s\-\(\)]', '', course)
     return course.strip()
 
-data['Course Name'] = data['Course Name'].apply(clean_course_name)
 
-# Clean Location
-print("Cleaning Location...")
 def clean_location(location):
     if pd.isna(location):
         return location
@@ -55,86 +71,647 @@ def clean_location(location):
     # Take only the main city (first word or most relevant part)
     location = location.strip()
     # Common location fixes
-    if 'Mumbai' in location:
-        return 'Mumbai'
-    elif 'Pune' in location:
-        return 'Pune'
-    elif 'Nashik' in location:
-        return 'Nashik'
-    elif 'Nagpur' in location:
-        return 'Nagpur'
-    elif 'Thane' in location:
-        return 'Thane'
-    elif 'Navi Mumbai' in location:
-        return 'Navi Mumbai'
-    elif 'Aurangabad' in location:
-        return 'Aurangabad'
-    elif 'Kolhapur' in location:
-        return 'Kolhapur'
-    elif 'Raigad' in location:
-        return 'Raigad'
-    elif 'University' in location:
-        return 'Pune'  # Most university locations are Pune
+    for city, fixed in LOCATION_FIXES:
+        if city in location:
+            return fixed
+    # Take first meaningful word
+    parts = location.split()
+    return parts[0] if parts else location
+
+
+def clean_percentiles(series):
+    """Extract the leading number of every percentile cell as a float"""
+    values = series.astype(str)
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        pa = None
+    if pa is not None:
+        array = pa.array(values.to_numpy(dtype=object), type=pa.string())
+        # RE2 and Python's re only agree on \d for ASCII text
+        if pc.all(pc.string_is_ascii(array)).as_py() in (True, None):
+            numbers = pc.extract_regex(array, r'(?P<value>[\d\.]+)').field('value')
+            return pd.Series(pc.cast(numbers, pa.float64()).to_numpy(zero_copy_only=False),
+                             index=series.index)
+    return values.str.extract(r'([\d\.]+)')[0].astype(float)
+
+
+# Vectorized cleaners: operate on a Series of distinct string values at once
+def _collapse_whitespace(values):
+    return values.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def clean_institute_names(values):
+    values = values.str.replace(r'^\d+\s*-\s*', '', regex=True)
+    values = _collapse_whitespace(values)
+    values = values.str.replace(r'[^\w\s\-\'\,\.\(\)&]', '', regex=True)
+    return values.str.strip()
+
+
+def clean_course_names(values):
+    values = _collapse_whitespace(values)
+    values = values.str.replace('&', 'and', regex=False)
+    values = values.str.replace(r'[^\w\s\-\(\)]', '', regex=True)
+    return values.str.strip()
+
+
+def clean_locations(values):
+    values = _collapse_whitespace(values)
+    values = values.str.replace(r'[^\w\s\-]', ' ', regex=True).str.strip()
+    first_word = values.str.split(n=1).str[0]
+    result = first_word.where(first_word.notna(), values)
+    # Apply fixes in reverse so earlier entries take priority, like the if/elif chain
+    for city, fixed in reversed(LOCATION_FIXES):
+        result = result.mask(values.str.contains(city, regex=False), fixed)
+    return result
+
+
+def clean_distinct(series, clean_values):
+    """Clean each distinct value of a column once and broadcast the results back"""
+    codes, uniques = pd.factorize(series)
+    cleaned = clean_values(pd.Series(uniques, dtype=object).astype(str)).to_numpy(dtype=object)
+    # Missing values stay missing, as in the row-wise cleaners
+    result = np.append(cleaned, np.nan)[codes]
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def clean_columns(data, vectorized=True, log=print):
+    """Clean the percentile and name columns in place; every step is row-local"""
+    # Clean Percentile column
+    log("\nCleaning Percentile column...")
+    if vectorized:
+        data['Percentile'] = clean_percentiles(data['Percentile'])
+    else:
+        data['Percentile'] = data['Percentile'].astype(str).str.extract(r'([\d\.]+)').astype(float)
+
+    # Clean Institute Name - extract just the college name without codes
+    log("Cleaning Institute Name...")
+    if vectorized:
+        data['Institute Name'] = clean_distinct(data['Institute Name'], clean_institute_names)
+    else:
+        data['Institute Name'] = data['Institute Name'].apply(clean_institute_name)
+
+    # Clean Course Name
+    log("Cleaning Course Name...")
+    if vectorized:
+        data['Course Name'] = clean_distinct(data['Course Name'], clean_course_names)
+    else:
+        data['Course Name'] = data['Course Name'].apply(clean_course_name)
+
+    # Clean Location
+    log("Cleaning Location...")
+    if vectorized:
+        data['Location'] = clean_distinct(data['Location'], clean_locations)
+    else:
+        data['Location'] = data['Location'].apply(clean_location)
+    return data
+
+
+def drop_invalid_names(data):
+    """Filter out entries with very short or invalid names"""
+    data = data[data['Institute Name'].str.len() > 5]
+    data = data[data['Course Name'].str.len() > 3]
+    data = data[data['Location'].str.len() > 2]
+    return data
+
+
+def clean_dataset(data, vectorized=True, verbose=True):
+    """Run the full cleaning pipeline on a raw dataset and return the cleaned frame"""
+    log = print if verbose else (lambda *args, **kwargs: None)
+
+    data = clean_columns(data, vectorized, log)
+
+    # Remove rows with missing critical data
+    log("\nRemoving rows with missing data...")
+    before = len(data)
+    data = data.dropna(subset=KEY_COLUMNS)
+    after = len(data)
+    log(f"Removed {before - after} rows with missing data")
+
+    # Remove duplicates
+    log("\nRemoving duplicate rows...")
+    before = len(data)
+    data = data.drop_duplicates(subset=KEY_COLUMNS)
+    after = len(data)
+    log(f"Removed {before - after} duplicate rows")
+
+    # Filter out entries with very short or invalid names
+    log("\nFiltering invalid entries...")
+    before = len(data)
+    data = drop_invalid_names(data)
+    after = len(data)
+    log(f"Removed {before - after} invalid entries")
+
+    # Remove institutes with too few samples (need at least 5 for better learning)
+    log("\nRemoving institutes with insufficient data...")
+    before = len(data)
+    institute_counts = data['Institute Name'].value_counts()
+    valid_institutes = institute_counts[institute_counts >= MIN_INSTITUTE_SAMPLES].index
+    data = data[data['Institute Name'].isin(valid_institutes)]
+    after = len(data)
+    log(f"Removed {before - after} records from institutes with <5 samples")
+    log(f"Kept {len(valid_institutes)} institutes with sufficient data")
+
+    return data
+
+
+class SeenKeys:
+    """Exact set of dedup keys seen so far, kept as sorted runs of (hash, percentile, names)"""
+
+    def __init__(self, codes=None):
+        self.runs = []
+        self._codes = {column: {} for column in KEY_COLUMNS[1:]}
+        for column, names in (codes or {}).items():
+            self._codes[column] = {name: code for code, name in enumerate(names)}
+        # When set to a list, every added batch of records is also appended here
+        self.journal = None
+
+    def __len__(self):
+        return sum(len(run[0]) for run in self.runs)
+
+    def _name_codes(self, column, values):
+        """Map names to stable integer codes shared across chunks"""
+        known = self._codes[column]
+        codes, uniques = pd.factorize(values)
+        if len(known) + len(uniques) >= 1 << 21:
+            raise ValueError(f"Too many distinct values in {column} for streaming dedup")
+        mapping = np.array([known.setdefault(name, len(known)) for name in uniques], dtype=np.uint64)
+        return mapping[codes]
+
+    def records(self, data):
+        """Encode the KEY_COLUMNS of a chunk without missing values as (hash, percentile, names)"""
+        # Cleaned percentiles are never negative zero or NaN here, so bit patterns compare exactly
+        percentile = data['Percentile'].to_numpy(dtype=np.float64).view(np.uint64)
+        names = np.zeros(len(data), dtype=np.uint64)
+        for column in KEY_COLUMNS[1:]:
+            names = (names << np.uint64(21)) | self._name_codes(column, data[column])
+        with np.errstate(over='ignore'):
+            key_hash = percentile ^ (names * np.uint64(0x9E3779B97F4A7C15))
+        return key_hash, percentile, names
+
+    def contains(self, records):
+        key_hash, percentile, names = records
+        found = np.zeros(len(key_hash), dtype=bool)
+        for run_hash, run_percentile, run_names in self.runs:
+            left = np.searchsorted(run_hash, key_hash, side='left')
+            right = np.searchsorted(run_hash, key_hash, side='right')
+            single = np.flatnonzero(right - left == 1)
+            positions = left[single]
+            found[single] |= ((run_percentile[positions] == percentile[single])
+                              & (run_names[positions] == names[single]))
+            # Hash collisions give several candidates; they are rare enough to check one by one
+            for i in np.flatnonzero(right - left > 1):
+                candidates = slice(left[i], right[i])
+                found[i] |= bool(np.any((run_percentile[candidates] == percentile[i])
+                                        & (run_names[candidates] == names[i])))
+        return found
+
+    def codes(self):
+        """Name code tables in code order, for persisting alongside saved runs"""
+        return {column: list(known) for column, known in self._codes.items()}
+
+    def add_run(self, records):
+        """Add previously saved, already sorted records without merging them"""
+        self.runs.insert(0, records)
+
+    def add(self, records):
+        if self.journal is not None:
+            self.journal.append(records)
+        self.runs.append(self._sorted(records))
+        # Merge runs of similar size so lookups touch O(log n) runs
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= 2 * len(self.runs[-1][0]):
+            newest = self.runs.pop()
+            merged = tuple(np.concatenate([old, new]) for old, new in zip(self.runs[-1], newest))
+            self.runs[-1] = self._sorted(merged)
+
+    @staticmethod
+    def _sorted(records):
+        order = np.argsort(records[0], kind='stable')
+        return tuple(array[order] for array in records)
+
+
+def _common_dtype(dtypes):
+    """Dtype pandas would infer for a whole column given the dtypes of its chunks"""
+    dtypes = set(dtypes)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if all(pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in dtypes):
+        return np.dtype('float64')
+    return np.dtype('object')
+
+
+def _dedup_chunks(source, chunk_size, dtypes=None, stats=None, seen=None):
+    """Yield cleaned, globally de-duplicated chunks with invalid names removed"""
+    seen = SeenKeys() if seen is None else seen
+    for chunk in pd.read_csv(source, chunksize=chunk_size, dtype=dtypes):
+        if stats is not None:
+            stats['rows'] += len(chunk)
+            for column, dtype in chunk.dtypes.items():
+                stats['dtypes'].setdefault(column, []).append(dtype)
+        chunk = clean_columns(chunk, log=lambda *args, **kwargs: None)
+
+        before = len(chunk)
+        chunk = chunk.dropna(subset=KEY_COLUMNS)
+        missing = before - len(chunk)
+
+        before = len(chunk)
+        chunk = chunk[~chunk.duplicated(subset=KEY_COLUMNS)]
+        records = seen.records(chunk)
+        new = ~seen.contains(records)
+        chunk = chunk[new]
+        seen.add(tuple(array[new] for array in records))
+        duplicates = before - len(chunk)
+
+        before = len(chunk)
+        chunk = drop_invalid_names(chunk)
+        yield chunk, missing, duplicates, before - len(chunk)
+
+
+def to_columnar(data):
+    """Convert a cleaned frame to the training format: sorted categoricals and float32 percentiles"""
+    data = data.copy()
+    data['Percentile'] = data['Percentile'].astype(np.float32)
+    for column in NAME_COLUMNS:
+        categories = sorted(data[column].unique())
+        data[column] = pd.Categorical(data[column], categories=categories)
+    return data
+
+
+class CleanedWriter:
+    """Write cleaned chunks to Parquet (columnar, categorical) and/or CSV"""
+
+    def __init__(self, output_path=OUTPUT_FILE, csv_path=None):
+        if output_path.endswith('.csv'):
+            output_path, csv_path = None, output_path
+        self.output_path = output_path
+        self.csv_path = csv_path
+        self._parquet = None
+        self._csv_started = False
+
+    def write(self, data):
+        if self.csv_path:
+            data.to_csv(self.csv_path, mode='a' if self._csv_started else 'w',
+                        header=not self._csv_started, index=False)
+            self._csv_started = True
+        if self.output_path:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columnar = to_columnar(data)
+            if self._parquet is None:
+                table = pa.Table.from_pandas(columnar, preserve_index=False)
+                # Later chunks may have more categories than the first, so never use int8/int16 codes
+                schema = pa.schema([
+                    field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                    if pa.types.is_dictionary(field.type) else field
+                    for field in table.schema
+                ], metadata=table.schema.metadata)
+                table = table.cast(schema)
+                self._parquet = pq.ParquetWriter(self.output_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(columnar, schema=self._parquet.schema, preserve_index=False)
+            self._parquet.write_table(table)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def clean_file_streaming(input_path=INPUT_FILE, output_path=OUTPUT_FILE, csv_path=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE, verbose=True):
+    """Clean a CSV in chunks with bounded memory; output equals the in-memory pipeline
+
+    Pass 1 cleans and de-duplicates to count samples per institute and to learn
+    each column's dtype over the whole file. Pass 2 repeats the row-local work
+    with those dtypes and writes only rows of institutes with enough samples.
+    Memory is bounded by the chunk size plus 24 bytes per distinct row for dedup.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+
+    log(f"\nPass 1: counting samples per institute ({chunk_size} rows per chunk)...")
+    stats = {'rows': 0, 'dtypes': {}}
+    institute_counts = pd.Series(dtype='int64')
+    missing = duplicates = invalid = 0
+    for chunk, n_missing, n_duplicates, n_invalid in _dedup_chunks(input_path, chunk_size, stats=stats):
+        institute_counts = institute_counts.add(chunk['Institute Name'].value_counts(), fill_value=0)
+        missing += n_missing
+        duplicates += n_duplicates
+        invalid += n_invalid
+    valid_institutes = set(institute_counts[institute_counts >= MIN_INSTITUTE_SAMPLES].index)
+    dtypes = {column: _common_dtype(found) for column, found in stats['dtypes'].items()}
+
+    log(f"Original dataset size: {stats['rows']} rows")
+    log(f"Removed {missing} rows with missing data")
+    log(f"Removed {duplicates} duplicate rows")
+    log(f"Removed {invalid} invalid entries")
+
+    log("\nPass 2: writing cleaned rows...")
+    total = 0
+    counts = {column: pd.Series(dtype='int64') for column in ['Location', 'Institute Name', 'Course Name']}
+    writer = CleanedWriter(output_path, csv_path)
+    try:
+        for chunk, _, _, _ in _dedup_chunks(input_path, chunk_size, dtypes=dtypes):
+            chunk = chunk[chunk['Institute Name'].isin(valid_institutes)]
+            writer.write(chunk)
+            total += len(chunk)
+            for column in counts:
+                counts[column] = counts[column].add(chunk[column].value_counts(), fill_value=0)
+    finally:
+        writer.close()
+
+    log(f"Removed {int(institute_counts.sum()) - total} records from institutes with <5 samples")
+    log(f"Kept {len(valid_institutes)} institutes with sufficient data")
+    return total, {column: values.astype('int64') for column, values in counts.items()}
+
+
+def file_digest(path, limit=None):
+    """SHA-256 of a file, or of its first `limit` bytes"""
+    digest = hashlib.sha256()
+    remaining = os.path.getsize(path) if limit is None else limit
+    with open(path, 'rb') as source:
+        while remaining > 0:
+            block = source.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _appended_offset(path, entry):
+    """Byte offset of new rows if `path` only grew past what `entry` recorded, else None"""
+    size = entry['size']
+    if os.path.getsize(path) <= size or size == 0:
+        return None
+    with open(path, 'rb') as source:
+        source.seek(size - 1)
+        if source.read(1) != b'\n':
+            return None
+    return size if file_digest(path, size) == entry['sha256'] else None
+
+
+def _read_source(path, offset=0):
+    """CSV source for a whole file, or for the rows after `offset` with the header kept"""
+    if not offset:
+        return path
+    with open(path, 'rb') as source:
+        header = source.readline()
+        source.seek(offset)
+        return io.BytesIO(header + source.read())
+
+
+def _scan_dtypes(source, chunk_size):
+    """Column dtypes pandas would infer reading the whole source at once"""
+    found = {}
+    for chunk in pd.read_csv(source, chunksize=chunk_size):
+        for column, dtype in chunk.dtypes.items():
+            found.setdefault(column, []).append(dtype)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return {column: _common_dtype(dtypes) for column, dtypes in found.items()}
+
+
+class CleanedStore:
+    """Cleaned, de-duplicated rows of every input seen so far, keyed by input content hash
+
+    Layout of the store directory:
+        manifest.json        inputs in order, with size, mtime, sha256 and their parts
+        codes.json           name codes used by the saved dedup keys
+        parts/<id>.pkl       cleaned rows of one chunk, before the institute count filter
+        parts/<id>.keys/     sorted dedup keys first seen in that chunk
+
+    Rows are kept before the per-institute filter together with per-part institute
+    counts, so the filter is recomputed from the counts without re-reading any part.
+    """
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.parts_dir = os.path.join(path, 'parts')
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        self.codes_path = os.path.join(path, 'codes.json')
+        self.files = []
+        self.codes = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as manifest_file:
+                self.files = json.load(manifest_file)['files']
+            with open(self.codes_path) as codes_file:
+                self.codes = json.load(codes_file)
+
+    def plan(self, paths):
+        """Return (entries, first index to reprocess, byte offset to resume that input at)
+
+        Inputs already in the manifest keep their position; new ones are appended.
+        Everything from the first new or changed input onwards is reprocessed,
+        because global dedup keeps the first occurrence of a row. An input that
+        only had rows appended is resumed at its old end instead of re-read.
+        """
+        entries = list(self.files)
+        known = {entry['path'] for entry in entries}
+        entries += [{'path': path, 'parts': []} for path in paths if path not in known]
+
+        for index, entry in enumerate(entries):
+            path = entry['path']
+            if 'sha256' not in entry:
+                return entries, index, 0
+            if not os.path.exists(path):
+                print(f"⚠️  {path} is missing; keeping its cleaned rows")
+                continue
+            stat = os.stat(path)
+            if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+                continue
+            offset = _appended_offset(path, entry)
+            if offset is not None:
+                return entries, index, offset
+            if file_digest(path) != entry['sha256']:
+                return entries, index, 0
+            entry['mtime_ns'] = stat.st_mtime_ns
+        return entries, len(entries), 0
+
+    def _part_path(self, part_id, suffix):
+        return os.path.join(self.parts_dir, part_id + suffix)
+
+    def _remove_part(self, part):
+        if os.path.exists(self._part_path(part['id'], '.pkl')):
+            os.remove(self._part_path(part['id'], '.pkl'))
+        shutil.rmtree(self._part_path(part['id'], '.keys'), ignore_errors=True)
+
+    def _load_seen(self, entries):
+        seen = SeenKeys(self.codes)
+        for entry in entries:
+            for part in entry['parts']:
+                if part['keys']:
+                    arrays, _ = load_arrays(self._part_path(part['id'], '.keys'))
+                    seen.add_run((arrays['hash'], arrays['percentile'], arrays['names']))
+        return seen
+
+    def _save_part(self, part_id, chunk, journal):
+        chunk.to_pickle(self._part_path(part_id, '.pkl'))
+        keys = 0
+        if journal:
+            records = SeenKeys._sorted(tuple(np.concatenate(arrays) for arrays in zip(*journal)))
+            keys = len(records[0])
+            save_arrays(self._part_path(part_id, '.keys'),
+                        dict(zip(['hash', 'percentile', 'names'], records)))
+        return {
+            'id': part_id,
+            'rows': len(chunk),
+            'keys': keys,
+            'institutes': {name: int(n) for name, n in chunk['Institute Name'].value_counts().items()},
+        }
+
+    def update(self, paths, chunk_size=DEFAULT_CHUNK_SIZE, log=print):
+        """Clean new or changed inputs into the store; returns the number of raw rows read"""
+        os.makedirs(self.parts_dir, exist_ok=True)
+        entries, start, offset = self.plan(paths)
+        kept = start + 1 if offset else start
+        stale = [part for entry in entries[kept:] for part in entry['parts']]
+        for entry in entries[kept:]:
+            entry['parts'] = []
+
+        seen = self._load_seen(entries[:kept])
+        rows_read = 0
+        for index in range(start, len(entries)):
+            entry = entries[index]
+            path = entry['path']
+            resume = offset if index == start else 0
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} is needed to rebuild the cleaned store but is missing")
+            log(f"Cleaning {path}" + (f" (appended rows from byte {resume})" if resume else "") + "...")
+            stat = os.stat(path)
+            digest = file_digest(path)
+            source = _read_source(path, resume)
+            stats = {'rows': 0, 'dtypes': {}}
+            seen.journal = []
+            chunks = _dedup_chunks(source, chunk_size, dtypes=_scan_dtypes(source, chunk_size),
+                                   stats=stats, seen=seen)
+            for number, (chunk, _, _, _) in enumerate(chunks):
+                part_id = f"{index:04d}-{digest[:12]}-{resume}-{number:04d}"
+                entry['parts'].append(self._save_part(part_id, chunk, seen.journal))
+                seen.journal = []
+            seen.journal = None
+            entry.update({'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+            rows_read += stats['rows']
+
+        self._save_manifest(entries, seen.codes())
+        current = {part['id'] for entry in entries for part in entry['parts']}
+        for part in stale:
+            if part['id'] not in current:
+                self._remove_part(part)
+        return rows_read
+
+    def _save_manifest(self, entries, codes):
+        """Write codes and manifest atomically; the manifest is what makes new parts visible"""
+        for path, content in [(self.codes_path, codes), (self.manifest_path, {'files': entries})]:
+            with open(path + '.tmp', 'w') as out_file:
+                json.dump(content, out_file, indent=1)
+            os.replace(path + '.tmp', path)
+        self.files = entries
+        self.codes = codes
+
+    def institute_counts(self):
+        """Samples per institute over the whole store, summed from the per-part counts"""
+        counts = {}
+        for entry in self.files:
+            for part in entry['parts']:
+                for name, n in part['institutes'].items():
+                    counts[name] = counts.get(name, 0) + n
+        return counts
+
+    def export(self, output_path=OUTPUT_FILE, csv_path=None):
+        """Write the store with the per-institute count filter applied; returns (total, counts)"""
+        valid_institutes = {name for name, n in self.institute_counts().items() if n >= MIN_INSTITUTE_SAMPLES}
+        total = 0
+        counts = {column: pd.Series(dtype='int64') for column in ['Location', 'Institute Name', 'Course Name']}
+        writer = CleanedWriter(output_path, csv_path)
+        try:
+            for entry in self.files:
+                for part in entry['parts']:
+                    chunk = pd.read_pickle(self._part_path(part['id'], '.pkl'))
+                    chunk = chunk[chunk['Institute Name'].isin(valid_institutes)]
+                    writer.write(chunk)
+                    total += len(chunk)
+                    for column in counts:
+                        counts[column] = counts[column].add(chunk[column].value_counts(), fill_value=0)
+        finally:
+            writer.close()
+        return total, {column: values.astype('int64') for column, values in counts.items()}
+
+
+def print_summary(data):
+    """Show summary statistics of a cleaned dataset"""
+    print_counts_summary(len(data), {
+        column: data[column].value_counts()
+        for column in ['Location', 'Institute Name', 'Course Name']
+    })
+
+
+def print_counts_summary(total, counts):
+    """Show summary statistics from per-column value counts"""
+    counts = {column: values.sort_values(ascending=False, kind='stable') for column, values in counts.items()}
+    print("\n" + "="*60)
+    print("CLEANED DATA SUMMARY")
+    print("="*60)
+    print(f"\nTotal records: {total}")
+    print(f"\nUnique Institutes: {len(counts['Institute Name'])}")
+    print(f"Unique Courses: {len(counts['Course Name'])}")
+    print(f"Unique Locations: {len(counts['Location'])}")
+
+    print("\n--- Locations ---")
+    print(counts['Location'].head(15))
+
+    print("\n--- Top 10 Institutes ---")
+    print(counts['Institute Name'].head(10))
+
+    print("\n--- Top 10 Courses ---")
+    print(counts['Course Name'].head(10))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean the raw admissions dataset')
+    parser.add_argument('--input', default=INPUT_FILE)
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help='Parquet output (default), or a .csv path for CSV only')
+    parser.add_argument('--csv', nargs='?', const=CSV_OUTPUT_FILE, default=None,
+                        help='Also export CSV (default path: dataset_cleaned.csv)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process the input in chunks with bounded memory')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Rows per chunk in --stream and --incremental modes (default: 500000)')
+    parser.add_argument('--incremental', nargs='+', metavar='CSV',
+                        help='Add CAP-round files to the cleaned store, cleaning only new or changed ones')
+    parser.add_argument('--store', default=STORE_DIR,
+                        help='Cleaned store used by --incremental (default: cleaned_store)')
+    args = parser.parse_args()
+
+    if args.incremental:
+        store = CleanedStore(args.store)
+        rows_read = store.update(args.incremental, args.chunk_size)
+        print(f"Read {rows_read} new raw rows into {args.store}")
+        total, counts = store.export(args.output, args.csv)
+        print_counts_summary(total, counts)
+    elif args.stream:
+        print(f"Streaming {args.input}...")
+        total, counts = clean_file_streaming(args.input, args.output, args.csv, args.chunk_size)
+        print_counts_summary(total, counts)
     else:
-        # Take first meaningful word
-        parts = location.split()
-        return parts[0] if parts else location
-
-data['Location'] = data['Location'].apply(clean_location)
-
-# Remove rows with missing critical data
-print("\nRemoving rows with missing data...")
-before = len(data)
-data = data.dropna(subset=['Percentile', 'Course Name', 'Location', 'Institute Name'])
-after = len(data)
-print(f"Removed {before - after} rows with missing data")
-
-# Remove duplicates
-print("\nRemoving duplicate rows...")
-before = len(data)
-data = data.drop_duplicates(subset=['Percentile', 'Course Name', 'Location', 'Institute Name'])
-after = len(data)
-print(f"Removed {before - after} duplicate rows")
-
-# Filter out entries with very short or invalid names
-print("\nFiltering invalid entries...")
-before = len(data)
-data = data[data['Institute Name'].str.len() > 5]
-data = data[data['Course Name'].str.len() > 3]
-data = data[data['Location'].str.len() > 2]
-after = len(data)
-print(f"Removed {before - after} invalid entries")
-
-# Remove institutes with too few samples (need at least 5 for better learning)
-print("\nRemoving institutes with insufficient data...")
-before = len(data)
-institute_counts = data['Institute Name'].value_counts()
-valid_institutes = institute_counts[institute_counts >= 5].index
-data = data[data['Institute Name'].isin(valid_institutes)]
-after = len(data)
-print(f"Removed {before - after} records from institutes with <5 samples")
-print(f"Kept {len(valid_institutes)} institutes with sufficient data")
-
-# Show summary statistics
-print("\n" + "="*60)
-print("CLEANED DATA SUMMARY")
-print("="*60)
-print(f"\nTotal records: {len(data)}")
-print(f"\nUnique Institutes: {data['Institute Name'].nunique()}")
-print(f"Unique Courses: {data['Course Name'].nunique()}")
-print(f"Unique Locations: {data['Location'].nunique()}")
-
-print("\n--- Locations ---")
-print(data['Location'].value_counts().head(15))
-
-print("\n--- Top 10 Institutes ---")
-print(data['Institute Name'].value_counts().head(10))
-
-print("\n--- Top 10 Courses ---")
-print(data['Course Name'].value_counts().head(10))
-
-# Save cleaned dataset
-output_file = 'dataset_cleaned.csv'
-data.to_csv(output_file, index=False)
-print(f"\n✅ Cleaned dataset saved to: {output_file}")
-print(f"✅ Ready for model training!")
+        # Load the dataset
+        print("Loading dataset...")
+        data = pd.read_csv(args.input)
+
+        print(f"Original dataset size: {len(data)} rows")
+
+        data = clean_dataset(data)
+        print_summary(data)
+
+        # Save cleaned dataset
+        writer = CleanedWriter(args.output, args.csv)
+        writer.write(data)
+        writer.close()
+
+    for path in [args.output] + ([args.csv] if args.csv else []):
+        print(f"\n✅ Cleaned dataset saved to: {path}")
+    print(f"✅ Ready for model training!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Compress the trained forest for serving.
+
+Tries smaller tree counts and depth cuts of model.pkl and keeps the least
+compressed one that meets a single-row latency and/or size target while its
+top-7 results still overlap the full model's by at least --min-overlap on the
+held-out split used by train_model.py. The compact forest is written to
+forest_compact/, which the app and prediction service load by default, and
+the measurements to compression_report.json. If the full model already meets
+the target, nothing is written there and an older compact forest is removed,
+so the app serves the model bundle. If train_model.py built a lookup table,
+it is rebuilt from the forest that now serves, for the same pairs and grid, so
+grid hits and misses come from the same model.
+
+Usage:
+    python compress_model.py
+    python compress_model.py --target-latency-ms 0.5 --min-overlap 0.97
+    python compress_model.py --target-size-mb 50
+"""
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from bench_engine import time_call
+from forest_engine import COMPACT_DIR, LEAF_DTYPES, FlatForest
+from model_bundle import encoder_fingerprint
+from predictor import LOOKUP_DIR, TOP_K, LookupTable, check_model, load_encoders, load_model, top_k_from_proba
+
+REPORT_FILE = 'compression_report.json'
+DEFAULT_TARGET_LATENCY_MS = 1.0
+DEFAULT_MIN_OVERLAP = 0.95
+TREE_FRACTIONS = [1.0, 0.75, 0.5, 0.33, 0.25, 0.15, 0.1]
+DEPTH_CUTS = [None, 24, 20, 16, 12, 10, 8]
+
+
+def split_features(data_file, label_encoders, le_target):
+    """Encode the cleaned dataset and rebuild train_model.py's split; returns X_train, X_test, y_train, y_test"""
+    data = pd.read_parquet(data_file) if data_file.endswith('.parquet') else pd.read_csv(data_file)
+    known = data['Institute Name'].isin(le_target.classes_)
+    for column in ['Course Name', 'Location']:
+        known &= data[column].isin(label_encoders[column].classes_)
+    data = data[known]
+
+    X = np.column_stack([
+        data['Percentile'].to_numpy(dtype=float),
+        label_encoders['Course Name'].transform(np.asarray(data['Course Name'], dtype=object)),
+        label_encoders['Location'].transform(np.asarray(data['Location'], dtype=object)),
+    ]).astype(float)
+    y = le_target.transform(np.asarray(data['Institute Name'], dtype=object))
+    counts = np.bincount(y)
+    keep = counts[y] >= 2
+    return train_test_split(X[keep], y[keep], test_size=0.2, random_state=42, stratify=y[keep])
+
+
+def sample_rows(X, y, n_rows, seed=0):
+    """Up to n_rows random rows of X and y"""
+    if len(X) > n_rows:
+        rows = np.random.default_rng(seed).choice(len(X), n_rows, replace=False)
+        X, y = X[rows], y[rows]
+    return X, y
+
+
+def validation_features(data_file, label_encoders, le_target, n_rows, seed=0, return_targets=False):
+    """Rebuild train_model.py's held-out split and sample up to n_rows encoded rows (and targets) from it"""
+    _, X_test, _, y_test = split_features(data_file, label_encoders, le_target)
+    X_test, y_test = sample_rows(X_test, y_test, n_rows, seed)
+    return (X_test, y_test) if return_targets else X_test
+
+
+def top_k_overlap(expected, actual):
+    """Mean fraction of each row's expected top-k classes that also appear in the actual top-k"""
+    return float((actual[:, :, None] == expected[:, None, :]).any(axis=2).mean())
+
+
+def measure(engine, X, reference_top, repeats):
+    """Single-row latency, array size and top-k overlap with the reference for one engine"""
+    top, _ = top_k_from_proba(engine.predict_proba(X), TOP_K)
+    return {
+        'n_trees': engine.n_trees,
+        'max_depth': engine.max_depth,
+        'latency_ms': time_call(engine.predict_proba, X[:1], repeats) * 1000,
+        'size_mb': engine.nbytes / 1e6,
+        'top7_overlap': top_k_overlap(reference_top, engine.classes_[top]),
+    }
+
+
+def meets_target(result, target_latency_ms, target_size_mb):
+    return ((target_latency_ms is None or result['latency_ms'] <= target_latency_ms)
+            and (target_size_mb is None or result['size_mb'] <= target_size_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compress the trained forest for serving')
+    parser.add_argument('--data', default=None,
+                        help='Cleaned dataset (default: dataset_cleaned.parquet, else dataset_cleaned.csv)')
+    parser.add_argument('--target-latency-ms', type=float, default=None,
+                        help='Single-row latency target (default: 1.0 unless --target-size-mb is set)')
+    parser.add_argument('--target-size-mb', type=float, default=None,
+                        help='Engine array size target')
+    parser.add_argument('--min-overlap', type=float, default=DEFAULT_MIN_OVERLAP,
+                        help='Minimum mean top-7 overlap with the full model (default: 0.95)')
+    parser.add_argument('--leaf-dtype', choices=LEAF_DTYPES, default='float64',
+                        help='Precision of the compact forest\'s leaf probabilities')
+    parser.add_argument('--val-rows', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+    if args.target_latency_ms is None and args.target_size_mb is None:
+        args.target_latency_ms = DEFAULT_TARGET_LATENCY_MS
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    with open('model.pkl', 'rb') as model_file:
+        model = pickle.load(model_file)
+    label_encoders, le_target = load_encoders()
+    # The compact forest is stamped with these encoders, so model.pkl must come from the same run
+    check_model(model, label_encoders, le_target)
+    data_file = args.data or ('dataset_cleaned.parquet' if os.path.exists('dataset_cleaned.parquet')
+                              else 'dataset_cleaned.csv')
+
+    print("="*60)
+    print("FOREST COMPRESSION")
+    print("="*60)
+    X = validation_features(data_file, label_encoders, le_target, args.val_rows)
+    full = FlatForest.from_sklearn(model)
+    full_top, _ = top_k_from_proba(full.predict_proba(X), TOP_K)
+    full_top = full.classes_[full_top]
+    baseline = measure(full, X, full_top, args.repeats)
+    print(f"Validation rows: {len(X)}")
+    print(f"Full model: {baseline['n_trees']} trees, depth {baseline['max_depth']}, "
+          f"{baseline['latency_ms']:.3f}ms, {baseline['size_mb']:.1f}MB")
+
+    print(f"\n{'trees':>6} {'depth':>6} {'latency':>10} {'size':>9} {'top-7 overlap':>14}")
+    results = []
+    for depth in DEPTH_CUTS:
+        for fraction in TREE_FRACTIONS:
+            n_trees = max(1, int(round(model.n_estimators * fraction)))
+            engine = FlatForest.from_sklearn(model, n_trees=n_trees, max_depth=depth,
+                                             leaf_dtype=args.leaf_dtype)
+            result = measure(engine, X, full_top, args.repeats)
+            results.append(result)
+            print(f"{result['n_trees']:>6} {result['max_depth']:>6} {result['latency_ms']:>8.3f}ms "
+                  f"{result['size_mb']:>7.1f}MB {result['top7_overlap'] * 100:>13.2f}%")
+            # Fewer trees at the same depth only lose more agreement
+            if result['top7_overlap'] < args.min_overlap:
+                break
+
+    feasible = [result for result in results if result['top7_overlap'] >= args.min_overlap]
+    if not feasible:
+        print("\n" + "="*60)
+        print(f"❌ No config kept a top-7 overlap of {args.min_overlap * 100:.1f}% with the full model, "
+              f"not even the full-size forest with {args.leaf_dtype} leaves")
+        print(f"   {COMPACT_DIR} was not written; lower --min-overlap or use a wider --leaf-dtype")
+        raise SystemExit(1)
+    meeting = [result for result in feasible
+               if meets_target(result, args.target_latency_ms, args.target_size_mb)]
+    if meeting:
+        chosen = max(meeting, key=lambda result: (result['top7_overlap'], -result['size_mb']))
+    else:
+        key = 'latency_ms' if args.target_latency_ms is not None else 'size_mb'
+        chosen = min(feasible, key=lambda result: result[key])
+
+    fingerprint = encoder_fingerprint(label_encoders, le_target)
+    # The full forest at full precision is what the bundle already serves; a copy would
+    # only sit outside the bundle's checksums
+    replaced = False
+    compressed = not (chosen['n_trees'] == baseline['n_trees'] and chosen['max_depth'] == baseline['max_depth']
+                      and args.leaf_dtype == 'float64')
+    if compressed:
+        serving = FlatForest.from_sklearn(model, n_trees=chosen['n_trees'], max_depth=chosen['max_depth'],
+                                          leaf_dtype=args.leaf_dtype)
+        # Stamped like the bundle's forest, so it is refused if the encoders change under it
+        serving.encoder_fingerprint = fingerprint
+        serving.save(COMPACT_DIR)
+    else:
+        replaced = os.path.exists(COMPACT_DIR)
+        if replaced:
+            shutil.rmtree(COMPACT_DIR)
+        serving = load_model()
+
+    lookup_pairs = None
+    # A table built by train_model.py already comes from the bundle's forest
+    if os.path.exists(LOOKUP_DIR) and (compressed or replaced):
+        # Grid hits must come from the model that scores the misses
+        previous = LookupTable.load(LOOKUP_DIR, mmap=False)
+        flat = np.flatnonzero(previous.pair_index >= 0)
+        flat = flat[np.argsort(previous.pair_index[flat])]
+        pairs = np.column_stack([flat // previous.n_locations, flat % previous.n_locations])
+        lookup_table = LookupTable.build(serving, pairs, len(label_encoders['Course Name'].classes_),
+                                         previous.n_locations, step=previous.step)
+        del previous
+        lookup_table.encoder_fingerprint = fingerprint
+        lookup_table.save(LOOKUP_DIR)
+        lookup_pairs = len(pairs)
+
+    report = {
+        'target_latency_ms': args.target_latency_ms,
+        'target_size_mb': args.target_size_mb,
+        'min_overlap': args.min_overlap,
+        'target_met': bool(meeting),
+        'compressed': compressed,
+        'validation_rows': len(X),
+        'full': baseline,
+        'compact': chosen,
+        'speedup': baseline['latency_ms'] / chosen['latency_ms'],
+        'size_reduction': 1 - chosen['size_mb'] / baseline['size_mb'],
+        'candidates': results,
+        'lookup_rebuilt_pairs': lookup_pairs,
+    }
+    with open(REPORT_FILE, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print("\n" + "="*60)
+    if not meeting:
+        print("⚠️  No config met the target with enough overlap; using the fastest one that kept it")
+    if compressed:
+        print(f"✅ {COMPACT_DIR} saved: {chosen['n_trees']} trees, depth {chosen['max_depth']}")
+        print(f"   Speedup:        {report['speedup']:.1f}x ({chosen['latency_ms']:.3f}ms per row)")
+        print(f"   Size reduction: {report['size_reduction'] * 100:.1f}% ({chosen['size_mb']:.1f}MB)")
+        print(f"   Top-7 overlap:  {chosen['top7_overlap'] * 100:.2f}%")
+    else:
+        print(f"✅ No compression needed: the full model already meets the target "
+              f"({chosen['latency_ms']:.3f}ms per row, {chosen['size_mb']:.1f}MB)")
+        print(f"   {COMPACT_DIR} not written; the app serves the model bundle")
+    if lookup_pairs is not None:
+        source = 'the compact forest' if compressed else 'the served model'
+        print(f"✅ {LOOKUP_DIR} rebuilt from {source} ({lookup_pairs} course/location pairs)")
+    print(f"✅ {REPORT_FILE} saved")
+
+
+if __name__ == '__main__':
+    main()
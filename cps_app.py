@@ -1,7 +1,13 @@
-import streamlit as st
-import pickle
-import pandas as pd
 import os
+import time
+
+import streamlit as st
+
+import metrics
+from app_loader import ArtifactLoader, mark
+from model_metadata import BUNDLE_MANIFEST, METADATA_FILE, ModelMetadata, load_metadata
+
+mark('script_start')
 
 # Set page configuration
 st.set_page_config(
@@ -11,26 +17,42 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Load model and encoders
+WHAT_IF_SPAN = 5.0
+MAX_SELECTIONS = 10
+FOREST_ENGINE = "Random Forest"
+CUTOFF_ENGINE = "Cutoff Index"
+
+# Load model and encoders in the background; the static tabs render meanwhile
+@st.cache_resource
+def get_loader():
+    """Start loading the pre-trained models, once per process; new versions are hot reloaded"""
+    loader = ArtifactLoader.from_env()
+    # Model version gauges, served with the stage timings when CPS_METRICS_PORT or CPS_METRICS_FILE is set
+    metrics.set_collector('model', lambda: metrics.loader_samples(loader))
+    metrics.start_exporter()
+    return loader
+
+@st.cache_resource
+def get_metadata(modified):
+    """Form options and real counts from the training sidecar, reloaded when it or the bundle changes"""
+    return load_metadata(METADATA_FILE)
+
 @st.cache_resource
-def load_models():
-    """Load pre-trained models from pickle files"""
-    try:
-        with open('model.pkl', 'rb') as model_file:
-            model = pickle.load(model_file)
-        with open('label_encoders.pkl', 'rb') as enc_file:
-            label_encoders = pickle.load(enc_file)
-        with open('target_encoder.pkl', 'rb') as target_file:
-            le_target = pickle.load(target_file)
-        return model, label_encoders, le_target
-    except FileNotFoundError as e:
-        st.error(f"❌ Error: Model files not found!")
-        st.error("Required files: model.pkl, label_encoders.pkl, target_encoder.pkl")
-        st.error("Please ensure all model files are in the same directory as the app.")
-        st.stop()
+def get_prediction_cache():
+    """Process-wide result cache shared by every session"""
+    from prediction_cache import PredictionCache
+    cache = PredictionCache.from_env()
+    metrics.set_collector('cache', lambda: metrics.cache_samples(cache))
+    return cache
 
 try:
-    model, label_encoders, le_target = load_models()
+    loader = get_loader()
+    if loader.error is not None:
+        # Retry on the next run, e.g. once the model files have been downloaded
+        get_loader.clear()
+    # Small JSON written by train_model.py; None for models trained before it existed
+    metadata = get_metadata(tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                                  for path in [METADATA_FILE, BUNDLE_MANIFEST]))
     
     # Custom CSS for clean professional look
     st.markdown("""
@@ -235,6 +257,76 @@ try:
             </div>
         """, unsafe_allow_html=True)
 
+    with tab3:
+        st.markdown("<br>", unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2, gap="large")
+        
+        with col1:
+            st.markdown("""
+                <div style='background: white; padding: 1.8rem; border-radius: 12px; 
+                box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
+                    <h3 style='color: #667eea; margin-bottom: 1rem;'>🔗 Official Portals</h3>
+                    <ul style='line-height: 2.5; color: #2c3e50; list-style: none; padding: 0;'>
+                        <li>🌐 <a href='https://cetcell.mahacet.org' target='_blank' 
+                        style='color: #667eea; text-decoration: none; font-weight: 500;'>
+                        CET Cell Website</a></li>
+                        <li>🌐 <a href='https://jeemain.nta.nic.in' target='_blank' 
+                        style='color: #667eea; text-decoration: none; font-weight: 500;'>
+                        JEE Mains Portal</a></li>
+                        <li>🌐 <a href='https://neet.nta.nic.in' target='_blank' 
+                        style='color: #667eea; text-decoration: none; font-weight: 500;'>
+                        NEET Portal</a></li>
+                    </ul>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown("""
+                <div style='background: white; padding: 1.8rem; border-radius: 12px; 
+                box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
+                    <h3 style='color: #764ba2; margin-bottom: 1rem;'>ℹ️ About</h3>
+                    <p style='line-height: 1.8; color: #2c3e50;'>
+                        This system uses <strong>Machine Learning</strong> trained on historical 
+                        admission data to predict college matches.
+                    </p>
+                    <p style='line-height: 1.8; color: #2c3e50; margin-top: 1rem;'>
+                        <strong>Analysis based on:</strong><br>
+                        • CET scores<br>
+                        • Location preferences<br>
+                        • Course requirements<br>
+                        • Historical trends
+                    </p>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        st.markdown("<br><br>", unsafe_allow_html=True)
+        
+        st.markdown("<h3 style='text-align: center; color: #667eea;'>📊 System Stats</h3>", unsafe_allow_html=True)
+        st.markdown("<br>", unsafe_allow_html=True)
+        
+        col1, col2, col3 = st.columns(3)
+        
+        counts = metadata.counts if metadata is not None else {}
+        stats = [
+            ("🎓", counts.get('institutes', '—'), "Colleges", "#667eea"),
+            ("📚", counts.get('courses', '—'), "Courses", "#764ba2"),
+            ("📍", counts.get('locations', '—'), "Locations", "#2196f3")
+        ]
+        
+        for col, (icon, value, label, color) in zip([col1, col2, col3], stats):
+            with col:
+                st.markdown(f"""
+                    <div style='background: white; padding: 1.5rem; border-radius: 12px; 
+                    text-align: center; box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
+                        <div style='font-size: 2rem;'>{icon}</div>
+                        <div style='color: {color}; font-size: 1.8rem; font-weight: 700; margin: 0.5rem 0;'>{value}</div>
+                        <div style='color: #7f8c8d; font-size: 0.9rem;'>{label}</div>
+                    </div>
+                """, unsafe_allow_html=True)
+
+    mark('first_render')
+
     with tab2:
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -248,9 +340,40 @@ try:
             </div>
         """, unsafe_allow_html=True)
         
-        # Get unique values
-        locations = sorted(list(label_encoders['Location'].classes_))
-        courses = sorted(list(label_encoders['Course Name'].classes_))
+        from cutoff_index import CUTOFF_DIR
+        
+        if metadata is None:
+            # Without the sidecar the options come from the encoders (the model loads after them)
+            if loader.encoders is None:
+                with st.spinner("⏳ Loading course and location options..."):
+                    loader.wait_encoders()
+            label_encoders, le_target, _ = loader.wait_encoders()
+            metadata = ModelMetadata.from_encoders(label_encoders, le_target)
+        
+        # Outside the form so the course list narrows as soon as the locations change
+        col1, col2 = st.columns(2, gap="medium")
+        
+        with col1:
+            selected_locations = st.multiselect(
+                "📍 Locations",
+                options=metadata.locations,
+                default=metadata.locations[:1],
+                max_selections=MAX_SELECTIONS
+            )
+        
+        with col2:
+            courses = metadata.courses_in(selected_locations)
+            selected_courses = st.multiselect(
+                "📚 Courses",
+                options=courses,
+                default=courses[:1],
+                max_selections=MAX_SELECTIONS,
+                help="Only courses offered in the selected locations are listed"
+            )
+        
+        percentile_range = metadata.percentile_range(selected_courses, selected_locations)
+        if percentile_range is not None:
+            st.caption(f"📈 Admitted percentiles for these choices: {percentile_range[0]:.1f} – {percentile_range[1]:.1f}")
         
         # Create form
         with st.form("prediction_form", clear_on_submit=False):
@@ -259,59 +382,108 @@ try:
                 box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
             """, unsafe_allow_html=True)
             
-            col1, col2, col3 = st.columns(3, gap="medium")
-            
-            with col1:
-                location = st.selectbox(
-                    "📍 Location",
-                    options=locations,
-                    index=0
-                )
+            cet_score = st.number_input(
+                "📊 CET Score",
+                min_value=0.0,
+                max_value=100.0,
+                value=50.0,
+                step=0.5,
+                format="%.1f"
+            )
             
-            with col2:
-                cet_score = st.number_input(
-                    "📊 CET Score",
-                    min_value=0.0,
-                    max_value=100.0,
-                    value=50.0,
-                    step=0.5,
-                    format="%.1f"
+            # The cutoff index is optional; without it the forest is the only engine
+            engine = FOREST_ENGINE
+            if os.path.exists(CUTOFF_DIR):
+                engine = st.radio(
+                    "🧠 Prediction Engine",
+                    options=[FOREST_ENGINE, CUTOFF_ENGINE],
+                    horizontal=True,
+                    help="Cutoff Index ranks institutes by where your score falls in their historical admits"
                 )
             
-            with col3:
-                course = st.selectbox(
-                    "📚 Course",
-                    options=courses,
-                    index=0
-                )
+            what_if = st.checkbox(
+                f"📈 Show how my matches change for scores ±{WHAT_IF_SPAN:g} percentile"
+            )
             
             st.markdown("</div>", unsafe_allow_html=True)
             st.markdown("<br>", unsafe_allow_html=True)
             
             submit = st.form_submit_button("🔍 Predict Colleges")
+        mark('form_ready')
+        
+        if submit and not (selected_courses and selected_locations):
+            st.warning("⚠️ Select at least one course and one location")
+            st.stop()
+        
+        if submit:
+            # The sidecar renders the form; predictions still need the encoders
+            if loader.encoders is None:
+                with st.spinner("⏳ Loading course and location options..."):
+                    loader.wait_encoders()
+            label_encoders, le_target, cutoff_index = loader.wait_encoders()
+            if engine == CUTOFF_ENGINE and cutoff_index is None:
+                # Left by another training run and refused at load
+                st.warning("⚠️ The cutoff index does not match the current model; using the Random Forest")
+                engine = FOREST_ENGINE
+        
+        if submit and engine == FOREST_ENGINE:
+            if not loader.ready:
+                with st.spinner("⏳ Loading the prediction model..."):
+                    loader.wait_model()
+            model, label_encoders, le_target, lookup_table, loaded_version = loader.wait_model()
+            from prediction_cache import cached_prediction
+            prediction_cache = get_prediction_cache()
+            prediction_cache.validate(loaded_version)
         
         if submit:
+            request_start = time.perf_counter()
             with st.spinner("🔄 Analyzing your profile..."):
                 try:
-                    # Prepare and encode input
-                    input_data = [[cet_score, course, location]]
-                    input_data[0][1] = label_encoders['Course Name'].transform([input_data[0][1]])[0]
-                    input_data[0][2] = label_encoders['Location'].transform([input_data[0][2]])[0]
+                    engine_model = cutoff_index if engine == CUTOFF_ENGINE else model
+                    if len(selected_courses) == 1 and len(selected_locations) == 1:
+                        course, location = selected_courses[0], selected_locations[0]
+                        if engine == CUTOFF_ENGINE:
+                            # Binary search over historical cutoffs; no model needed
+                            institutes, probabilities = cutoff_index.predict_names(
+                                label_encoders, le_target, course, location, cet_score
+                            )
+                        else:
+                            # Get predictions (result cache, then precomputed lookup, then live model)
+                            institutes, probabilities = cached_prediction(
+                                prediction_cache, model, label_encoders, le_target, lookup_table,
+                                course, location, cet_score, loaded_version
+                            )
+                        matches = [(institute, prob, course, location)
+                                   for institute, prob in zip(institutes, probabilities)]
+                    else:
+                        # Every course/location combination in one batch, ranked together
+                        from predictor import predict_combinations
+                        with metrics.stage('encode'):
+                            selected_course_codes = label_encoders['Course Name'].transform(selected_courses)
+                            selected_location_codes = label_encoders['Location'].transform(selected_locations)
+                        course_codes, location_codes, codes, probabilities = predict_combinations(
+                            engine_model, selected_course_codes, selected_location_codes, cet_score
+                        )
+                        with metrics.stage('decode'):
+                            matches = list(zip(
+                                le_target.inverse_transform(codes),
+                                probabilities * 100,
+                                label_encoders['Course Name'].inverse_transform(course_codes),
+                                label_encoders['Location'].inverse_transform(location_codes)
+                            ))
                     
-                    # Get predictions
-                    predictions = model.predict_proba(input_data)[0]
-                    top_indices = predictions.argsort()[-7:][::-1]
-                    top_predictions = [model.classes_[i] for i in top_indices]
-                    institutes = le_target.inverse_transform(top_predictions).tolist()
-                    probabilities = [predictions[i] * 100 for i in top_indices]
+                    if not matches:
+                        st.warning("⚠️ No college in the historical data admitted this score for these courses and locations")
+                        st.stop()
                     
                     st.success("✅ Prediction Complete!")
                     st.markdown("<br>", unsafe_allow_html=True)
                     
-                    st.markdown("<h3 style='text-align: center; color: #667eea;'>🏆 Your Top 7 College Matches</h3>", unsafe_allow_html=True)
+                    st.markdown(f"<h3 style='text-align: center; color: #667eea;'>🏆 Your Top {len(matches)} College Matches</h3>", unsafe_allow_html=True)
                     st.markdown("<br>", unsafe_allow_html=True)
                     
-                    for idx, (institute, prob) in enumerate(zip(institutes, probabilities), 1):
+                    render_start = time.perf_counter()
+                    for idx, (institute, prob, course, location) in enumerate(matches, 1):
                         if idx == 1:
                             badge = "🥇"
                             color = "#FFD700"
@@ -347,81 +519,50 @@ try:
                             </div>
                         """, unsafe_allow_html=True)
                     
+                    metrics.observe('render', time.perf_counter() - render_start)
                     st.markdown("<br>", unsafe_allow_html=True)
                     st.info("💡 Match percentages indicate admission probability based on historical data")
                     
+                    if what_if:
+                        # Every score in the range is scored in one batch instead of one rerun per score
+                        import numpy as np
+                        from predictor import score_sweep
+                        pairs = list(dict.fromkeys((course, location) for _, _, course, location in matches))
+                        scores, proba = score_sweep(
+                            engine_model,
+                            label_encoders['Course Name'].transform([course for course, _ in pairs]),
+                            label_encoders['Location'].transform([location for _, location in pairs]),
+                            cet_score,
+                            span=WHAT_IF_SPAN
+                        )
+                        columns = np.searchsorted(engine_model.classes_,
+                                                  le_target.transform([match[0] for match in matches]))
+                        chart = {"CET Score": scores}
+                        for (institute, _, course, location), column in zip(matches, columns):
+                            name = institute if len(pairs) == 1 else f"{institute} ({course}, {location})"
+                            chart[name] = proba[pairs.index((course, location)), :, column] * 100
+                        
+                        st.markdown("<br>", unsafe_allow_html=True)
+                        st.markdown("<h3 style='text-align: center; color: #667eea;'>📈 What If My Score Changes?</h3>", unsafe_allow_html=True)
+                        st.line_chart(chart, x="CET Score", y=list(chart)[1:])
+                        st.caption(f"Match % of your top colleges for CET scores {scores[0]:.1f} to {scores[-1]:.1f} "
+                                   f"({len(scores) * len(pairs)} scores in one prediction)")
+                    
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
-
-    with tab3:
-        st.markdown("<br>", unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2, gap="large")
-        
-        with col1:
-            st.markdown("""
-                <div style='background: white; padding: 1.8rem; border-radius: 12px; 
-                box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
-                    <h3 style='color: #667eea; margin-bottom: 1rem;'>🔗 Official Portals</h3>
-                    <ul style='line-height: 2.5; color: #2c3e50; list-style: none; padding: 0;'>
-                        <li>🌐 <a href='https://cetcell.mahacet.org' target='_blank' 
-                        style='color: #667eea; text-decoration: none; font-weight: 500;'>
-                        CET Cell Website</a></li>
-                        <li>🌐 <a href='https://jeemain.nta.nic.in' target='_blank' 
-                        style='color: #667eea; text-decoration: none; font-weight: 500;'>
-                        JEE Mains Portal</a></li>
-                        <li>🌐 <a href='https://neet.nta.nic.in' target='_blank' 
-                        style='color: #667eea; text-decoration: none; font-weight: 500;'>
-                        NEET Portal</a></li>
-                    </ul>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown("""
-                <div style='background: white; padding: 1.8rem; border-radius: 12px; 
-                box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
-                    <h3 style='color: #764ba2; margin-bottom: 1rem;'>ℹ️ About</h3>
-                    <p style='line-height: 1.8; color: #2c3e50;'>
-                        This system uses <strong>Machine Learning</strong> trained on historical 
-                        admission data to predict college matches.
-                    </p>
-                    <p style='line-height: 1.8; color: #2c3e50; margin-top: 1rem;'>
-                        <strong>Analysis based on:</strong><br>
-                        • CET scores<br>
-                        • Location preferences<br>
-                        • Course requirements<br>
-                        • Historical trends
-                    </p>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("<br><br>", unsafe_allow_html=True)
-        
-        st.markdown("<h3 style='text-align: center; color: #667eea;'>📊 System Stats</h3>", unsafe_allow_html=True)
-        st.markdown("<br>", unsafe_allow_html=True)
-        
-        col1, col2, col3 = st.columns(3)
-        
-        stats = [
-            ("🎓", "358", "Colleges", "#667eea"),
-            ("📚", "108", "Courses", "#764ba2"),
-            ("📍", "124", "Locations", "#2196f3")
-        ]
-        
-        for col, (icon, value, label, color) in zip([col1, col2, col3], stats):
-            with col:
-                st.markdown(f"""
-                    <div style='background: white; padding: 1.5rem; border-radius: 12px; 
-                    text-align: center; box-shadow: 0 2px 8px rgba(0,0,0,0.08);'>
-                        <div style='font-size: 2rem;'>{icon}</div>
-                        <div style='color: {color}; font-size: 1.8rem; font-weight: 700; margin: 0.5rem 0;'>{value}</div>
-                        <div style='color: #7f8c8d; font-size: 0.9rem;'>{label}</div>
-                    </div>
-                """, unsafe_allow_html=True)
+            metrics.observe('request', time.perf_counter() - request_start)
+        
+        # The version answering now; a newer bundle on disk is swapped in by the loader
+        if loader.ready:
+            status = loader.status()
+            st.caption(f"🧬 Model version {status['version']} · loaded "
+                       f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(status['loaded_at']))} · "
+                       f"{status['reloads']} hot reloads")
+            if status['placeholder']:
+                st.warning("⚠️ These are placeholder models from setup_models.py, not a trained model")
 
 except FileNotFoundError:
     st.error("⚠️ **Model files not found!**")
-    st.info("Please ensure model.pkl, label_encoders.pkl, and target_encoder.pkl exist in the directory.")
+    st.info("Please run train_model.py so the model_bundle directory exists.")
 except Exception as e:
     st.error(f"❌ **Error:** {str(e)}")
@@ -0,0 +1,220 @@
+"""
+Cutoff-index prediction engine.
+
+The historical data is a set of admitted percentiles per (institute, course,
+location). This engine keeps them as sorted arrays, one per institute, grouped
+by (course, location) pair, and answers a query with binary search instead of
+a model: an institute is reachable if someone was admitted at or below the
+student's percentile, and reachable institutes are ranked by the share of
+their own admits within --bandwidth percentile points of the student. Each
+institute's distribution is weighed equally, like the forest's balanced class
+weights, and the shares are normalized into match percentages.
+
+All (course, location, institute) groups live in one sorted float64 array of
+keys, group * KEY_STRIDE + percentile, so one np.searchsorted call handles
+every group of every query in a batch.
+"""
+
+import numpy as np
+
+import metrics
+from artifacts import save_arrays, load_arrays
+
+CUTOFF_DIR = 'cutoff_index'
+DEFAULT_BANDWIDTH = 2.0
+# Percentiles are within [0, 100]; a query is clipped to +/-_QUERY_LIMIT so it
+# never reaches into a neighbouring group
+KEY_STRIDE = 1000.0
+_QUERY_LIMIT = 400.0
+
+
+class CutoffIndex:
+    """Sorted admitted percentiles per (course, location, institute), searched per query"""
+
+    def __init__(self, keys, group_ptr, group_institute, pair_ptr, pair_index, n_locations,
+                 n_institutes, bandwidth=DEFAULT_BANDWIDTH, encoder_fingerprint=None):
+        self.keys = keys
+        self.group_ptr = group_ptr
+        self.group_institute = group_institute
+        self.pair_ptr = pair_ptr
+        self.pair_index = pair_index
+        self.n_locations = int(n_locations)
+        # Same class order as the forest, so it can stand in for it in predict_proba()
+        self.classes_ = np.arange(int(n_institutes))
+        self.bandwidth = float(bandwidth)
+        # Set by train_model.py to the model bundle's fingerprint; None for older indexes
+        self.encoder_fingerprint = encoder_fingerprint
+
+    @classmethod
+    def build(cls, percentiles, course_codes, location_codes, institute_codes, n_courses, n_locations,
+              n_institutes, bandwidth=DEFAULT_BANDWIDTH):
+        """Group encoded historical records by (course, location, institute) and sort each group"""
+        percentiles = np.asarray(percentiles, dtype=np.float64)
+        institutes = np.asarray(institute_codes, dtype=np.int64)
+        pairs = np.asarray(course_codes, dtype=np.int64) * n_locations + np.asarray(location_codes, dtype=np.int64)
+        order = np.lexsort((percentiles, institutes, pairs))
+        percentiles, institutes, pairs = percentiles[order], institutes[order], pairs[order]
+
+        starts = np.flatnonzero(np.r_[True, (pairs[1:] != pairs[:-1]) | (institutes[1:] != institutes[:-1])])
+        group_ptr = np.r_[starts, len(pairs)].astype(np.int64)
+        group_of_row = np.repeat(np.arange(len(starts)), np.diff(group_ptr))
+        keys = group_of_row * KEY_STRIDE + percentiles
+
+        group_pair = pairs[starts]
+        pair_starts = np.flatnonzero(np.r_[True, group_pair[1:] != group_pair[:-1]])
+        pair_ptr = np.r_[pair_starts, len(starts)].astype(np.int64)
+        pair_index = np.full(n_courses * n_locations, -1, dtype=np.int32)
+        pair_index[group_pair[pair_starts]] = np.arange(len(pair_starts), dtype=np.int32)
+
+        return cls(keys, group_ptr, institutes[starts].astype(np.int32), pair_ptr, pair_index,
+                   n_locations, n_institutes, bandwidth)
+
+    @property
+    def n_pairs(self):
+        return len(self.pair_ptr) - 1
+
+    @property
+    def n_groups(self):
+        return len(self.group_ptr) - 1
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in [self.keys, self.group_ptr, self.group_institute,
+                                              self.pair_ptr, self.pair_index])
+
+    def check(self, label_encoders, le_target):
+        """Raise ValueError if the index was not built for encoders of this size"""
+        n_courses, n_locations = len(label_encoders['Course Name'].classes_), len(label_encoders['Location'].classes_)
+        if self.n_locations != n_locations or len(self.pair_index) != n_courses * n_locations:
+            raise ValueError("built for a different set of courses or locations; retrain the model")
+        if len(self.classes_) != len(le_target.classes_):
+            raise ValueError(f"built for {len(self.classes_)} institutes, the encoders have "
+                             f"{len(le_target.classes_)}; retrain the model")
+
+    def _pair_rows(self, course_codes, location_codes):
+        """Pair row of each query, -1 for combinations never seen in the data"""
+        courses = np.asarray(course_codes, dtype=np.int64)
+        locations = np.asarray(location_codes, dtype=np.int64)
+        flat = courses * self.n_locations + locations
+        known = (locations >= 0) & (locations < self.n_locations) & (flat >= 0) & (flat < len(self.pair_index))
+        rows = np.full(len(flat), -1, dtype=np.int64)
+        rows[known] = self.pair_index[flat[known]]
+        return rows
+
+    def _match(self, groups, scores):
+        """Reachability and match score of the student percentile(s) against each group"""
+        base = groups * KEY_STRIDE
+        scores = np.clip(scores, self.bandwidth - _QUERY_LIMIT, _QUERY_LIMIT - self.bandwidth)
+        low = np.searchsorted(self.keys, base + (scores - self.bandwidth), side='left')
+        at = np.searchsorted(self.keys, base + scores, side='right')
+        high = np.searchsorted(self.keys, base + (scores + self.bandwidth), side='right')
+        start, end = self.group_ptr[groups], self.group_ptr[groups + 1]
+        match = (high - low) / (end - start)
+        # Reachable institutes with no admits nearby (the student is far above all of
+        # them) rank last, the most selective first
+        top_admit = self.keys[end - 1] - base
+        return at > start, np.where(match > 0, match, 1e-9 * top_admit / 100)
+
+    def candidates(self, course_codes, location_codes, scores):
+        """Match scores of every candidate group; returns (query index, group, score) arrays"""
+        rows = self._pair_rows(course_codes, location_codes)
+        scores = np.asarray(scores, dtype=np.float64)
+        found = rows >= 0
+        first = np.where(found, self.pair_ptr[np.maximum(rows, 0)], 0)
+        counts = np.where(found, self.pair_ptr[np.maximum(rows, 0) + 1] - first, 0)
+
+        # Expand each query into its pair's contiguous run of groups
+        query = np.repeat(np.arange(len(rows)), counts)
+        offsets = np.arange(len(query)) - np.repeat(np.cumsum(counts) - counts, counts)
+        groups = np.repeat(first, counts) + offsets
+
+        reachable, match = self._match(groups, scores[query])
+        return query[reachable], groups[reachable], match[reachable]
+
+    def predict_proba(self, X):
+        """Normalized match scores of every institute for (percentile, course, location) rows"""
+        X = np.asarray(X, dtype=np.float64)
+        query, groups, match = self.candidates(X[:, 1].astype(np.int64), X[:, 2].astype(np.int64), X[:, 0])
+        totals = np.bincount(query, weights=match, minlength=len(X))
+        proba = np.zeros((len(X), len(self.classes_)))
+        proba[query, self.group_institute[groups]] = match / totals[query]
+        return proba
+
+    def predict_top_k(self, course_codes, location_codes, scores, k=7):
+        """Top-k institute codes and match probabilities per query; -1/0 pad rows with fewer candidates"""
+        n = len(np.atleast_1d(scores))
+        query, groups, match = self.candidates(course_codes, location_codes, np.atleast_1d(scores))
+        codes = np.full((n, k), -1, dtype=np.int64)
+        probabilities = np.zeros((n, k), dtype=np.float64)
+        if len(query) == 0:
+            return codes, probabilities
+
+        totals = np.bincount(query, weights=match, minlength=n)
+        # Rank within each query: by query, then by descending match
+        order = np.lexsort((-match, query))
+        query, groups, match = query[order], groups[order], match[order]
+        first = np.searchsorted(query, np.arange(n))
+        rank = np.arange(len(query)) - first[query]
+        keep = rank < k
+        codes[query[keep], rank[keep]] = self.group_institute[groups[keep]]
+        probabilities[query[keep], rank[keep]] = match[keep] / totals[query[keep]]
+        return codes, probabilities
+
+    def predict_one(self, course_code, location_code, score, k=7):
+        """(codes, probabilities) for one query, only as many as are reachable"""
+        # Same result as predict_top_k() without its batch bookkeeping, which dominates a single query
+        course_code, location_code = int(course_code), int(location_code)
+        flat = course_code * self.n_locations + location_code
+        row = -1
+        if 0 <= location_code < self.n_locations and 0 <= flat < len(self.pair_index):
+            row = self.pair_index[flat]
+        if row < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        groups = np.arange(self.pair_ptr[row], self.pair_ptr[row + 1])
+        reachable, match = self._match(groups, float(score))
+        groups, match = groups[reachable], match[reachable]
+        best = np.argsort(-match, kind='stable')[:k]
+        return self.group_institute[groups[best]].astype(np.int64), match[best] / match.sum()
+
+    def predict_names(self, label_encoders, le_target, course, location, score, k=7):
+        """Return (institutes, match percentages) for one student, like cached_prediction()"""
+        with metrics.stage('encode'):
+            course_code = label_encoders['Course Name'].transform([course])[0]
+            location_code = label_encoders['Location'].transform([location])[0]
+        with metrics.stage('cutoff'):
+            codes, probabilities = self.predict_one(course_code, location_code, score, k)
+        if len(codes) == 0:
+            return [], []
+        with metrics.stage('decode'):
+            return le_target.inverse_transform(codes).tolist(), (probabilities * 100).tolist()
+
+    def save(self, path=CUTOFF_DIR):
+        """Write the index as a memory-mappable artifact directory"""
+        save_arrays(
+            path,
+            {
+                'keys': self.keys,
+                'group_ptr': self.group_ptr,
+                'group_institute': self.group_institute,
+                'pair_ptr': self.pair_ptr,
+                'pair_index': self.pair_index,
+            },
+            meta={'n_locations': self.n_locations, 'n_institutes': len(self.classes_),
+                  'bandwidth': self.bandwidth, 'encoder_fingerprint': self.encoder_fingerprint},
+        )
+
+    @classmethod
+    def load(cls, path=CUTOFF_DIR, mmap=True):
+        """Open an index written by save(); arrays are mapped read-only unless mmap=False"""
+        arrays, meta = load_arrays(path, mmap=mmap)
+        return cls(
+            arrays['keys'],
+            arrays['group_ptr'],
+            arrays['group_institute'],
+            arrays['pair_ptr'],
+            arrays['pair_index'],
+            meta['n_locations'],
+            meta['n_institutes'],
+            meta['bandwidth'],
+            meta.get('encoder_fingerprint'),
+        )
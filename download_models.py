@@ -1,29 +1,334 @@
+"""
+Fetch the model bundle from a static file host.
+
+The host serves a copy of model_bundle/: manifest.json plus every file it
+lists, at the same relative paths. Files are split into --chunk-mb ranges that
+are downloaded concurrently, each into its own .part file, so an interrupted
+fetch resumes with Range requests where it stopped. Every file is checked
+against the manifest's sha256 and kept in a content-addressed cache
+(CPS_FETCH_CACHE, default ~/.cache/cps/blobs), locked per file, so replicas on
+one host download each version once. The bundle is then assembled from the
+cache with hard links and renamed into place, under a lock on the
+destination so replicas sharing one directory take turns.
+
+Usage:
+    python download_models.py https://example.com/models/v3
+    python download_models.py https://example.com/models/v3 --workers 8 --output fetch_results.json
+    python download_models.py --serve model_bundle --port 8700   # local stand-in for the host
+
+With CPS_MODEL_URL set, the app and prediction service fetch the bundle at
+startup when it is missing.
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
 import os
-import pickle
-import gdown
-import streamlit as st
-
-# Google Drive file IDs for model files
-MODEL_FILES = {
-    'model.pkl': '1YOUR_DRIVE_ID_MODEL',
-    'label_encoders.pkl': '1YOUR_DRIVE_ID_ENCODERS',
-    'target_encoder.pkl': '1YOUR_DRIVE_ID_TARGET'
-}
-
-def download_model_files():
-    """Download model files from Google Drive"""
-    for filename, drive_id in MODEL_FILES.items():
-        if not os.path.exists(filename):
-            st.info(f"📥 Downloading {filename}...")
-            try:
-                gdown.download(f'https://drive.google.com/uc?id={drive_id}', filename, quiet=False)
-                st.success(f"✅ Downloaded {filename}")
-            except Exception as e:
-                st.error(f"❌ Failed to download {filename}: {str(e)}")
-                return False
+import re
+import shutil
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; replicas may then download the same file twice
+    fcntl = None
+
+from model_bundle import BUNDLE_DIR, MANIFEST_FILE, file_sha256, swap_in, verify_bundle
+
+DEFAULT_CACHE_DIR = os.environ.get('CPS_FETCH_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'cps', 'blobs'))
+DEFAULT_WORKERS = 8
+DEFAULT_CHUNK_BYTES = 8 << 20
+RETRIES = 3
+TIMEOUT = 30
+
+
+def _get(url, start=None, end=None):
+    """Open url, asking for bytes [start, end) if start is given"""
+    headers = {} if start is None else {'Range': f"bytes={start}-{'' if end is None else end - 1}"}
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=TIMEOUT)
+
+
+def _lock(path):
+    """Open and exclusively lock path + '.lock'; close the returned file to release"""
+    lock_file = open(path + '.lock', 'w')
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def _is_current(dest, manifest_bytes):
+    """True if dest already holds an intact bundle with exactly this manifest"""
+    local_manifest = os.path.join(dest, MANIFEST_FILE)
+    if not os.path.exists(local_manifest) or file_sha256(local_manifest) != hashlib.sha256(manifest_bytes).hexdigest():
+        return False
+    try:
+        verify_bundle(dest)
+    except (OSError, ValueError):
+        return False
     return True
 
-if __name__ == "__main__":
-    if not all(os.path.exists(f) for f in MODEL_FILES.keys()):
-        if not download_model_files():
-            st.stop()
+
+def _fetch_manifest(url):
+    """Return (manifest bytes, whether the host serves ranges)"""
+    for attempt in range(RETRIES):
+        try:
+            with _get(url, 0) as response:
+                # A 206 to a range request means parts can be fetched and resumed separately
+                return response.read(), response.status == 206
+        except (OSError, http.client.HTTPException) as e:
+            if attempt == RETRIES - 1:
+                raise OSError(f'Fetching {url} failed after {RETRIES} attempts: {e}') from e
+
+
+def _fetch_part(url, part_path, start, end, ranges):
+    """Download bytes [start, end) of url into part_path, resuming from what it holds; returns bytes read"""
+    received = failures = 0
+    while True:
+        have = os.path.getsize(part_path) if ranges and os.path.exists(part_path) else 0
+        if have == end - start:
+            return received
+        before = received
+        try:
+            with _get(url, start + have if ranges else None, end) as response, \
+                    open(part_path, 'ab' if have else 'wb') as part_file:
+                if ranges and response.status != 206:
+                    raise OSError(f'{url} ignored the range request')
+                for block in iter(lambda: response.read(1 << 20), b''):
+                    part_file.write(block)
+                    received += len(block)
+            if not ranges:
+                break
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+        else:
+            error = 'connection closed early'
+        # Keep resuming while attempts make progress; without ranges every retry starts over
+        failures = 0 if ranges and received > before else failures + 1
+        if failures == RETRIES:
+            raise OSError(f'Fetching {url} failed after {RETRIES} attempts: {error}')
+    if os.path.getsize(part_path) != end - start:
+        raise OSError(f'{url} returned {os.path.getsize(part_path)} bytes, expected {end - start}')
+    return received
+
+
+class BlobCache:
+    """Files stored by sha256, shared by every process on the host"""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR):
+        self.path = path
+
+    def blob_path(self, sha256):
+        return os.path.join(self.path, sha256[:2], sha256)
+
+    def lock(self, sha256):
+        """Open and exclusively lock the blob's lock file; close it to release"""
+        os.makedirs(os.path.dirname(self.blob_path(sha256)), exist_ok=True)
+        return _lock(self.blob_path(sha256))
+
+    def has(self, sha256):
+        """True if the blob is cached intact; a damaged one is removed"""
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            return False
+        if file_sha256(path) == sha256:
+            return True
+        os.remove(path)
+        return False
+
+    def assemble(self, sha256, part_paths):
+        """Join downloaded parts into the blob, or raise ValueError if they do not match the checksum"""
+        path = self.blob_path(sha256)
+        digest = hashlib.sha256()
+        with open(path + '.tmp', 'wb') as blob_file:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part_file:
+                    for block in iter(lambda: part_file.read(1 << 20), b''):
+                        digest.update(block)
+                        blob_file.write(block)
+        for part_path in part_paths:
+            os.remove(part_path)
+        if digest.hexdigest() != sha256:
+            os.remove(path + '.tmp')
+            raise ValueError(f'Downloaded data does not match checksum {sha256[:12]}')
+        os.replace(path + '.tmp', path)
+
+
+def _check_entries(files, staging):
+    """Raise ValueError unless every manifest entry is a file inside staging with a sha256 and size"""
+    # The manifest comes from an unauthenticated host, and its names become local paths
+    root = os.path.realpath(staging)
+    for name, entry in files.items():
+        path = os.path.realpath(os.path.join(root, name))
+        if (os.path.isabs(name) or '..' in re.split(r'[/\\]', name) or name == MANIFEST_FILE
+                or path == root or os.path.commonpath([root, path]) != root):
+            raise ValueError(f'Manifest names a file outside the bundle: {name!r}')
+        # The checksum names the cache blob, so it must not be a path either
+        if not re.fullmatch(r'[0-9a-f]{64}', str(entry.get('sha256'))) or not isinstance(entry.get('bytes'), int):
+            raise ValueError(f'Manifest entry {name!r} has no valid sha256 and size')
+
+
+def fetch_bundle(url, dest=BUNDLE_DIR, cache_dir=DEFAULT_CACHE_DIR, workers=DEFAULT_WORKERS,
+                 chunk_size=DEFAULT_CHUNK_BYTES, manifest_sha256=None):
+    """Download the bundle at url into dest through the cache; returns transfer statistics"""
+    start = time.perf_counter()
+    url = url.rstrip('/')
+    cache = BlobCache(cache_dir)
+    manifest_bytes, ranges = _fetch_manifest(f'{url}/{MANIFEST_FILE}')
+    if manifest_sha256 is not None and hashlib.sha256(manifest_bytes).hexdigest() != manifest_sha256:
+        raise ValueError(f'{url}/{MANIFEST_FILE} does not match the expected checksum')
+    files = json.loads(manifest_bytes)['files']
+    staging = f'{dest}.tmp{os.getpid()}'
+    _check_entries(files, staging)
+    stats = {'files': len(files), 'bytes': sum(entry['bytes'] for entry in files.values()),
+             'downloaded_bytes': 0, 'cached_bytes': 0, 'resumed_bytes': 0, 'up_to_date': False}
+
+    stats['up_to_date'] = _is_current(dest, manifest_bytes)
+    if not stats['up_to_date']:
+        # Hold every missing blob's lock until it is cached; a replica fetching the same
+        # version waits here and then finds it in the cache. Files with the same content
+        # share one blob and one lock, taken in a fixed order
+        blobs = {entry['sha256']: (name, entry) for name, entry in files.items()}
+        locks, tasks = [], []
+        for sha256, (name, entry) in sorted(blobs.items()):
+            locks.append(cache.lock(sha256))
+            if cache.has(sha256):
+                stats['cached_bytes'] += entry['bytes']
+                continue
+            blob = cache.blob_path(sha256)
+            bounds = range(0, max(entry['bytes'], 1), chunk_size) if ranges else [0]
+            # Named by chunk size, so a fetch resumed with another --chunk-mb starts those parts over
+            parts = [(f'{blob}.{chunk_size}.part{i}', first,
+                      min(first + chunk_size, entry['bytes']) if ranges else entry['bytes'])
+                     for i, first in enumerate(bounds)]
+            stats['resumed_bytes'] += sum(os.path.getsize(part) for part, _, _ in parts
+                                          if ranges and os.path.exists(part))
+            tasks.append((name, entry, parts))
+
+        download_start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_fetch_part, f'{url}/{name}', part, first, end, ranges)
+                           for name, _, parts in tasks for part, first, end in parts]
+                stats['downloaded_bytes'] = sum(future.result() for future in futures)
+            for name, entry, parts in tasks:
+                if entry['bytes'] == 0:
+                    open(parts[0][0], 'wb').close()
+                cache.assemble(entry['sha256'], [part for part, _, _ in parts])
+        finally:
+            for lock_file in locks:
+                lock_file.close()
+        stats['download_seconds'] = time.perf_counter() - download_start
+
+        # Replicas sharing dest rename into it one at a time; one that waited finds it current
+        with _lock(os.path.abspath(dest)):
+            if not _is_current(dest, manifest_bytes):
+                # Hard links share the cached pages between replicas; copy across filesystems
+                shutil.rmtree(staging, ignore_errors=True)
+                for name, entry in files.items():
+                    os.makedirs(os.path.dirname(os.path.join(staging, name)), exist_ok=True)
+                    try:
+                        os.link(cache.blob_path(entry['sha256']), os.path.join(staging, name))
+                    except OSError:
+                        shutil.copyfile(cache.blob_path(entry['sha256']), os.path.join(staging, name))
+                with open(os.path.join(staging, MANIFEST_FILE), 'wb') as manifest_file:
+                    manifest_file.write(manifest_bytes)
+                verify_bundle(staging)
+                swap_in(staging, dest)
+
+    stats['time_to_ready_seconds'] = time.perf_counter() - start
+    seconds = stats.get('download_seconds', 0)
+    stats['bytes_per_sec'] = stats['downloaded_bytes'] / seconds if seconds > 0 else 0.0
+    return stats
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static files with single Range requests, like the host the bundle is published on"""
+
+    def send_head(self):
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if match is None or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first = int(match.group(1))
+        last = min(int(match.group(2) or size - 1), size - 1)
+        if first >= size and size > 0:
+            self.send_error(416)
+            return None
+        with open(path, 'rb') as file:
+            file.seek(first)
+            body = file.read(max(last - first + 1, 0))
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {first}-{last}/{size}')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        return BytesIO(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory, host='127.0.0.1', port=8700):
+    """Serve directory over HTTP with Range support until interrupted"""
+    server = ThreadingHTTPServer((host, port), partial(RangeRequestHandler, directory=directory))
+    print(f"✅ Serving {directory} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch the model bundle, or serve one for testing')
+    parser.add_argument('url', nargs='?', default=os.environ.get('CPS_MODEL_URL'),
+                        help='Base URL of the published bundle (default: CPS_MODEL_URL)')
+    parser.add_argument('--dest', default=BUNDLE_DIR)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Parts downloaded at once')
+    parser.add_argument('--chunk-mb', type=float, default=DEFAULT_CHUNK_BYTES / (1 << 20),
+                        help='Size of the ranges a file is split into')
+    parser.add_argument('--manifest-sha256', default=None, help='Refuse a manifest with another checksum')
+    parser.add_argument('--output', default=None, help='Write transfer statistics to this JSON file')
+    parser.add_argument('--serve', metavar='DIR', default=None, help='Serve DIR instead of fetching')
+    parser.add_argument('--port', type=int, default=8700)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, port=args.port)
+        return
+    if not args.url:
+        parser.error('give the bundle URL or set CPS_MODEL_URL')
+
+    print("="*60)
+    print("FETCHING MODEL BUNDLE")
+    print("="*60)
+    try:
+        stats = fetch_bundle(args.url, args.dest, args.cache_dir, args.workers, int(args.chunk_mb * (1 << 20)),
+                             args.manifest_sha256)
+    except (OSError, ValueError) as e:
+        print(f"❌ Fetch failed: {e}")
+        raise SystemExit(1)
+    if stats['up_to_date']:
+        print(f"✓ {args.dest} is already this version")
+    else:
+        print(f"✓ {stats['files']} files, {stats['bytes'] / 1e6:.1f}MB")
+        print(f"✓ Downloaded {stats['downloaded_bytes'] / 1e6:.1f}MB at {stats['bytes_per_sec'] / 1e6:.1f}MB/s "
+              f"({stats['resumed_bytes'] / 1e6:.1f}MB resumed, {stats['cached_bytes'] / 1e6:.1f}MB from cache)")
+    print(f"✅ {args.dest} ready in {stats['time_to_ready_seconds']:.2f}s")
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(stats, out_file, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
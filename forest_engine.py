@@ -0,0 +1,261 @@
+"""
+Flat-array inference engine for the trained RandomForest.
+
+Every tree of the forest is flattened into shared contiguous NumPy arrays so a
+whole batch can be pushed through all trees at once with vectorized gathers,
+without per-tree Python or joblib dispatch. The arrays are saved as a
+memory-mappable artifact (see artifacts.py) so app replicas share one copy.
+
+Leaf class distributions are stored sparsely (CSR: per-leaf offsets into class
+indices and probabilities). A deep leaf reaches only a few institutes, so this
+is far smaller than one dense row of every class per leaf.
+"""
+
+import numpy as np
+
+from artifacts import save_arrays, load_arrays
+
+# The engine train_model.py exports lives in the model bundle (see model_bundle.py)
+ENGINE_DIR = 'model_bundle/forest'
+COMPACT_DIR = 'forest_compact'
+
+# Rows traversed together; bounds the (rows x trees) index arrays
+_ROW_BLOCK = 8192
+# Traversal steps between removing finished (sample, tree) pairs
+_COMPACT_EVERY = 4
+LEAF_DTYPES = ['float64', 'float32', 'float16']
+
+
+def _node_depths(children_left, children_right):
+    """Depth of every node of one sklearn tree, computed level by level"""
+    depth = np.zeros(len(children_left), dtype=np.int64)
+    level = np.array([0])
+    current = 0
+    while len(level):
+        depth[level] = current
+        level = level[children_left[level] != -1]
+        level = np.concatenate([children_left[level], children_right[level]])
+        current += 1
+    return depth
+
+
+def _class_index_dtype(n_classes):
+    return np.int16 if n_classes <= np.iinfo(np.int16).max else np.int32
+
+
+class FlatForest:
+    """RandomForest flattened into node arrays, exposing predict_proba() and classes_"""
+
+    def __init__(self, feature, threshold, children, leaf_index, leaf_ptr, leaf_classes,
+                 leaf_probs, roots, classes, max_depth, encoder_fingerprint=None):
+        self.feature = feature
+        self.threshold = threshold
+        # Interleaved (left, right) pairs so one gather picks the next node
+        self.children = children
+        self.leaf_index = leaf_index
+        # Leaf i holds probabilities leaf_probs[leaf_ptr[i]:leaf_ptr[i + 1]]
+        # for the classes at the same positions of leaf_classes
+        self.leaf_ptr = leaf_ptr
+        self.leaf_classes = leaf_classes
+        self.leaf_probs = leaf_probs
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_trees = len(roots)
+        # model_bundle.encoder_fingerprint() of the encoders the forest was trained with
+        self.encoder_fingerprint = encoder_fingerprint
+
+    @classmethod
+    def from_sklearn(cls, model, n_trees=None, max_depth=None, leaf_dtype='float64'):
+        """Flatten a fitted RandomForestClassifier, optionally keeping only its first
+        n_trees trees, cutting every tree at max_depth and storing leaf probabilities
+        at lower precision"""
+        features, thresholds, lefts, rights, leaf_indexes, roots = [], [], [], [], [], []
+        counts, leaf_classes, values = [], [], []
+        node_offset = 0
+        leaf_offset = 0
+        forest_depth = 0
+        for estimator in model.estimators_[:n_trees]:
+            tree = estimator.tree_
+            children_left = tree.children_left
+            children_right = tree.children_right
+            node_value = tree.value[:, 0, :len(model.classes_)]
+            threshold = tree.threshold
+            feature = tree.feature
+            depth = tree.max_depth
+
+            if max_depth is not None and tree.max_depth > max_depth:
+                # Internal nodes at the cut become leaves holding the class weights of all
+                # samples that reached them; deeper nodes are dropped
+                node_depth = _node_depths(children_left, children_right)
+                kept = np.flatnonzero(node_depth <= max_depth)
+                new_id = np.full(tree.node_count, -1, dtype=np.int64)
+                new_id[kept] = np.arange(len(kept))
+                leaf = (node_depth[kept] == max_depth) | (children_left[kept] == -1)
+                children_left = np.where(leaf, -1, new_id[children_left[kept]])
+                children_right = np.where(leaf, -1, new_id[children_right[kept]])
+                node_value, threshold, feature = node_value[kept], threshold[kept], feature[kept]
+                depth = max_depth
+
+            n_nodes = len(children_left)
+            is_leaf = children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            # Leaves point back at themselves so finished pairs can keep stepping harmlessly
+            left = np.where(is_leaf, node_ids, children_left) + node_offset
+            right = np.where(is_leaf, node_ids, children_right) + node_offset
+            feature = np.where(is_leaf, 0, feature)
+
+            leaf_index = np.full(n_nodes, -1, dtype=np.int64)
+            leaf_index[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+
+            # Same per-tree normalisation as DecisionTreeClassifier.predict_proba
+            leaf_value = node_value[is_leaf].astype(np.float64)
+            normalizer = leaf_value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left)
+            rights.append(right)
+            leaf_indexes.append(leaf_index)
+            leaf_value /= normalizer
+            leaf_rows, leaf_cols = np.nonzero(leaf_value)
+            counts.append(np.bincount(leaf_rows, minlength=len(leaf_value)))
+            leaf_classes.append(leaf_cols)
+            values.append(leaf_value[leaf_rows, leaf_cols])
+            roots.append(node_offset)
+
+            node_offset += n_nodes
+            leaf_offset += int(is_leaf.sum())
+            forest_depth = max(forest_depth, depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.column_stack([
+                np.concatenate(lefts), np.concatenate(rights)
+            ]).ravel().astype(np.int32),
+            leaf_index=np.concatenate(leaf_indexes).astype(np.int32),
+            leaf_ptr=np.concatenate([[0], np.cumsum(np.concatenate(counts))]).astype(np.int64),
+            leaf_classes=np.concatenate(leaf_classes).astype(_class_index_dtype(len(model.classes_))),
+            leaf_probs=np.concatenate(values).astype(leaf_dtype),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            max_depth=forest_depth,
+        )
+
+    @property
+    def nbytes(self):
+        """Total size of the engine's arrays"""
+        return sum(array.nbytes for array in [self.feature, self.threshold, self.children, self.leaf_index,
+                                              self.leaf_ptr, self.leaf_classes, self.leaf_probs, self.roots])
+
+    def apply(self, X):
+        """Return the leaf row of every (sample, tree) pair, shape (n_samples, n_trees)"""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_samples, n_features = X.shape
+        values = X.ravel()
+
+        # Walk every (sample, tree) pair in lock step, dropping pairs that reached a leaf
+        node = np.tile(self.roots, n_samples)
+        offset = np.repeat(np.arange(n_samples) * n_features, self.n_trees)
+        active = np.arange(len(node))
+        current = node.copy()
+        step = 0
+        while len(active):
+            go_right = ~(values[offset + self.feature[current]] <= self.threshold[current])
+            current = self.children[2 * current + go_right]
+            step += 1
+            # Leaves loop back on themselves, so compacting every few steps is safe
+            if step % _COMPACT_EVERY == 0 or step >= self.max_depth:
+                done = self.leaf_index[current] >= 0
+                node[active[done]] = current[done]
+                keep = ~done
+                active = active[keep]
+                current = current[keep]
+                offset = offset[keep]
+        return self.leaf_index[node].reshape(n_samples, self.n_trees)
+
+    def predict_proba(self, X, n_jobs=1):
+        """Average the normalised leaf distributions over all trees
+
+        With n_jobs > 1, row blocks are scored on that many threads; NumPy
+        releases the GIL for the gathers and bincounts that dominate the work.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        # Smaller blocks when threaded, so a batch of a few blocks still keeps every thread busy
+        block = _ROW_BLOCK if n_jobs <= 1 else max(1, min(_ROW_BLOCK, -(-len(X) // n_jobs)))
+        starts = range(0, len(X), block)
+        if n_jobs > 1 and len(starts) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(min(n_jobs, len(starts))) as pool:
+                blocks = list(pool.map(lambda start: self._predict_block(X[start:start + block]), starts))
+        else:
+            blocks = [self._predict_block(X[start:start + block]) for start in starts]
+        if not blocks:
+            return np.zeros((0, len(self.classes_)), dtype=np.float64)
+        proba = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+        proba /= self.n_trees
+        return proba
+
+    def _predict_block(self, X):
+        """Summed leaf distributions of every tree for one block of rows"""
+        n_classes = len(self.classes_)
+        leaves = self.apply(X)
+        n_rows = len(leaves)
+        # Gather every stored (class, probability) entry of every reached leaf and
+        # sum them per (row, class) in one bincount, in tree order like sklearn
+        first = self.leaf_ptr[leaves.ravel()]
+        lengths = self.leaf_ptr[leaves.ravel() + 1] - first
+        ends = np.cumsum(lengths)
+        entries = np.repeat(first - (ends - lengths), lengths) + np.arange(ends[-1] if len(ends) else 0)
+        rows = np.repeat(np.arange(n_rows).repeat(self.n_trees), lengths)
+        block = np.bincount(rows * n_classes + self.leaf_classes[entries],
+                            weights=self.leaf_probs[entries], minlength=n_rows * n_classes)
+        return block.reshape(n_rows, n_classes)
+
+    def save(self, path=ENGINE_DIR):
+        """Write the flattened arrays as a memory-mappable artifact directory"""
+        save_arrays(
+            path,
+            {
+                'feature': self.feature,
+                'threshold': self.threshold,
+                'children': self.children,
+                'leaf_index': self.leaf_index,
+                'leaf_ptr': self.leaf_ptr,
+                'leaf_classes': self.leaf_classes,
+                'leaf_probs': self.leaf_probs,
+                'roots': self.roots,
+                'classes': self.classes_,
+            },
+            meta={'max_depth': self.max_depth, 'n_trees': self.n_trees,
+                  'encoder_fingerprint': self.encoder_fingerprint},
+        )
+
+    @classmethod
+    def load(cls, path=ENGINE_DIR, mmap=True):
+        """Open an engine written by save(); arrays are mapped read-only unless mmap=False"""
+        arrays, meta = load_arrays(path, mmap=mmap)
+        if 'leaf_values' in arrays:
+            # Engines saved before sparse leaves kept one dense row per leaf
+            leaf_rows, leaf_cols = np.nonzero(arrays['leaf_values'])
+            counts = np.bincount(leaf_rows, minlength=len(arrays['leaf_values']))
+            arrays['leaf_ptr'] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            arrays['leaf_classes'] = leaf_cols.astype(_class_index_dtype(len(arrays['classes'])))
+            arrays['leaf_probs'] = arrays['leaf_values'][leaf_rows, leaf_cols]
+        return cls(
+            arrays['feature'],
+            arrays['threshold'],
+            arrays['children'],
+            arrays['leaf_index'],
+            arrays['leaf_ptr'],
+            arrays['leaf_classes'],
+            arrays['leaf_probs'],
+            arrays['roots'],
+            arrays['classes'],
+            meta['max_depth'],
+            meta.get('encoder_fingerprint'),
+        )
@@ -0,0 +1,156 @@
+"""
+Local load generator for prediction_service.py.
+
+Usage:
+    # Against a running service
+    python load_generator.py --url http://127.0.0.1:8600 --requests 5000 --connections 64
+
+    # Start the service twice (batching off, then on) and compare throughput
+    python load_generator.py --compare
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from predictor import load_encoders
+
+
+def sample_payloads(n, seed=0):
+    """Build n random request bodies from the trained encoders"""
+    label_encoders, _ = load_encoders()
+    courses = list(label_encoders['Course Name'].classes_)
+    locations = list(label_encoders['Location'].classes_)
+    rng = random.Random(seed)
+    return [
+        json.dumps({
+            'percentile': round(rng.uniform(0, 100), 1),
+            'course': rng.choice(courses),
+            'location': rng.choice(locations),
+        }).encode()
+        for _ in range(n)
+    ]
+
+
+async def _client(host, port, payloads, latencies):
+    """Send payloads one after another over a single keep-alive connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in payloads:
+            start = time.perf_counter()
+            writer.write(
+                f"POST /predict HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(url, n_requests, connections):
+    """Fire n_requests across concurrent connections and return throughput stats"""
+    parsed = urlparse(url)
+    payloads = sample_payloads(n_requests)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(parsed.hostname, parsed.port, payloads[i::connections], latencies)
+        for i in range(connections)
+    ])
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+async def wait_until_ready(url, timeout=120):
+    """Poll until the service accepts connections"""
+    parsed = urlparse(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.25)
+    raise TimeoutError(f"Service at {url} did not start within {timeout}s")
+
+
+def print_stats(label, stats):
+    print(f"{label:<24} {stats['requests_per_sec']:>10,.0f} req/s   "
+          f"p50 {stats['p50_ms']:>7.2f}ms   p95 {stats['p95_ms']:>7.2f}ms   "
+          f"p99 {stats['p99_ms']:>7.2f}ms")
+
+
+def compare(args):
+    """Run the same load against the service with batching off and on"""
+    url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for label, batch_size in [('one call per request', 1), ('micro-batched', args.max_batch_size)]:
+        command = [
+            sys.executable, 'prediction_service.py', '--port', str(args.port),
+            '--max-batch-size', str(batch_size), '--max-wait-ms', str(args.max_wait_ms),
+        ]
+        if args.sklearn:
+            command.append('--sklearn')
+        service = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        try:
+            asyncio.run(wait_until_ready(url))
+            results[label] = asyncio.run(run_load(url, args.requests, args.connections))
+        finally:
+            service.terminate()
+            service.wait()
+        print_stats(label, results[label])
+
+    gain = results['micro-batched']['requests_per_sec'] / results['one call per request']['requests_per_sec']
+    print(f"\n✅ Micro-batching throughput gain: {gain:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the prediction service')
+    parser.add_argument('--url', default='http://127.0.0.1:8600')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--compare', action='store_true',
+                        help='Start the service with and without batching and compare')
+    parser.add_argument('--port', type=int, default=8601, help='Port used by --compare')
+    parser.add_argument('--max-batch-size', type=int, default=64, help='Batch size used by --compare')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='Max wait used by --compare')
+    parser.add_argument('--sklearn', action='store_true', help='Make --compare serve model.pkl')
+    args = parser.parse_args()
+
+    print("="*60)
+    print("PREDICTION SERVICE LOAD TEST")
+    print("="*60)
+    if args.compare:
+        compare(args)
+    else:
+        print_stats(args.url, asyncio.run(run_load(args.url, args.requests, args.connections)))
+
+
+if __name__ == '__main__':
+    main()
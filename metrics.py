@@ -0,0 +1,266 @@
+"""
+Per-stage latency histograms and gauges for the prediction path.
+
+Each stage of a prediction (cache lookup, encoding, the model, ranking,
+decoding, rendering the result cards) is timed with
+
+    with metrics.stage('model'):
+        ...
+
+and aggregated in-process into one fixed-bucket histogram per stage. Gauges
+such as the result cache counters and the active model version come from
+collectors that are read only when the metrics are rendered, in the
+Prometheus text format. Timing is off unless enabled; stage() then returns a
+shared no-op context manager.
+
+Configuration (environment variables):
+    CPS_METRICS           1 to record stage timings (implied by the two below)
+    CPS_METRICS_PORT      Serve GET /metrics on this local port
+    CPS_METRICS_FILE      Rewrite this file with the metrics every CPS_METRICS_INTERVAL seconds (default: 15)
+
+Usage:
+    python metrics.py     # overhead of one timed stage, enabled and disabled
+"""
+
+import argparse
+import bisect
+import os
+import threading
+import time
+
+PREFIX = 'cps_'
+# Upper bounds in seconds, from a lookup-table hit to a large batch
+BUCKETS = (1e-05, 2.5e-05, 5e-05, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_INTERVAL = 15.0
+
+ENABLED = bool(os.environ.get('CPS_METRICS') == '1' or os.environ.get('CPS_METRICS_PORT')
+               or os.environ.get('CPS_METRICS_FILE'))
+HISTOGRAMS = {}
+_COLLECTORS = {}
+_LOCK = threading.Lock()
+_exporter = None
+
+
+class Histogram:
+    """Counts of observed durations per bucket, with their sum"""
+
+    def __init__(self):
+        # One count per bucket plus +Inf; made cumulative when rendered
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable():
+    """Start recording stage timings in this process"""
+    global ENABLED
+    ENABLED = True
+
+
+def _histogram(name):
+    histogram = HISTOGRAMS.get(name)
+    if histogram is None:
+        with _LOCK:
+            histogram = HISTOGRAMS.setdefault(name, Histogram())
+    return histogram
+
+
+def stage(name):
+    """Context manager timing one stage of the prediction path into its histogram"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(_histogram(name))
+
+
+def observe(name, seconds):
+    """Record a duration measured elsewhere, e.g. one spanning several stages"""
+    if ENABLED:
+        _histogram(name).observe(seconds)
+
+
+def set_collector(name, collect):
+    """Register collect() -> [(metric, type, help, value, labels)], replacing any collector of that name"""
+    _COLLECTORS[name] = collect
+
+
+def cache_samples(cache):
+    """Result cache counters and size, for set_collector()"""
+    stats = cache.stats()
+    return [
+        ('cache_hits_total', 'counter', 'Result cache hits', stats['hits'], {}),
+        ('cache_misses_total', 'counter', 'Result cache misses', stats['misses'], {}),
+        ('cache_evictions_total', 'counter', 'Results evicted from the cache', stats['evictions'], {}),
+        ('cache_entries', 'gauge', 'Results in the cache', stats['size'], {}),
+        ('cache_hit_ratio', 'gauge', 'Share of cache lookups that hit', stats['hit_rate'], {}),
+    ]
+
+
+def loader_samples(loader):
+    """Active model version and reload counters of an app_loader.ArtifactLoader, for set_collector()"""
+    status = loader.status()
+    if status['version'] is None:
+        return []
+    return [
+        ('model_info', 'gauge', 'Model version being served (always 1)', 1, {'version': status['version']}),
+        ('model_loaded_timestamp_seconds', 'gauge', 'When the served model was loaded', status['loaded_at'], {}),
+        ('model_reloads_total', 'counter', 'Model versions hot reloaded', status['reloads'], {}),
+        ('model_reload_failures_total', 'counter', 'Model versions that failed to load or validate',
+         status['reload_failures'], {}),
+    ]
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def render():
+    """Every histogram and collected sample in the Prometheus text exposition format"""
+    lines = []
+    if HISTOGRAMS:
+        name = f'{PREFIX}stage_seconds'
+        lines += [f'# HELP {name} Time spent in each stage of the prediction path', f'# TYPE {name} histogram']
+        for stage_name, histogram in sorted(HISTOGRAMS.items()):
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels({"stage": stage_name, "le": bound})} {cumulative}')
+            lines.append(f'{name}_sum{_labels({"stage": stage_name})} {total}')
+            lines.append(f'{name}_count{_labels({"stage": stage_name})} {count}')
+
+    samples = [sample for collect in list(_COLLECTORS.values()) for sample in collect()]
+    described = set()
+    for metric, metric_type, help_text, value, labels in sorted(samples, key=lambda sample: sample[0]):
+        if metric not in described:
+            described.add(metric)
+            lines += [f'# HELP {PREFIX}{metric} {help_text}', f'# TYPE {PREFIX}{metric} {metric_type}']
+        lines.append(f'{PREFIX}{metric}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write(path):
+    """Replace path with the current metrics, e.g. for a node_exporter textfile collector"""
+    with open(path + '.tmp', 'w') as metrics_file:
+        metrics_file.write(render())
+    os.replace(path + '.tmp', path)
+
+
+def serve(port, host='127.0.0.1'):
+    """Serve GET /metrics on a daemon thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def _write_forever(path, interval):
+    while True:
+        time.sleep(interval)
+        write(path)
+
+
+def start_exporter():
+    """Start the port and file exporters configured by CPS_METRICS_PORT and CPS_METRICS_FILE, once per process"""
+    global _exporter
+    with _LOCK:
+        if _exporter is not None:
+            return _exporter
+        _exporter = {'port': None, 'file': None}
+        port = os.environ.get('CPS_METRICS_PORT')
+        if port:
+            serve(int(port))
+            _exporter['port'] = int(port)
+        path = os.environ.get('CPS_METRICS_FILE')
+        if path:
+            interval = float(os.environ.get('CPS_METRICS_INTERVAL', DEFAULT_INTERVAL))
+            threading.Thread(target=_write_forever, args=(path, interval), name='metrics-writer', daemon=True).start()
+            _exporter['file'] = path
+        return _exporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the overhead of timing one stage')
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    global ENABLED
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            with stage('overhead'):
+                pass
+        return (time.perf_counter() - start) / args.iterations * 1e6
+
+    print("="*60)
+    print("METRICS OVERHEAD")
+    print("="*60)
+    baseline_start = time.perf_counter()
+    for _ in range(args.iterations):
+        pass
+    baseline = (time.perf_counter() - baseline_start) / args.iterations * 1e6
+    ENABLED = False
+    disabled = run() - baseline
+    ENABLED = True
+    enabled = run() - baseline
+    print(f"Disabled: {disabled:.3f}µs per stage")
+    print(f"Enabled:  {enabled:.3f}µs per stage")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Versioned, checksummed model bundle written by train_model.py.
+
+One directory holds everything that has to come from the same training run:
+the flat-array forest and the course, location and institute encoders (their
+class names as plain .npy arrays, so nothing is unpickled). manifest.json
+records the schema version, the size and sha256 of every file and a
+fingerprint of the encoders, which is also stamped into the forest's
+metadata. Loading checks every file's size and the checksums of the small
+ones, refuses a forest stamped with other encoders, and maps the large arrays
+read-only. verify_bundle() checks every checksum, e.g. before a hot reload.
+
+Usage:
+    python model_bundle.py                  # verify every checksum and print the manifest
+    python model_bundle.py --from-pickles   # bundle model.pkl and the encoder pickles of an older model
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from artifacts import load_arrays, replace_dir, save_arrays
+from forest_engine import FlatForest, LEAF_DTYPES
+
+BUNDLE_DIR = 'model_bundle'
+MANIFEST_FILE = 'manifest.json'
+SCHEMA_VERSION = 1
+FOREST_DIR = 'forest'
+ENCODERS_DIR = 'encoders'
+# Files up to this size are checksummed on every load; larger ones only by verify_bundle()
+HASH_ON_LOAD_BYTES = 1 << 20
+
+
+def file_sha256(path):
+    """Hex sha256 of a file, read in 1MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encoder_names(encoder):
+    return [str(name) for name in encoder.classes_]
+
+
+def encoder_fingerprint(label_encoders, le_target):
+    """Short hash of the course, location and institute names, in encoded order"""
+    names = [_encoder_names(label_encoders['Course Name']), _encoder_names(label_encoders['Location']),
+             _encoder_names(le_target)]
+    return hashlib.sha1(json.dumps(names).encode()).hexdigest()[:12]
+
+
+def check_compatible(model, label_encoders, le_target, require_fingerprint=False):
+    """Raise ValueError if the model was not trained with these encoders
+
+    Models saved before stamping have no fingerprint; with require_fingerprint,
+    e.g. whenever the encoders come from a bundle, they are refused too.
+    """
+    fingerprint = getattr(model, 'encoder_fingerprint', None)
+    if fingerprint is None and require_fingerprint:
+        raise ValueError("Model has no encoder fingerprint, so it cannot be matched with the bundle's encoders; "
+                         "retrain the model")
+    if fingerprint is not None and fingerprint != encoder_fingerprint(label_encoders, le_target):
+        raise ValueError("Model and encoders come from different training runs; retrain or restore a matching bundle")
+    classes = np.asarray(model.classes_)
+    if len(classes) and (classes.min() < 0 or classes.max() >= len(le_target.classes_)):
+        raise ValueError("Model predicts institutes the target encoder does not know")
+
+
+def save_bundle(engine, label_encoders, le_target, path=BUNDLE_DIR, placeholder=False):
+    """Write the forest and encoders with a manifest, replacing any bundle at path; returns the manifest"""
+    fingerprint = encoder_fingerprint(label_encoders, le_target)
+    staging = path + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    engine.encoder_fingerprint = fingerprint
+    engine.save(os.path.join(staging, FOREST_DIR))
+    save_arrays(os.path.join(staging, ENCODERS_DIR), {
+        'courses': np.array(_encoder_names(label_encoders['Course Name'])),
+        'locations': np.array(_encoder_names(label_encoders['Location'])),
+        'institutes': np.array(_encoder_names(le_target)),
+    })
+
+    files = {}
+    for directory in [FOREST_DIR, ENCODERS_DIR]:
+        for name in sorted(os.listdir(os.path.join(staging, directory))):
+            file_path = os.path.join(staging, directory, name)
+            files[f'{directory}/{name}'] = {'bytes': os.path.getsize(file_path), 'sha256': file_sha256(file_path)}
+    manifest = {
+        'schema_version': SCHEMA_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'encoder_fingerprint': fingerprint,
+        'placeholder': placeholder,
+        'counts': {
+            'courses': len(label_encoders['Course Name'].classes_),
+            'locations': len(label_encoders['Location'].classes_),
+            'institutes': len(le_target.classes_),
+        },
+        'model': {'n_trees': engine.n_trees, 'max_depth': engine.max_depth,
+                  'leaf_dtype': str(engine.leaf_probs.dtype)},
+        'files': files,
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    swap_in(staging, path)
+    return manifest
+
+
+def swap_in(staging, path=BUNDLE_DIR):
+    """Replace the bundle at path with the complete one in staging"""
+    # Renamed in whole, so a reader never sees one run's forest with another's encoders
+    replace_dir(staging, path)
+
+
+def read_manifest(path=BUNDLE_DIR):
+    """Load manifest.json, refusing bundles written with another schema version"""
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('schema_version') != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported model bundle schema in {path}: {manifest.get('schema_version')} "
+                         f"(expected {SCHEMA_VERSION}); retrain the model")
+    return manifest
+
+
+def _check_files(path, manifest, directory=None, full=False):
+    """Check sizes, and checksums of small files (every file if full), of one part of the bundle"""
+    for name, entry in manifest['files'].items():
+        if directory is not None and not name.startswith(directory + '/'):
+            continue
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != entry['bytes']:
+            raise ValueError(f"{name} in {path} is missing or has the wrong size")
+        if (full or entry['bytes'] <= HASH_ON_LOAD_BYTES) and file_sha256(file_path) != entry['sha256']:
+            raise ValueError(f"{name} in {path} does not match its checksum")
+
+
+def verify_bundle(path=BUNDLE_DIR):
+    """Check every file against the manifest; returns the manifest or raises ValueError"""
+    manifest = read_manifest(path)
+    _check_files(path, manifest, full=True)
+    return manifest
+
+
+def load_bundle_encoders(path=BUNDLE_DIR):
+    """Return (label_encoders, le_target) rebuilt from the bundle's class names"""
+    from sklearn.preprocessing import LabelEncoder
+
+    manifest = read_manifest(path)
+    _check_files(path, manifest, ENCODERS_DIR)
+    arrays, _ = load_arrays(os.path.join(path, ENCODERS_DIR), mmap=False)
+    encoders = {}
+    for name in ['courses', 'locations', 'institutes']:
+        encoders[name] = LabelEncoder()
+        # Object arrays, as fitting on a DataFrame column leaves them
+        encoders[name].classes_ = arrays[name].astype(object)
+    if manifest['placeholder']:
+        print(f"⚠️  {path} holds placeholder models from setup_models.py, not a trained model")
+    return {'Course Name': encoders['courses'], 'Location': encoders['locations']}, encoders['institutes']
+
+
+def load_bundle_model(path=BUNDLE_DIR, mmap=True):
+    """Open the bundle's forest, memory-mapped read-only unless mmap=False"""
+    manifest = read_manifest(path)
+    _check_files(path, manifest, FOREST_DIR)
+    model = FlatForest.load(os.path.join(path, FOREST_DIR), mmap=mmap)
+    if model.encoder_fingerprint != manifest['encoder_fingerprint']:
+        raise ValueError(f"The forest in {path} was not trained with the bundle's encoders")
+    return model
+
+
+def is_placeholder(path=BUNDLE_DIR):
+    """True if the bundle at path was written by setup_models.py"""
+    return os.path.exists(os.path.join(path, MANIFEST_FILE)) and read_manifest(path)['placeholder']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify or build the model bundle')
+    parser.add_argument('--path', default=BUNDLE_DIR)
+    parser.add_argument('--from-pickles', action='store_true',
+                        help='Build the bundle from model.pkl, label_encoders.pkl and target_encoder.pkl')
+    parser.add_argument('--leaf-dtype', choices=LEAF_DTYPES, default='float64',
+                        help='Precision of the forest\'s sparse leaf probabilities (with --from-pickles)')
+    args = parser.parse_args()
+
+    print("="*60)
+    print("MODEL BUNDLE")
+    print("="*60)
+    if args.from_pickles:
+        import pickle
+
+        with open('model.pkl', 'rb') as model_file:
+            model = pickle.load(model_file)
+        with open('label_encoders.pkl', 'rb') as enc_file:
+            label_encoders = pickle.load(enc_file)
+        with open('target_encoder.pkl', 'rb') as target_file:
+            le_target = pickle.load(target_file)
+        engine = FlatForest.from_sklearn(model, leaf_dtype=args.leaf_dtype)
+        check_compatible(engine, label_encoders, le_target)
+        save_bundle(engine, label_encoders, le_target, args.path)
+        print(f"✓ {args.path} written from the pickles")
+
+    start = time.perf_counter()
+    try:
+        manifest = verify_bundle(args.path)
+    except (OSError, ValueError) as e:
+        print(f"❌ {args.path} failed verification: {e}")
+        raise SystemExit(1)
+    total = sum(entry['bytes'] for entry in manifest['files'].values())
+    print(f"✓ Schema version {manifest['schema_version']}, created {manifest['created']}")
+    print(f"✓ Encoders {manifest['encoder_fingerprint']}: {manifest['counts']['courses']} courses, "
+          f"{manifest['counts']['locations']} locations, {manifest['counts']['institutes']} institutes")
+    print(f"✓ Forest: {manifest['model']['n_trees']} trees, depth {manifest['model']['max_depth']}, "
+          f"{manifest['model']['leaf_dtype']} leaves")
+    if manifest['placeholder']:
+        print("⚠️  Placeholder models from setup_models.py")
+    print(f"✅ {len(manifest['files'])} files, {total / 1e6:.1f}MB verified in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Metadata sidecar written by train_model.py for the app's form and stats.
+
+Holds everything the Predict form needs without unpickling the encoders or
+loading the model: sorted course and location options (a name's position is
+its encoded value), real counts, and the percentile range and record count of
+every (course, location) pair seen in the data, which also tells which courses
+exist in which location. It is stamped with the model bundle's encoder
+fingerprint, and load_metadata() ignores a sidecar left by another training
+run.
+"""
+
+import json
+import os
+
+METADATA_FILE = 'model_metadata.json'
+# model_bundle.py's manifest, read as plain JSON so the form still renders before NumPy is imported
+BUNDLE_MANIFEST = os.path.join('model_bundle', 'manifest.json')
+
+
+class ModelMetadata:
+    """Form options, counts and a course-by-location index with percentile ranges"""
+
+    def __init__(self, courses, locations, counts, pairs=None, encoder_fingerprint=None):
+        self.courses = list(courses)
+        self.locations = list(locations)
+        self.counts = dict(counts)
+        self.course_codes = {name: code for code, name in enumerate(self.courses)}
+        self.location_codes = {name: code for code, name in enumerate(self.locations)}
+        # [course code, location code, min percentile, max percentile, records]; None if unknown
+        self.pairs = pairs
+        self.encoder_fingerprint = encoder_fingerprint
+        self.courses_by_location = None
+        self.ranges = {}
+        if pairs is not None:
+            self.courses_by_location = {}
+            for course, location, low, high, _ in pairs:
+                self.courses_by_location.setdefault(location, []).append(course)
+                self.ranges[course, location] = (low, high)
+
+    @classmethod
+    def build(cls, data, label_encoders):
+        """Summarize a DataFrame whose 'Course Name', 'Location' and 'Institute Name' hold encoded values"""
+        grouped = data.groupby(['Course Name', 'Location'])['Percentile'].agg(['min', 'max', 'size'])
+        pairs = [[int(course), int(location), round(float(low), 4), round(float(high), 4), int(size)]
+                 for (course, location), (low, high, size) in grouped.iterrows()]
+        counts = {
+            'institutes': int(data['Institute Name'].nunique()),
+            'courses': len(label_encoders['Course Name'].classes_),
+            'locations': len(label_encoders['Location'].classes_),
+            'records': len(data),
+        }
+        return cls(
+            [str(name) for name in label_encoders['Course Name'].classes_],
+            [str(name) for name in label_encoders['Location'].classes_],
+            counts,
+            pairs,
+        )
+
+    @classmethod
+    def from_encoders(cls, label_encoders, le_target):
+        """Options and counts for models trained before the sidecar existed (no pair index)"""
+        counts = {
+            'institutes': len(le_target.classes_),
+            'courses': len(label_encoders['Course Name'].classes_),
+            'locations': len(label_encoders['Location'].classes_),
+        }
+        return cls([str(name) for name in label_encoders['Course Name'].classes_],
+                   [str(name) for name in label_encoders['Location'].classes_], counts)
+
+    def courses_in(self, locations):
+        """Courses offered in any of the given locations (every course if none or unknown)"""
+        if self.courses_by_location is None or not locations:
+            return self.courses
+        offered = set()
+        for name in locations:
+            offered.update(self.courses_by_location.get(self.location_codes.get(name), []))
+        return [self.courses[code] for code in sorted(offered)]
+
+    def percentile_range(self, courses, locations):
+        """(lowest, highest) admitted percentile across the selected pairs, or None if unknown"""
+        keys = [(self.course_codes.get(course), self.location_codes.get(location))
+                for course in courses for location in locations]
+        found = [self.ranges[key] for key in keys if key in self.ranges]
+        if not found:
+            return None
+        return min(low for low, _ in found), max(high for _, high in found)
+
+    def save(self, path=METADATA_FILE):
+        with open(path, 'w') as metadata_file:
+            json.dump({'courses': self.courses, 'locations': self.locations,
+                       'counts': self.counts, 'pairs': self.pairs,
+                       'encoder_fingerprint': self.encoder_fingerprint}, metadata_file)
+
+    @classmethod
+    def load(cls, path=METADATA_FILE):
+        with open(path) as metadata_file:
+            metadata = json.load(metadata_file)
+        return cls(metadata['courses'], metadata['locations'], metadata['counts'], metadata['pairs'],
+                   metadata.get('encoder_fingerprint'))
+
+
+def load_metadata(path=METADATA_FILE, manifest=BUNDLE_MANIFEST):
+    """Load the sidecar, or None if the model was trained before it existed or by another run"""
+    if not os.path.exists(path):
+        return None
+    metadata = ModelMetadata.load(path)
+    if metadata.encoder_fingerprint is not None and os.path.exists(manifest):
+        with open(manifest) as manifest_file:
+            bundle_fingerprint = json.load(manifest_file).get('encoder_fingerprint')
+        if bundle_fingerprint != metadata.encoder_fingerprint:
+            # The form would offer options the served encoders cannot encode
+            print(f"⚠️  Ignoring {path}: written for encoders {metadata.encoder_fingerprint}, "
+                  f"the model bundle has {bundle_fingerprint}")
+            return None
+    return metadata
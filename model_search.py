@@ -0,0 +1,191 @@
+"""
+Parallel hyperparameter search for the random forest.
+
+Every candidate config is trained in a process pool. The encoded training and
+validation arrays are placed once in a shared memory block that all workers
+map, instead of being pickled to each of them. Each config is scored on
+top-1/top-7 hit rate and serialized model size in its worker, which saves the
+flat-array engine the app serves to a scratch directory. Once every config
+has trained, the parent times each engine's single-row latency and batch
+throughput one after another, so no timing runs while other workers train.
+The chosen model is the most accurate config on the accuracy/latency Pareto
+front within a latency budget.
+"""
+
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from bench_engine import time_call
+from forest_engine import FlatForest
+from predictor import TOP_K, top_k_hit_rates
+
+SEARCH_GRID = {
+    'n_estimators': [100, 200, 300],
+    'max_depth': [20, 30],
+    'min_samples_leaf': [3, 5],
+}
+BASE_PARAMS = {
+    'min_samples_split': 5,
+    'max_features': 'sqrt',
+    'class_weight': 'balanced',
+    'random_state': 42,
+}
+DEFAULT_LATENCY_BUDGET_MS = 10.0
+LATENCY_REPEATS = 50
+THROUGHPUT_ROWS = 10000
+THROUGHPUT_REPEATS = 3
+
+
+class SharedArrays:
+    """Several NumPy arrays packed into one shared memory block"""
+
+    def __init__(self, block, layout, owner):
+        self.block = block
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+            for name, (dtype, shape, offset) in layout.items()
+        }
+
+    @classmethod
+    def create(cls, arrays):
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            layout[name] = (array.dtype.str, array.shape, offset)
+            offset += -(-array.nbytes // 64) * 64
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = cls(block, layout, owner=True)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def spec(self):
+        """Picklable handle that workers pass to attach()"""
+        return self.block.name, self.layout
+
+    def close(self):
+        self.arrays = {}
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+
+_shared = None
+
+
+def _init_worker(spec):
+    global _shared
+    _shared = SharedArrays.attach(spec)
+
+
+def candidate_configs(grid=SEARCH_GRID):
+    """Expand a parameter grid into a list of config dicts"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def fit_config(params, engine_dir, arrays=None, k=TOP_K):
+    """Train one config, score its accuracy and save its flat-array engine to engine_dir for timing"""
+    arrays = arrays if arrays is not None else _shared.arrays
+    X_val, y_val = arrays['X_val'], arrays['y_val']
+
+    start = time.perf_counter()
+    model = RandomForestClassifier(**BASE_PARAMS, **params, n_jobs=1)
+    model.fit(arrays['X_train'], arrays['y_train'])
+    fit_seconds = time.perf_counter() - start
+
+    engine = FlatForest.from_sklearn(model)
+    hit_rates = top_k_hit_rates(engine.predict_proba(X_val), engine.classes_, y_val, (1, k))
+    engine.save(engine_dir)
+
+    return {
+        'params': params,
+        'top1': hit_rates[1],
+        f'top{k}': hit_rates[k],
+        'model_bytes': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        'fit_seconds': fit_seconds,
+    }
+
+
+def time_engine(engine, X_val):
+    """Median single-row latency and batch throughput, timed like bench_engine.py"""
+    row = X_val[:1]
+    engine.predict_proba(row)
+    batch = np.resize(X_val, (THROUGHPUT_ROWS, X_val.shape[1]))
+    return {
+        'latency_ms': time_call(engine.predict_proba, row, LATENCY_REPEATS) * 1000,
+        'rows_per_sec': THROUGHPUT_ROWS / time_call(engine.predict_proba, batch, THROUGHPUT_REPEATS),
+    }
+
+
+def pareto_front(results, k=TOP_K):
+    """Mark results that no other config beats on both top-k hit rate and latency"""
+    for result in results:
+        result['pareto'] = not any(
+            other[f'top{k}'] >= result[f'top{k}'] and other['latency_ms'] <= result['latency_ms']
+            and (other[f'top{k}'] > result[f'top{k}'] or other['latency_ms'] < result['latency_ms'])
+            for other in results
+        )
+    return [result for result in results if result['pareto']]
+
+
+def select_config(results, latency_budget_ms=DEFAULT_LATENCY_BUDGET_MS, k=TOP_K):
+    """Most accurate Pareto-optimal config within the latency budget (fastest if none fit)"""
+    front = pareto_front(results, k)
+    within = [result for result in front if result['latency_ms'] <= latency_budget_ms]
+    if not within:
+        return min(front, key=lambda result: result['latency_ms'])
+    return max(within, key=lambda result: (result[f'top{k}'], result['top1'], -result['model_bytes']))
+
+
+def run_search(X_train, y_train, X_val, y_val, configs, workers=None, log=print):
+    """Train configs in a pool sharing one copy of the data, then time each serially; results in config order"""
+    workers = workers or min(len(configs), os.cpu_count() or 1)
+    # Trees split on float32 features, so storing them as float32 lets workers fit without a private copy
+    shared = SharedArrays.create({
+        'X_train': np.asarray(X_train, dtype=np.float32),
+        'y_train': np.asarray(y_train, dtype=np.int64),
+        'X_val': np.asarray(X_val, dtype=np.float64),
+        'y_val': np.asarray(y_val, dtype=np.int64),
+    })
+    scratch = tempfile.mkdtemp(prefix='model_search_')
+    engine_dirs = [os.path.join(scratch, str(i)) for i in range(len(configs))]
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+            futures = [pool.submit(fit_config, params, engine_dir) for params, engine_dir in zip(configs, engine_dirs)]
+            results = [future.result() for future in futures]
+
+        # Timed after the pool has shut down, so every config gets the same idle cores
+        X_val = np.asarray(X_val, dtype=np.float64)
+        for result, engine_dir in zip(results, engine_dirs):
+            result.update(time_engine(FlatForest.load(engine_dir, mmap=False), X_val))
+            shutil.rmtree(engine_dir)
+            log(format_result(result))
+    finally:
+        shared.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def format_result(result, k=TOP_K):
+    params = ', '.join(f'{name}={value}' for name, value in result['params'].items())
+    return (f"{params:<50} top1 {result['top1'] * 100:5.1f}%  top{k} {result[f'top{k}'] * 100:5.1f}%  "
+            f"{result['latency_ms']:6.2f}ms  {result['rows_per_sec']:>9,.0f} rows/s  "
+            f"{result['model_bytes'] / 1e6:7.1f}MB")
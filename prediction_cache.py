@@ -0,0 +1,124 @@
+"""
+Process-wide LRU cache for single-student predictions.
+
+During result season most queries repeat the same popular course, location and
+score, so finished results (institute names and match percentages) are cached
+by normalized input. The cache is tied to a model version and empties itself
+when a different version is served.
+
+Configuration (environment variables):
+    CPS_CACHE_SIZE      Maximum cached results, 0 disables caching (default: 10000)
+    CPS_CACHE_DECIMALS  Decimals the percentile is rounded to (default: 2)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from predictor import predict_one
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_DECIMALS = 2
+
+
+class PredictionCache:
+    """Thread-safe, size-bounded LRU cache with hit/miss/eviction counters"""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, decimals=DEFAULT_CACHE_DECIMALS):
+        self.max_size = max_size
+        self.decimals = decimals
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured from CPS_CACHE_SIZE and CPS_CACHE_DECIMALS"""
+        return cls(
+            max_size=int(os.environ.get('CPS_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+            decimals=int(os.environ.get('CPS_CACHE_DECIMALS', DEFAULT_CACHE_DECIMALS)),
+        )
+
+    def normalize_score(self, score):
+        """Round a percentile to the cache's precision"""
+        return round(float(score), self.decimals)
+
+    def make_key(self, course, location, score):
+        return (str(course).strip(), str(location).strip(), self.normalize_score(score))
+
+    def validate(self, version):
+        """Drop every entry if the served model version has changed"""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result, version=None):
+        """Store a result; one computed on a version that is no longer served is dropped"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'version': self.version,
+            }
+
+
+def cached_prediction(cache, model, label_encoders, le_target, lookup_table,
+                      course, location, score, version=None):
+    """Return (institutes, match percentages) for one student, using the cache when possible"""
+    key = cache.make_key(course, location, score)
+    with metrics.stage('cache'):
+        result = cache.get(key)
+    if result is not None:
+        return result
+
+    with metrics.stage('encode'):
+        course_code = label_encoders['Course Name'].transform([key[0]])[0]
+        location_code = label_encoders['Location'].transform([key[1]])[0]
+    # Score the rounded percentile so a cached answer never depends on who asked first
+    codes, probabilities = predict_one(model, lookup_table, course_code, location_code, key[2])
+    with metrics.stage('decode'):
+        result = (
+            le_target.inverse_transform(codes).tolist(),
+            (np.asarray(probabilities, dtype=float) * 100).tolist(),
+        )
+    # A model swapped in meanwhile has emptied the cache; don't refill it with the old model's answer
+    cache.put(key, result, version)
+    return result
@@ -0,0 +1,302 @@
+"""
+Headless HTTP/JSON prediction service with request micro-batching.
+
+Concurrent requests are collected for a few milliseconds and scored together
+with one vectorized predict_proba call, then the results are split back out to
+each waiting request.
+
+With --reload-interval the service watches for a new model bundle, smoke
+tests it in the background and swaps it in (see app_loader.py). A request
+scores on the model that was active when it arrived; /health reports the
+active version and reload counters.
+
+With --metrics the model, ranking and decoding stages and each whole request
+(including its wait for a batch) are timed into histograms, which /metrics
+serves with the model version and batch counters in the Prometheus text
+format (see metrics.py).
+
+Usage:
+    python prediction_service.py --port 8600
+    python prediction_service.py --port 8600 --reload-interval 30
+    python prediction_service.py --port 8600 --metrics
+    curl -X POST localhost:8600/predict \\
+        -d '{"percentile": 92.5, "course": "Computer Engineering", "location": "Pune"}'
+
+Endpoints:
+    POST /predict   {"percentile": float, "course": str, "location": str}
+    GET  /health
+    GET  /metrics
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+import warnings
+
+import numpy as np
+
+import metrics
+from app_loader import ArtifactLoader
+from predictor import MAX_PERCENTILE, TOP_K, predict_top_k
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+DEFAULT_MAX_CONCURRENCY = 256
+
+
+class MicroBatcher:
+    """Queue single-row requests and score them in batches on a worker thread"""
+
+    def __init__(self, model, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, k=TOP_K):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.k = k
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.rows = 0
+
+    async def predict(self, features, model=None):
+        """Score one encoded feature row and return (target codes, probabilities)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((features, model or self.model, future))
+        return await future
+
+    async def run(self):
+        """Worker loop: drain the queue into batches until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Around a hot reload a batch can hold rows for the old and the new model
+            by_model = {}
+            for item in batch:
+                by_model.setdefault(id(item[1]), []).append(item)
+            for group in by_model.values():
+                await self._score(loop, group)
+
+    async def _score(self, loop, batch):
+        """Score rows queued for the same model in one call and resolve their futures"""
+        features = np.array([row for row, _, _ in batch], dtype=float)
+        try:
+            codes, probabilities = await loop.run_in_executor(
+                None, predict_top_k, batch[0][1], features, self.k
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for i, (_, _, future) in enumerate(batch):
+            if not future.done():
+                future.set_result((codes[i], probabilities[i]))
+
+
+class PredictionService:
+    """Minimal asyncio HTTP/1.1 server in front of a MicroBatcher"""
+
+    def __init__(self, model, label_encoders, le_target, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 version=None, loader=None):
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait_ms)
+        self.loader = loader
+        self.use((model, label_encoders, le_target, None, version))
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        self.started = time.time()
+
+    def use(self, artifacts):
+        """Serve (model, label_encoders, le_target, lookup_table, version) from now on"""
+        model, label_encoders, le_target, _, version = artifacts
+        # Plain dict lookups are much cheaper than LabelEncoder.transform per request
+        course_codes = {name: code for code, name in enumerate(label_encoders['Course Name'].classes_)}
+        location_codes = {name: code for code, name in enumerate(label_encoders['Location'].classes_)}
+        # One assignment, so a request never mixes one version's encoders with another's model
+        self.state = (model, course_codes, location_codes, le_target.classes_, version)
+
+    async def predict(self, payload):
+        """Validate a JSON payload and return the response body"""
+        try:
+            score = float(payload['percentile'])
+            course = payload['course']
+            location = payload['location']
+        except (KeyError, TypeError, ValueError):
+            return 400, {'error': 'expected percentile, course and location'}
+        if not math.isfinite(score) or not 0 <= score <= MAX_PERCENTILE:
+            return 400, {'error': f'percentile must be between 0 and {MAX_PERCENTILE:g}'}
+        if not isinstance(course, str) or not isinstance(location, str):
+            return 400, {'error': 'course and location must be strings'}
+        start = time.perf_counter()
+        model, course_codes, location_codes, institutes, version = self.state
+        if course not in course_codes:
+            return 400, {'error': f'unknown course: {course}'}
+        if location not in location_codes:
+            return 400, {'error': f'unknown location: {location}'}
+
+        features = [score, course_codes[course], location_codes[location]]
+        async with self.semaphore:
+            codes, probabilities = await self.batcher.predict(features, model)
+        with metrics.stage('decode'):
+            body = {
+                'institutes': institutes[codes].tolist(),
+                'probabilities': [round(float(p) * 100, 2) for p in probabilities],
+                'model_version': version,
+            }
+        # Includes the wait for a batch to fill, unlike the model and rank stages
+        metrics.observe('request', time.perf_counter() - start)
+        return 200, body
+
+    def health(self):
+        body = {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'batches': self.batcher.batches,
+            'rows': self.batcher.rows,
+            'max_batch_size': self.batcher.max_batch_size,
+            'model_version': self.state[-1],
+        }
+        if self.loader is not None:
+            status = self.loader.status()
+            body.update({
+                'loaded_at': status['loaded_at'],
+                'reloads': status['reloads'],
+                'reload_failures': status['reload_failures'],
+                'reload_error': status['reload_error'],
+            })
+        return 200, body
+
+    def samples(self):
+        """Micro-batcher counters, for metrics.set_collector()"""
+        return [
+            ('service_batches_total', 'counter', 'Batches scored by the micro-batcher', self.batcher.batches, {}),
+            ('service_rows_total', 'counter', 'Requests scored by the micro-batcher', self.batcher.rows, {}),
+        ]
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method == 'POST' and path == '/predict':
+                    try:
+                        status, response = await self.predict(json.loads(body or b'{}'))
+                    except json.JSONDecodeError:
+                        status, response = 400, {'error': 'invalid JSON'}
+                    except Exception as e:
+                        status, response = 500, {'error': str(e)}
+                elif method == 'GET' and path == '/health':
+                    status, response = self.health()
+                elif method == 'GET' and path == '/metrics':
+                    status, response = 200, metrics.render()
+                else:
+                    status, response = 404, {'error': 'not found'}
+
+                if isinstance(response, str):
+                    data, content_type = response.encode(), 'text/plain; version=0.0.4'
+                else:
+                    data, content_type = json.dumps(response).encode(), 'application/json'
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8600):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        worker = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"✅ Prediction service listening on http://{host}:{port}")
+        print(f"   max batch size {self.batcher.max_batch_size}, "
+              f"max wait {self.batcher.max_wait * 1000:.1f}ms, "
+              f"max concurrency {self.max_concurrency}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the headless prediction service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help='Most requests scored in one predict_proba call (1 disables batching)')
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help='How long to hold a batch open for more requests')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help='Most requests waiting on the model at once')
+    parser.add_argument('--sklearn', action='store_true',
+                        help='Serve model.pkl even if the flat-array engine is available')
+    parser.add_argument('--reload-interval', type=float, default=0,
+                        help='Seconds between checks for a new model version (0 disables hot reload)')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Time each stage of a request into the histograms served by /metrics')
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    print("Loading model and encoders...")
+    loader = ArtifactLoader(prefer_engine=not args.sklearn, watch_interval=args.reload_interval)
+    model, label_encoders, le_target, _, version = loader.wait_model()
+    print(f"✓ Model version {version}")
+
+    service = PredictionService(
+        model, label_encoders, le_target,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_concurrency=args.max_concurrency,
+        version=version,
+        loader=loader,
+    )
+    loader.on_swap = service.use
+    # Catch a swap that happened before the callback was attached
+    service.use(loader.artifacts)
+    metrics.set_collector('service', service.samples)
+    metrics.set_collector('model', lambda: metrics.loader_samples(loader))
+    metrics.start_exporter()
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
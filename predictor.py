@@ -0,0 +1,351 @@
+"""
+Shared prediction helpers for the College Prediction System.
+
+Used by train_model.py to precompute results and by cps_app.py to serve them.
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+import metrics
+from artifacts import save_arrays, load_arrays, artifact_version
+from forest_engine import FlatForest, COMPACT_DIR
+from model_bundle import BUNDLE_DIR, check_compatible, encoder_fingerprint, load_bundle_encoders, load_bundle_model
+from cutoff_index import CutoffIndex, CUTOFF_DIR
+from model_metadata import METADATA_FILE
+
+TOP_K = 7
+EVAL_KS = (1, 3, 7)
+LOOKUP_DIR = 'lookup_arrays'
+DEFAULT_GRID_STEP = 0.1
+WHAT_IF_SPAN = 5.0
+MAX_PERCENTILE = 100.0
+ARTIFACT_PATHS = [BUNDLE_DIR, 'model.pkl', 'label_encoders.pkl', 'target_encoder.pkl', COMPACT_DIR, LOOKUP_DIR,
+                  CUTOFF_DIR, METADATA_FILE]
+
+# Inference parallelism; each setting can be overridden with the CPS_* variable of the same name
+# n_jobs: fixed thread count for every call (0 = choose per call, -1 = all cores)
+# parallel_min_rows: batches smaller than this always run serially
+# max_jobs: upper bound on threads when choosing per call (0 = all cores)
+INFERENCE = {
+    'n_jobs': int(os.environ.get('CPS_N_JOBS', 0)),
+    'parallel_min_rows': int(os.environ.get('CPS_PARALLEL_MIN_ROWS', 20000)),
+    'max_jobs': int(os.environ.get('CPS_MAX_JOBS', 0)),
+}
+
+
+def model_version():
+    """Short fingerprint of the artifacts load_artifacts() would read right now"""
+    return artifact_version(ARTIFACT_PATHS)
+
+
+def load_model(prefer_engine=True):
+    """Load the model that serves predictions"""
+    # Prefer the memory-mapped flat-array engine; it gives the same predictions
+    # without sklearn overhead and shares its pages with other processes.
+    # The compact forest from compress_model.py is preferred over the bundle's full one.
+    if prefer_engine and os.path.exists(COMPACT_DIR):
+        return FlatForest.load(COMPACT_DIR)
+    if prefer_engine and os.path.exists(BUNDLE_DIR):
+        return load_bundle_model()
+    with open('model.pkl', 'rb') as model_file:
+        model = pickle.load(model_file)
+    # Training pickles n_jobs=-1 and verbose=1; parallelism is chosen per call instead
+    model.n_jobs = None
+    model.verbose = 0
+    return model
+
+
+def load_encoders():
+    """Load the feature label encoders and the target encoder"""
+    if os.path.exists(BUNDLE_DIR):
+        return load_bundle_encoders()
+    # Models trained before the bundle existed saved loose pickles
+    with open('label_encoders.pkl', 'rb') as enc_file:
+        label_encoders = pickle.load(enc_file)
+    with open('target_encoder.pkl', 'rb') as target_file:
+        le_target = pickle.load(target_file)
+    return label_encoders, le_target
+
+
+def check_model(model, label_encoders, le_target):
+    """check_compatible(), also refusing unstamped models (an old model.pkl) once a bundle exists"""
+    check_compatible(model, label_encoders, le_target, require_fingerprint=os.path.exists(BUNDLE_DIR))
+
+
+def _if_compatible(path, artifact, label_encoders, le_target):
+    """The artifact if it was built with these encoders, else None with a warning"""
+    if label_encoders is None:
+        return artifact
+    try:
+        # Stamped by train_model.py like the bundle's forest; None for artifacts saved before that
+        if artifact.encoder_fingerprint not in (None, encoder_fingerprint(label_encoders, le_target)):
+            raise ValueError("built with encoders from a different training run; retrain the model")
+        artifact.check(label_encoders, le_target)
+    except ValueError as e:
+        print(f"⚠️  Ignoring {path}: {e}")
+        return None
+    return artifact
+
+
+def load_lookup_table(label_encoders=None, le_target=None):
+    """Load the precomputed lookup table, or None if it was not built or does not match the encoders"""
+    # The table is optional; without it every query uses the live model
+    if not os.path.exists(LOOKUP_DIR):
+        return None
+    return _if_compatible(LOOKUP_DIR, LookupTable.load(LOOKUP_DIR), label_encoders, le_target)
+
+
+def load_cutoff_index(label_encoders=None, le_target=None):
+    """Load the cutoff-index engine, or None if it was not built or does not match the encoders"""
+    if not os.path.exists(CUTOFF_DIR):
+        return None
+    return _if_compatible(CUTOFF_DIR, CutoffIndex.load(CUTOFF_DIR), label_encoders, le_target)
+
+
+def load_artifacts(prefer_engine=True):
+    """Load the model, label encoders, target encoder and optional lookup table"""
+    model = load_model(prefer_engine)
+    label_encoders, le_target = load_encoders()
+    check_model(model, label_encoders, le_target)
+    return model, label_encoders, le_target, load_lookup_table(label_encoders, le_target)
+
+
+def encode_inputs(label_encoders, scores, courses, locations):
+    """Encode raw scores, course names and locations into the model's feature matrix"""
+    scores = np.asarray(scores, dtype=float).reshape(-1)
+    course_codes = label_encoders['Course Name'].transform(np.asarray(courses).reshape(-1))
+    location_codes = label_encoders['Location'].transform(np.asarray(locations).reshape(-1))
+    return np.column_stack([scores, course_codes, location_codes]).astype(float)
+
+
+def top_k_from_proba(proba, k=TOP_K):
+    """Return the column indices and probabilities of the k most likely classes per row"""
+    proba = np.atleast_2d(proba)
+    top = proba.argsort(axis=1)[:, -k:][:, ::-1]
+    return top, np.take_along_axis(proba, top, axis=1)
+
+
+def top_k_hit_rates(proba, classes, targets, ks=EVAL_KS):
+    """Fraction of rows whose true class is among the k most likely, for each k in ks"""
+    top, _ = top_k_from_proba(proba, max(ks))
+    hits = np.cumsum(np.asarray(classes)[top] == np.asarray(targets)[:, None], axis=1) > 0
+    return {k: float(hits[:, k - 1].mean()) for k in ks}
+
+
+def configure_inference(**settings):
+    """Override INFERENCE settings (n_jobs, parallel_min_rows, max_jobs) for this process"""
+    unknown = set(settings) - set(INFERENCE)
+    if unknown:
+        raise ValueError(f"Unknown inference settings: {sorted(unknown)}")
+    INFERENCE.update(settings)
+
+
+def inference_jobs(n_rows):
+    """Threads to score n_rows with: serial for small requests, idle cores for big batches"""
+    cpus = os.cpu_count() or 1
+    if INFERENCE['n_jobs']:
+        return cpus if INFERENCE['n_jobs'] < 0 else INFERENCE['n_jobs']
+    if n_rows < INFERENCE['parallel_min_rows']:
+        return 1
+    try:
+        idle = cpus - int(round(os.getloadavg()[0]))
+    except (AttributeError, OSError):
+        idle = cpus
+    # Past the threshold a batch is worth every idle core; the engines split it into that many parts
+    limit = INFERENCE['max_jobs'] or cpus
+    return max(1, min(idle, limit))
+
+
+def predict_proba(model, features):
+    """model.predict_proba with the thread count picked by inference_jobs()"""
+    if isinstance(model, CutoffIndex):
+        return model.predict_proba(features)
+    n_jobs = inference_jobs(len(features))
+    if isinstance(model, FlatForest):
+        return model.predict_proba(features, n_jobs=n_jobs)
+    from joblib import parallel_config
+    # The setting is thread-local, so concurrent sessions each get their own
+    with parallel_config(backend='threading', n_jobs=n_jobs):
+        return model.predict_proba(features)
+
+
+def smoke_test(model, label_encoders, le_target, cutoff_index=None, n_rows=64, seed=0):
+    """Score a small random batch and raise ValueError if the artifacts do not work together"""
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([
+        np.round(rng.uniform(0, MAX_PERCENTILE, n_rows), 1),
+        rng.integers(0, len(label_encoders['Course Name'].classes_), n_rows),
+        rng.integers(0, len(label_encoders['Location'].classes_), n_rows),
+    ]).astype(float)
+    check_model(model, label_encoders, le_target)
+    n_institutes = len(le_target.classes_)
+    for name, engine in [('model', model), ('cutoff index', cutoff_index)]:
+        if engine is None:
+            continue
+        if engine.classes_.min() < 0 or engine.classes_.max() >= n_institutes:
+            raise ValueError(f"{name} predicts institutes the target encoder does not know")
+        proba = predict_proba(engine, features)
+        if proba.shape != (n_rows, len(engine.classes_)):
+            raise ValueError(f"{name} returned probabilities of shape {proba.shape}")
+        totals = proba.sum(axis=1)
+        # Forest rows sum to 1; the cutoff index has empty rows where nothing is reachable
+        valid = np.isclose(totals, 1, atol=1e-2) | ((engine is cutoff_index) & (totals == 0))
+        if not np.isfinite(proba).all() or (proba < 0).any() or not valid.all():
+            raise ValueError(f"{name} returned invalid probabilities")
+
+
+def predict_top_k(model, features, k=TOP_K):
+    """Run the forest on encoded features and return top-k target codes and probabilities"""
+    with metrics.stage('model'):
+        proba = predict_proba(model, features)
+    with metrics.stage('rank'):
+        top, probabilities = top_k_from_proba(proba, k)
+    return model.classes_[top], probabilities
+
+
+def predict_one(model, lookup_table, course_code, location_code, score, k=TOP_K):
+    """Answer a single query from the lookup table, falling back to the live model on a miss"""
+    if lookup_table is not None:
+        with metrics.stage('lookup'):
+            hit = lookup_table.get(course_code, location_code, score)
+        if hit is not None:
+            return hit
+    features = np.array([[score, course_code, location_code]], dtype=float)
+    codes, probabilities = predict_top_k(model, features, k)
+    return codes[0], probabilities[0]
+
+
+def predict_combinations(model, course_codes, location_codes, score, k=TOP_K):
+    """Score every course/location combination in one batch; returns the k best (courses, locations, targets, probabilities)"""
+    courses, locations = np.meshgrid(np.atleast_1d(course_codes), np.atleast_1d(location_codes), indexing='ij')
+    courses, locations = courses.ravel(), locations.ravel()
+    features = np.column_stack([np.full(len(courses), score), courses, locations]).astype(float)
+    with metrics.stage('model'):
+        proba = predict_proba(model, features)
+    # One ranking across every combination; an institute can appear once per course and location
+    flat = proba.ravel()
+    k = min(k, flat.size)
+    with metrics.stage('rank'):
+        best = np.argpartition(-flat, k - 1)[:k]
+        best = best[np.argsort(-flat[best], kind='stable')]
+        best = best[flat[best] > 0]
+    rows, columns = np.divmod(best, proba.shape[1])
+    return courses[rows], locations[rows], model.classes_[columns], flat[best]
+
+
+def score_sweep(model, course_codes, location_codes, score, span=WHAT_IF_SPAN, step=DEFAULT_GRID_STEP):
+    """Score each course/location pair at every step within +/- span in one batch; returns (scores, proba per pair)"""
+    low, high = max(0.0, score - span), min(MAX_PERCENTILE, score + span)
+    scores = np.round(np.arange(round(low / step), round(high / step) + 1) * step, 10)
+    course_codes, location_codes = np.atleast_1d(course_codes), np.atleast_1d(location_codes)
+    features = np.column_stack([
+        np.tile(scores, len(course_codes)),
+        np.repeat(course_codes, len(scores)),
+        np.repeat(location_codes, len(scores)),
+    ]).astype(float)
+    with metrics.stage('what_if'):
+        proba = predict_proba(model, features)
+    return scores, proba.reshape(len(course_codes), len(scores), -1)
+
+
+def percentile_grid(step=DEFAULT_GRID_STEP):
+    """Return the percentile values covered by a lookup table with the given step"""
+    n_points = int(round(MAX_PERCENTILE / step)) + 1
+    # Round to the decimal value a user would type so grid points match exactly
+    return np.round(np.arange(n_points) * step, 10)
+
+
+class LookupTable:
+    """Precomputed top-k institutes for (course, location) pairs across a percentile grid"""
+
+    def __init__(self, codes, probabilities, pair_index, n_locations, step, n_institutes=None,
+                 encoder_fingerprint=None):
+        self.codes = codes
+        self.probabilities = probabilities
+        self.pair_index = pair_index
+        self.n_locations = int(n_locations)
+        self.step = float(step)
+        self.n_points = codes.shape[1]
+        # None for tables saved before they were recorded
+        self.n_institutes = n_institutes
+        self.encoder_fingerprint = encoder_fingerprint
+
+    @classmethod
+    def build(cls, model, pairs, n_courses, n_locations, step=DEFAULT_GRID_STEP,
+              k=TOP_K, chunk_size=50000):
+        """Score every grid point of every (course code, location code) pair with the model"""
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        grid = percentile_grid(step)
+        n_points = len(grid)
+
+        pair_index = np.full(n_courses * n_locations, -1, dtype=np.int32)
+        pair_index[pairs[:, 0] * n_locations + pairs[:, 1]] = np.arange(len(pairs), dtype=np.int32)
+
+        codes = np.empty((len(pairs), n_points, k), dtype=np.int16)
+        probabilities = np.empty((len(pairs), n_points, k), dtype=np.float32)
+
+        pairs_per_chunk = max(1, chunk_size // n_points)
+        for start in range(0, len(pairs), pairs_per_chunk):
+            chunk = pairs[start:start + pairs_per_chunk]
+            features = np.column_stack([
+                np.tile(grid, len(chunk)),
+                np.repeat(chunk[:, 0], n_points),
+                np.repeat(chunk[:, 1], n_points),
+            ]).astype(float)
+            top_codes, top_probs = predict_top_k(model, features, k)
+            end = start + len(chunk)
+            codes[start:end] = top_codes.reshape(len(chunk), n_points, k)
+            probabilities[start:end] = top_probs.reshape(len(chunk), n_points, k)
+
+        return cls(codes, probabilities, pair_index, n_locations, step, len(model.classes_))
+
+    def check(self, label_encoders, le_target):
+        """Raise ValueError if the table was not built for encoders of this size"""
+        n_courses, n_locations = len(label_encoders['Course Name'].classes_), len(label_encoders['Location'].classes_)
+        if self.n_locations != n_locations or len(self.pair_index) != n_courses * n_locations:
+            raise ValueError("built for a different set of courses or locations; retrain the model")
+        if self.n_institutes is not None and self.n_institutes != len(le_target.classes_):
+            raise ValueError(f"built for {self.n_institutes} institutes, the encoders have "
+                             f"{len(le_target.classes_)}; retrain the model")
+
+    def get(self, course_code, location_code, score):
+        """Return (target codes, probabilities) for a query, or None if it is not on the grid"""
+        position = int(round(score / self.step))
+        if position < 0 or position >= self.n_points:
+            return None
+        if abs(position * self.step - score) > 1e-9:
+            return None
+        row = self.pair_index[int(course_code) * self.n_locations + int(location_code)]
+        if row < 0:
+            return None
+        return self.codes[row, position], self.probabilities[row, position]
+
+    def save(self, path=LOOKUP_DIR):
+        """Write the table as a memory-mappable artifact directory"""
+        save_arrays(
+            path,
+            {
+                'codes': self.codes,
+                'probabilities': self.probabilities,
+                'pair_index': self.pair_index,
+            },
+            meta={'n_locations': self.n_locations, 'step': self.step, 'n_institutes': self.n_institutes,
+                  'encoder_fingerprint': self.encoder_fingerprint},
+        )
+
+    @classmethod
+    def load(cls, path=LOOKUP_DIR, mmap=True):
+        """Open a table written by save(); arrays are mapped read-only unless mmap=False"""
+        arrays, meta = load_arrays(path, mmap=mmap)
+        return cls(
+            arrays['codes'],
+            arrays['probabilities'],
+            arrays['pair_index'],
+            meta['n_locations'],
+            meta['step'],
+            meta.get('n_institutes'),
+            meta.get('encoder_fingerprint'),
+        )
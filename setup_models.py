@@ -5,13 +5,18 @@ This creates placeholder files and instructions for uploading real models.
 """
 
 import os
-import pickle
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 import numpy as np
 
+from forest_engine import FlatForest
+from model_bundle import BUNDLE_DIR, is_placeholder, save_bundle
+
 def create_dummy_models():
     """Create minimal dummy model files for testing deployment"""
+    if os.path.exists(BUNDLE_DIR) and not is_placeholder(BUNDLE_DIR):
+        print(f"❌ {BUNDLE_DIR} holds a trained model; not replacing it with dummy files")
+        return
     print("Creating dummy model files for deployment...")
     
     # Create dummy RandomForest model
@@ -31,18 +36,9 @@ def create_dummy_models():
     le_target = LabelEncoder()
     le_target.fit([f'College{i}' for i in range(358)])
     
-    # Save files
-    with open('model.pkl', 'wb') as f:
-        pickle.dump(dummy_model, f)
-    print("✅ model.pkl created")
-    
-    with open('label_encoders.pkl', 'wb') as f:
-        pickle.dump(label_encoders, f)
-    print("✅ label_encoders.pkl created")
-    
-    with open('target_encoder.pkl', 'wb') as f:
-        pickle.dump(le_target, f)
-    print("✅ target_encoder.pkl created")
+    # Save a bundle marked as placeholder, so the app says it is not a trained model
+    save_bundle(FlatForest.from_sklearn(dummy_model), label_encoders, le_target, BUNDLE_DIR, placeholder=True)
+    print(f"✅ {BUNDLE_DIR} created")
     
     print("\n⚠️  Note: These are dummy files for testing deployment.")
     print("To use real models, replace them with your trained models.")
@@ -0,0 +1,23 @@
+"""Saving over an artifact must not disturb processes that have the old one mapped"""
+
+import os
+
+import numpy as np
+
+from artifacts import load_arrays, save_arrays
+
+
+def test_save_replaces_mapped_artifact(tmp_path):
+    path = str(tmp_path / 'lookup_arrays')
+    old = np.arange(1 << 16, dtype=np.int64)
+    save_arrays(path, {'codes': old, 'stale': old}, meta={'step': 0.1})
+    mapped, _ = load_arrays(path)
+
+    # Smaller than before: rewriting the mapped file in place would truncate it under the mapping
+    save_arrays(path, {'codes': old[:10] + 1}, meta={'step': 0.5})
+    np.testing.assert_array_equal(mapped['codes'], old)
+    arrays, meta = load_arrays(path)
+    np.testing.assert_array_equal(arrays['codes'], old[:10] + 1)
+    assert meta['step'] == 0.5 and meta['arrays'] == ['codes']
+    assert sorted(os.listdir(tmp_path)) == ['lookup_arrays']
+    assert sorted(os.listdir(path)) == ['codes.npy', 'meta.json']
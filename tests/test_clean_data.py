@@ -0,0 +1,111 @@
+"""The vectorized, streaming and incremental cleaners must match the row-wise reference exactly"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_clean_data import COURSES, CITIES, csv_digest, make_raw_dataset
+from clean_data import (NAME_COLUMNS, CleanedStore, CleanedWriter, clean_course_name, clean_course_names,
+                        clean_dataset, clean_distinct, clean_file_streaming, clean_institute_name,
+                        clean_institute_names, clean_location, clean_locations)
+
+# Values the synthetic dataset does not produce: empty and blank cells, codes
+# without a name, non-ASCII text, and city names inside longer locations
+EDGE_VALUES = [
+    '', ' ', '\n', '42', '42 - ', '6006 -College', '  3215  -  A & B  College, Pune.  ',
+    'Vidyalankar\tInstitute', "St. Xavier's (Autonomous)", 'Électronique & Télécom', '१२३ - संस्था',
+    'Navi Mumbai', 'Mumbai, Navi Mumbai', 'Pune University', 'University of Mumbai', 'Thane-West',
+    '#Nagpur!', '(Kolhapur)', 'Dist. Raigad', 'A&B', 'C++ / Java', 'Mechanical\r\nEngineering',
+]
+
+
+@pytest.fixture
+def raw():
+    data = make_raw_dataset(3000, n_institutes=120)
+    # Exact duplicates of raw rows, so dedup is exercised before and after cleaning
+    return pd.concat([data, data.iloc[::17]], ignore_index=True)
+
+
+@pytest.mark.parametrize('rowwise, vectorized', [
+    (clean_institute_name, clean_institute_names),
+    (clean_course_name, clean_course_names),
+    (clean_location, clean_locations),
+])
+def test_vectorized_cleaners_match_rowwise(rowwise, vectorized):
+    values = pd.Series(EDGE_VALUES + CITIES + COURSES + [np.nan, None], dtype=object)
+    expected = values.apply(rowwise)
+    actual = clean_distinct(values, vectorized)
+    assert actual.isna().equals(expected.isna())
+    assert actual[expected.notna()].tolist() == expected[expected.notna()].tolist()
+
+
+def test_vectorized_dataset_matches_rowwise(raw):
+    rowwise = clean_dataset(raw.copy(), vectorized=False, verbose=False)
+    vectorized = clean_dataset(raw.copy(), vectorized=True, verbose=False)
+    assert len(rowwise) > 0
+    assert csv_digest(vectorized) == csv_digest(rowwise)
+
+
+def clean_in_memory(input_path, output_path, csv_path):
+    """What clean_data.py does without --stream or --incremental"""
+    data = clean_dataset(pd.read_csv(input_path), verbose=False)
+    writer = CleanedWriter(output_path, csv_path)
+    writer.write(data)
+    writer.close()
+    return len(data)
+
+
+def assert_same_output(expected, actual):
+    """Byte-identical CSV and equal Parquet rows, given (parquet, csv) path pairs"""
+    with open(expected[1], 'rb') as expected_file, open(actual[1], 'rb') as actual_file:
+        assert actual_file.read() == expected_file.read()
+    expected, actual = pd.read_parquet(expected[0]), pd.read_parquet(actual[0])
+    assert all(isinstance(actual[column].dtype, pd.CategoricalDtype) for column in NAME_COLUMNS)
+    # Chunked files list categories in first-seen order; train_model.py sorts them anyway
+    as_values = {column: object for column in NAME_COLUMNS}
+    pd.testing.assert_frame_equal(actual.astype(as_values), expected.astype(as_values))
+
+
+@pytest.mark.parametrize('chunk_size', [97, 1000, 100000])
+def test_streaming_matches_in_memory(tmp_path, raw, chunk_size):
+    raw.to_csv(tmp_path / 'raw.csv', index=False)
+    expected = (str(tmp_path / 'memory.parquet'), str(tmp_path / 'memory.csv'))
+    actual = (str(tmp_path / 'stream.parquet'), str(tmp_path / 'stream.csv'))
+    total = clean_in_memory(str(tmp_path / 'raw.csv'), *expected)
+    streamed, _ = clean_file_streaming(str(tmp_path / 'raw.csv'), *actual, chunk_size=chunk_size, verbose=False)
+    assert streamed == total
+    assert_same_output(expected, actual)
+
+
+def test_incremental_matches_full_clean(tmp_path, raw):
+    rounds = [str(tmp_path / f'round{number}.csv') for number in range(3)]
+    parts = np.array_split(np.arange(len(raw)), 4)
+    raw.iloc[parts[0]].to_csv(rounds[0], index=False)
+    raw.iloc[parts[1]].to_csv(rounds[1], index=False)
+    store = CleanedStore(str(tmp_path / 'store'))
+
+    def check(paths):
+        pd.concat([pd.read_csv(path) for path in paths], ignore_index=True).to_csv(tmp_path / 'all.csv', index=False)
+        expected = (str(tmp_path / 'memory.parquet'), str(tmp_path / 'memory.csv'))
+        actual = (str(tmp_path / 'store.parquet'), str(tmp_path / 'store.csv'))
+        total = clean_in_memory(str(tmp_path / 'all.csv'), *expected)
+        exported, _ = store.export(*actual)
+        assert exported == total
+        assert_same_output(expected, actual)
+
+    assert store.update(rounds[:2], chunk_size=500, log=lambda *args: None) == len(parts[0]) + len(parts[1])
+    check(rounds[:2])
+
+    # Rows appended to the last round are read on their own; a new round is read whole
+    raw.iloc[parts[2]].to_csv(rounds[1], mode='a', header=False, index=False)
+    raw.iloc[parts[3]].to_csv(rounds[2], index=False)
+    store = CleanedStore(str(tmp_path / 'store'))
+    assert store.update(rounds, chunk_size=500, log=lambda *args: None) == len(parts[2]) + len(parts[3])
+    check(rounds)
+
+    # Changing the first round re-cleans everything after it, since dedup keeps first occurrences
+    raw.iloc[parts[3]].to_csv(rounds[0], index=False)
+    assert store.update(rounds, chunk_size=500, log=lambda *args: None) == len(raw) + len(parts[3]) - len(parts[0])
+    check(rounds)
+    # Nothing changed since the last run
+    assert store.update(rounds, chunk_size=500, log=lambda *args: None) == 0
@@ -0,0 +1,185 @@
+"""Fetch a bundle from a local stand-in for the static file host"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import download_models
+from download_models import RangeRequestHandler, fetch_bundle
+from model_bundle import MANIFEST_FILE, SCHEMA_VERSION, verify_bundle
+
+CHUNK = 64 << 10
+
+
+class CountingHandler(RangeRequestHandler):
+    """Counts the body bytes it sends and, while truncate is set, cuts every bundle file's body in half"""
+
+    sent = 0
+    truncated = 0
+    truncate = False
+    lock = threading.Lock()
+
+    def copyfile(self, source, outputfile):
+        body = source.read()
+        # The manifest is small and only retried, not resumed
+        if type(self).truncate and len(body) > 1 and not self.path.endswith(MANIFEST_FILE):
+            body = body[:len(body) // 2]
+            self.close_connection = True
+            with type(self).lock:
+                type(self).truncated += 1
+        with type(self).lock:
+            type(self).sent += len(body)
+        outputfile.write(body)
+
+
+def write_bundle(directory, files):
+    """A served bundle: the files and a manifest listing their sizes and checksums"""
+    entries = {}
+    for name, data in files.items():
+        os.makedirs(os.path.dirname(os.path.join(directory, name)), exist_ok=True)
+        with open(os.path.join(directory, name), 'wb') as file:
+            file.write(data)
+        entries[name] = {'bytes': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump({'schema_version': SCHEMA_VERSION, 'encoder_fingerprint': 'test', 'placeholder': False,
+                   'files': entries}, manifest_file)
+    return sum(len(data) for data in files.values())
+
+
+@pytest.fixture
+def host(tmp_path):
+    """(url, served directory, handler class) of a Range-capable HTTP server on a free port"""
+    served = tmp_path / 'served'
+    handler = type('Handler', (CountingHandler,), {'sent': 0, 'truncated': 0, 'truncate': False,
+                                                'lock': threading.Lock()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', served, handler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def files():
+    data = os.urandom(5 * CHUNK + 123)
+    return {'forest/leaf_probs.npy': data, 'forest/meta.json': b'{}', 'encoders/courses.npy': data[:1000],
+            'encoders/empty.npy': b''}
+
+
+def test_fetch_resumes_truncated_responses(tmp_path, host, files):
+    url, served, handler = host
+    total = write_bundle(served, files)
+    handler.truncate = True
+    dest = str(tmp_path / 'model_bundle')
+    stats = fetch_bundle(url, dest, str(tmp_path / 'cache'), workers=4, chunk_size=CHUNK)
+    verify_bundle(dest)
+    assert handler.truncated > len(files)
+    assert stats['downloaded_bytes'] == total
+    for name, data in files.items():
+        with open(os.path.join(dest, name), 'rb') as file:
+            assert file.read() == data
+
+
+def test_fetch_resumes_from_partial_parts(tmp_path, host, files):
+    url, served, _ = host
+    write_bundle(served, files)
+    cache = download_models.BlobCache(str(tmp_path / 'cache'))
+    data = files['forest/leaf_probs.npy']
+    blob = cache.blob_path(hashlib.sha256(data).hexdigest())
+    os.makedirs(os.path.dirname(blob))
+    # What an interrupted fetch leaves behind: one whole part and half of the next
+    with open(f'{blob}.{CHUNK}.part0', 'wb') as part:
+        part.write(data[:CHUNK])
+    with open(f'{blob}.{CHUNK}.part1', 'wb') as part:
+        part.write(data[CHUNK:CHUNK + CHUNK // 2])
+    stats = fetch_bundle(url, str(tmp_path / 'model_bundle'), cache.path, chunk_size=CHUNK)
+    assert stats['resumed_bytes'] == CHUNK + CHUNK // 2
+    assert stats['downloaded_bytes'] == stats['bytes'] - stats['resumed_bytes']
+    verify_bundle(str(tmp_path / 'model_bundle'))
+
+
+def test_fetch_refuses_checksum_mismatch(tmp_path, host, files):
+    url, served, _ = host
+    write_bundle(served, files)
+    # Same size, different content: only the checksum can tell
+    with open(served / 'encoders' / 'courses.npy', 'r+b') as file:
+        file.write(b'x')
+    dest = str(tmp_path / 'model_bundle')
+    with pytest.raises(ValueError, match='checksum'):
+        fetch_bundle(url, dest, str(tmp_path / 'cache'), chunk_size=CHUNK)
+    assert not os.path.exists(dest)
+
+    with open(served / MANIFEST_FILE, 'rb') as manifest_file:
+        manifest_sha256 = hashlib.sha256(manifest_file.read()).hexdigest()
+    with pytest.raises(ValueError, match='expected checksum'):
+        fetch_bundle(url, dest, str(tmp_path / 'cache'), manifest_sha256='0' * len(manifest_sha256))
+
+
+@pytest.mark.parametrize('name', ['../../escaped.npy', 'forest/../../escaped.npy', '/tmp/escaped.npy', '..',
+                                  'forest/..', MANIFEST_FILE])
+def test_fetch_refuses_names_outside_the_bundle(tmp_path, host, files, name):
+    url, served, handler = host
+    write_bundle(served, files)
+    with open(served / MANIFEST_FILE) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest['files'][name] = manifest['files']['encoders/courses.npy']
+    with open(served / MANIFEST_FILE, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    dest = tmp_path / 'bundles' / 'model_bundle'
+    os.makedirs(dest.parent)
+    with pytest.raises(ValueError, match='outside the bundle'):
+        fetch_bundle(url, str(dest), str(tmp_path / 'cache'), chunk_size=CHUNK)
+    # Refused before anything but the manifest was fetched or written
+    assert handler.sent == os.path.getsize(served / MANIFEST_FILE)
+    assert os.listdir(dest.parent) == []
+    assert not os.path.exists(tmp_path / 'escaped.npy') and not os.path.exists('/tmp/escaped.npy')
+
+
+def test_fetch_refuses_blob_names_that_are_paths(tmp_path, host, files):
+    url, served, _ = host
+    write_bundle(served, files)
+    with open(served / MANIFEST_FILE) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest['files']['encoders/courses.npy']['sha256'] = '../../escaped'
+    with open(served / MANIFEST_FILE, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    with pytest.raises(ValueError, match='sha256'):
+        fetch_bundle(url, str(tmp_path / 'model_bundle'), str(tmp_path / 'cache'), chunk_size=CHUNK)
+    assert not os.path.exists(tmp_path / 'cache')
+
+
+def test_concurrent_fetches_share_one_download(tmp_path, host, files, monkeypatch):
+    url, served, handler = host
+    swap_in = download_models.swap_in
+
+    def slow_swap_in(staging, path):
+        # Fails if another replica is renaming into the same place at the same time
+        os.close(os.open(path + '.swapping', os.O_CREAT | os.O_EXCL))
+        time.sleep(0.2)
+        swap_in(staging, path)
+        os.remove(path + '.swapping')
+
+    # Inherited by the forked replicas
+    monkeypatch.setattr(download_models, 'swap_in', slow_swap_in)
+    total = write_bundle(served, files)
+    manifest_bytes = os.path.getsize(served / MANIFEST_FILE)
+    dests = [str(tmp_path / 'shared' / 'model_bundle')] * 3 + [str(tmp_path / 'other' / 'model_bundle')]
+    for dest in dests:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+    fetch = partial(fetch_bundle, url, cache_dir=str(tmp_path / 'cache'), workers=2, chunk_size=CHUNK)
+    with multiprocessing.get_context('fork').Pool(len(dests)) as pool:
+        results = pool.map(fetch, dests)
+
+    # Each replica reads the manifest; every file crosses the wire once
+    assert handler.sent == total + len(dests) * manifest_bytes
+    assert sum(stats['downloaded_bytes'] for stats in results) == total
+    for dest in set(dests):
+        verify_bundle(dest)
+    assert not [name for name in os.listdir(tmp_path / 'shared') if '.tmp' in name or '.old' in name]
@@ -0,0 +1,53 @@
+"""FlatForest must score exactly like the sklearn forest it was flattened from"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import FlatForest
+
+
+def make_features(n_rows, rng):
+    """Encoded (percentile, course code, location code) rows, including scores off the 0-100 range"""
+    return np.column_stack([
+        rng.uniform(-5, 105, n_rows).round(4),
+        rng.integers(0, 6, n_rows),
+        rng.integers(0, 5, n_rows),
+    ]).astype(float)
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    X = make_features(4000, rng)
+    # Institutes depend on the score band and location, with noise so leaves hold several classes
+    y = (np.clip(X[:, 0], 0, 99.9) // 10).astype(int) * 3 + X[:, 2].astype(int) % 3 + rng.integers(0, 2, len(X))
+    return RandomForestClassifier(n_estimators=15, random_state=0).fit(X, 100 + y)
+
+
+@pytest.fixture(scope='module')
+def X():
+    # More rows than one block, so the threaded path splits the work
+    return make_features(20000, np.random.default_rng(1))
+
+
+def test_predict_proba_matches_sklearn(model, X):
+    engine = FlatForest.from_sklearn(model)
+    expected = model.predict_proba(X)
+    np.testing.assert_array_equal(engine.classes_, model.classes_)
+    np.testing.assert_array_equal(engine.predict_proba(X), expected)
+    np.testing.assert_array_equal(engine.predict_proba(X, n_jobs=4), expected)
+
+
+def test_saved_forest_matches_sklearn(tmp_path, model, X):
+    FlatForest.from_sklearn(model).save(str(tmp_path / 'forest'))
+    for mmap in (True, False):
+        engine = FlatForest.load(str(tmp_path / 'forest'), mmap=mmap)
+        np.testing.assert_array_equal(engine.predict_proba(X), model.predict_proba(X))
+
+
+def test_lower_precision_leaves_stay_close(model, X):
+    expected = model.predict_proba(X)
+    for leaf_dtype, tolerance in [('float32', 1e-6), ('float16', 1e-3)]:
+        engine = FlatForest.from_sklearn(model, leaf_dtype=leaf_dtype)
+        np.testing.assert_allclose(engine.predict_proba(X), expected, atol=tolerance)
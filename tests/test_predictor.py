@@ -0,0 +1,99 @@
+"""Lookup table hits must give exactly what the model would answer for the same query"""
+
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from forest_engine import FlatForest
+from predictor import INFERENCE, LookupTable, inference_jobs, percentile_grid, predict_one, predict_top_k
+
+N_COURSES = 4
+N_LOCATIONS = 3
+PAIRS = [(0, 0), (0, 2), (1, 1), (3, 0), (3, 2)]
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.uniform(0, 100, 3000).round(4),
+        rng.integers(0, N_COURSES, 3000),
+        rng.integers(0, N_LOCATIONS, 3000),
+    ]).astype(float)
+    y = (X[:, 0] // 10).astype(int) * 2 + X[:, 1].astype(int) % 2 + rng.integers(0, 2, len(X))
+    return FlatForest.from_sklearn(RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y))
+
+
+@pytest.fixture(scope='module')
+def table(model):
+    return LookupTable.build(model, PAIRS, N_COURSES, N_LOCATIONS)
+
+
+def test_every_grid_point_matches_the_model(model, table):
+    grid = percentile_grid(table.step)
+    for course, location in PAIRS:
+        features = np.column_stack([grid, np.full(len(grid), course), np.full(len(grid), location)]).astype(float)
+        codes, probabilities = predict_top_k(model, features)
+        row = table.pair_index[course * N_LOCATIONS + location]
+        np.testing.assert_array_equal(table.codes[row], codes)
+        np.testing.assert_array_equal(table.probabilities[row], probabilities.astype(np.float32))
+
+
+@pytest.mark.parametrize('score', [0.0, 37.3, 58.1, 99.9, 100.0])
+def test_typed_scores_hit_the_table(model, table, score):
+    for course, location in PAIRS:
+        hit = table.get(course, location, score)
+        assert hit is not None
+        codes, probabilities = predict_one(model, None, course, location, score)
+        np.testing.assert_array_equal(hit[0], codes)
+        np.testing.assert_array_equal(hit[1], probabilities.astype(np.float32))
+
+
+@pytest.mark.parametrize('course, location, score', [
+    (0, 0, 37.35), (0, 0, -0.1), (0, 0, 100.1), (2, 1, 50.0), (0, 1, 50.0),
+])
+def test_misses_fall_back_to_the_model(model, table, course, location, score):
+    assert table.get(course, location, score) is None
+    codes, probabilities = predict_one(model, table, course, location, score)
+    expected = predict_top_k(model, np.array([[score, course, location]], dtype=float))
+    np.testing.assert_array_equal(codes, expected[0][0])
+    np.testing.assert_array_equal(probabilities, expected[1][0])
+
+
+def test_saved_table_matches(tmp_path, table):
+    table.save(str(tmp_path / 'lookup'))
+    loaded = LookupTable.load(str(tmp_path / 'lookup'))
+    for name in ['codes', 'probabilities', 'pair_index']:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(table, name))
+    for name in ['n_locations', 'step', 'n_institutes']:
+        assert getattr(loaded, name) == getattr(table, name)
+
+
+def test_check_rejects_other_encoders(model, table):
+    def encoders(n_courses, n_locations, n_institutes):
+        label_encoders = {'Course Name': LabelEncoder().fit([f'Course {i}' for i in range(n_courses)]),
+                          'Location': LabelEncoder().fit([f'City {i}' for i in range(n_locations)])}
+        return label_encoders, LabelEncoder().fit(np.arange(n_institutes))
+
+    table.check(*encoders(N_COURSES, N_LOCATIONS, len(model.classes_)))
+    for sizes in [(N_COURSES + 1, N_LOCATIONS), (N_COURSES, N_LOCATIONS + 1), (N_COURSES * N_LOCATIONS, 1)]:
+        with pytest.raises(ValueError, match='courses or locations'):
+            table.check(*encoders(*sizes, len(model.classes_)))
+    with pytest.raises(ValueError, match='institutes'):
+        table.check(*encoders(N_COURSES, N_LOCATIONS, len(model.classes_) + 1))
+
+
+@pytest.mark.parametrize('n_rows, load, max_jobs, expected', [
+    (1, 0.0, 0, 1), (19999, 0.0, 0, 1), (20000, 0.0, 0, 16), (320000, 0.0, 0, 16),
+    (20000, 12.4, 0, 4), (20000, 20.0, 0, 1), (20000, 0.0, 6, 6),
+])
+def test_big_batches_use_idle_cores(monkeypatch, n_rows, load, max_jobs, expected):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 16)
+    monkeypatch.setattr(os, 'getloadavg', lambda: (load, load, load))
+    monkeypatch.setitem(INFERENCE, 'n_jobs', 0)
+    monkeypatch.setitem(INFERENCE, 'parallel_min_rows', 20000)
+    monkeypatch.setitem(INFERENCE, 'max_jobs', max_jobs)
+    assert inference_jobs(n_rows) == expected
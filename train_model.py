@@ -1,9 +1,64 @@
 import pandas as pd
+import numpy as np
+import os
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import accuracy_score
+import argparse
+import json
 import pickle
+import shutil
+import time
+
+from predictor import LookupTable, DEFAULT_GRID_STEP, LOOKUP_DIR, EVAL_KS, top_k_hit_rates
+from forest_engine import FlatForest, COMPACT_DIR, LEAF_DTYPES
+from model_bundle import BUNDLE_DIR, encoder_fingerprint, save_bundle
+from model_search import DEFAULT_LATENCY_BUDGET_MS
+from cutoff_index import CutoffIndex, CUTOFF_DIR, DEFAULT_BANDWIDTH
+from model_metadata import ModelMetadata, METADATA_FILE
+
+EVAL_REPORT = 'evaluation_report.json'
+# Out-of-bag estimates keep one probability per (training sample, institute);
+# skip them above this many cells (~1.6GB of float64)
+OOB_MAX_CELLS = 200_000_000
+
+parser = argparse.ArgumentParser(description='Train the college prediction model')
+parser.add_argument('--data', default=None,
+                    help='Cleaned dataset (default: dataset_cleaned.parquet, else dataset_cleaned.csv)')
+parser.add_argument('--lookup-step', type=float, default=DEFAULT_GRID_STEP,
+                    help='Percentile grid step for the precomputed lookup table (default: 0.1)')
+parser.add_argument('--lookup-pairs', choices=['observed', 'all'], default='observed',
+                    help='Precompute only course/location pairs seen in the data, or every pair')
+parser.add_argument('--no-lookup', action='store_true',
+                    help='Skip building the precomputed lookup table')
+parser.add_argument('--leaf-dtype', choices=LEAF_DTYPES, default='float64',
+                    help='Precision of the engine\'s sparse leaf probabilities (default: float64)')
+parser.add_argument('--no-cutoff', action='store_true',
+                    help='Skip building the cutoff-index engine')
+parser.add_argument('--cutoff-bandwidth', type=float, default=DEFAULT_BANDWIDTH,
+                    help='Percentile window the cutoff index ranks institutes by (default: 2.0)')
+parser.add_argument('--no-eval', action='store_true',
+                    help='Skip the evaluation stage (out-of-bag and held-out top-k hit rates)')
+parser.add_argument('--search', action='store_true',
+                    help='Search hyperparameters in parallel and train the chosen config')
+parser.add_argument('--latency-budget-ms', type=float, default=DEFAULT_LATENCY_BUDGET_MS,
+                    help='Single-row latency budget used to pick the searched config (default: 10)')
+parser.add_argument('--search-workers', type=int, default=None,
+                    help='Worker processes for --search (default: one per CPU)')
+args = parser.parse_args()
+
+
+def fit_encoder(values):
+    """Label encode a column, reusing categorical codes when the column already has them"""
+    le = LabelEncoder()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # With sorted categories the codes are exactly what LabelEncoder would produce
+        values = values.cat.remove_unused_categories()
+        values = values.cat.reorder_categories(sorted(values.cat.categories))
+        le.classes_ = np.asarray(values.cat.categories, dtype=object)
+        return le, values.cat.codes.astype(np.int64)
+    return le, le.fit_transform(values)
+
 
 print("="*60)
 print("COLLEGE PREDICTION MODEL TRAINING")
@@ -11,7 +66,13 @@ print("="*60)
 
 # Load the cleaned dataset
 print("\n1. Loading cleaned dataset...")
-data = pd.read_csv('dataset_cleaned.csv')
+data_file = args.data or ('dataset_cleaned.parquet' if os.path.exists('dataset_cleaned.parquet')
+                          else 'dataset_cleaned.csv')
+if data_file.endswith('.parquet'):
+    data = pd.read_parquet(data_file)
+else:
+    data = pd.read_csv(data_file)
+print(f"   Source: {data_file}")
 print(f"   Dataset loaded: {len(data)} records")
 print(f"   Unique Institutes: {data['Institute Name'].nunique()}")
 print(f"   Unique Courses: {data['Course Name'].nunique()}")
@@ -22,15 +83,13 @@ print("\n2. Encoding categorical features...")
 label_encoders = {}
 
 for column in ['Course Name', 'Location']:
-    le = LabelEncoder()
-    data[column] = le.fit_transform(data[column])
+    le, data[column] = fit_encoder(data[column])
     label_encoders[column] = le
     print(f"   ✓ {column}: {len(le.classes_)} unique values")
 
 # Encode target variable
 print("\n3. Encoding target variable (Institute Name)...")
-le_target = LabelEncoder()
-data['Institute Name'] = le_target.fit_transform(data['Institute Name'])
+le_target, data['Institute Name'] = fit_encoder(data['Institute Name'])
 print(f"   ✓ Institute Name: {len(le_target.classes_)} unique colleges")
 
 # Filter out institutes with very few samples (need at least 2 for stratified split)
@@ -56,46 +115,150 @@ X_train, X_test, y_train, y_test = train_test_split(
 print(f"   Training set: {len(X_train)} samples")
 print(f"   Testing set: {len(X_test)} samples")
 
+model_params = {'n_estimators': 300, 'max_depth': 30, 'min_samples_leaf': 3}
+
+# Pick the config from the accuracy/latency trade-off on a validation split of the training data
+if args.search:
+    from model_search import candidate_configs, run_search, select_config, format_result
+    print("\n4.5. Searching hyperparameters...")
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+    configs = candidate_configs()
+    print(f"   {len(configs)} configs, {len(X_fit)} training / {len(X_val)} validation samples")
+    search_results = run_search(X_fit, y_fit, X_val, y_val, configs, workers=args.search_workers,
+                                log=lambda line: print(f"   {line}"))
+    best = select_config(search_results, args.latency_budget_ms)
+    model_params = best['params']
+    with open('search_results.json', 'w') as search_file:
+        json.dump({'latency_budget_ms': args.latency_budget_ms, 'selected': best,
+                   'results': search_results}, search_file, indent=2)
+    print(f"   ✓ Pareto front: {sum(result['pareto'] for result in search_results)} configs")
+    print(f"   ✓ Selected: {format_result(best)}")
+    print("   ✓ search_results.json saved")
+
 # Train the model with optimized parameters for better generalization
 print("\n5. Training Random Forest model...")
+use_oob = not args.no_eval and len(X_train) * y_train.nunique() <= OOB_MAX_CELLS
 model = RandomForestClassifier(
-    n_estimators=300,
-    max_depth=30,
+    **model_params,
     min_samples_split=5,
-    min_samples_leaf=3,
     max_features='sqrt',
     class_weight='balanced',
     random_state=42,
+    oob_score=use_oob,
     n_jobs=-1,
     verbose=1
 )
 model.fit(X_train, y_train)
 print("   ✓ Model training complete!")
 
-# Evaluate the model
-print("\n6. Evaluating model performance...")
-train_predictions = model.predict(X_train)
-test_predictions = model.predict(X_test)
-
-train_accuracy = accuracy_score(y_train, train_predictions)
-test_accuracy = accuracy_score(y_test, test_predictions)
-
-print(f"   Training Accuracy: {train_accuracy * 100:.2f}%")
-print(f"   Testing Accuracy: {test_accuracy * 100:.2f}%")
+# Evaluate with out-of-bag estimates and held-out top-k hit rates instead of re-predicting
+# the training set; the app shows 7 colleges, so top-7 is the number that matters
+if args.no_eval:
+    print("\n6. Skipping evaluation (--no-eval)")
+else:
+    print("\n6. Evaluating model performance...")
+    start = time.perf_counter()
+    report = {'n_train': len(X_train), 'n_test': len(X_test), 'params': model_params}
+    if use_oob:
+        oob_proba = model.oob_decision_function_
+        # Samples that were in every bootstrap sample have no out-of-bag votes
+        covered = np.isfinite(oob_proba).all(axis=1) & (oob_proba.sum(axis=1) > 0)
+        report['oob'] = {f'top{k}': rate for k, rate in top_k_hit_rates(
+            oob_proba[covered], model.classes_, y_train.to_numpy()[covered]).items()}
+        report['oob']['coverage'] = float(covered.mean())
+        for k in EVAL_KS:
+            print(f"   Out-of-bag top-{k}: {report['oob'][f'top{k}'] * 100:.2f}%")
+    else:
+        print("   Out-of-bag estimates skipped (training set too large)")
+    report['test'] = {f'top{k}': rate for k, rate in top_k_hit_rates(
+        model.predict_proba(X_test), model.classes_, y_test.to_numpy()).items()}
+    for k in EVAL_KS:
+        print(f"   Held-out top-{k}: {report['test'][f'top{k}'] * 100:.2f}%")
+    report['seconds'] = time.perf_counter() - start
+    with open(EVAL_REPORT, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"   ✓ {EVAL_REPORT} saved ({report['seconds']:.1f}s)")
 
 # Save the model and encoders
-print("\n7. Saving model and encoders...")
+print("\n7. Saving model bundle...")
+# The sklearn model, for compress_model.py, the benchmarks and --sklearn. It lives
+# outside the bundle, so it is stamped like the bundle's forest and refused at
+# load if the encoders change under it
+model.encoder_fingerprint = encoder_fingerprint(label_encoders, le_target)
 with open('model.pkl', 'wb') as model_file:
     pickle.dump(model, model_file)
 print("   ✓ model.pkl saved")
 
-with open('label_encoders.pkl', 'wb') as encoder_file:
-    pickle.dump(label_encoders, encoder_file)
-print("   ✓ label_encoders.pkl saved")
+# What the app serves: the forest flattened into contiguous arrays for the NumPy
+# inference engine, with the encoders and a checksummed manifest
+engine = FlatForest.from_sklearn(model, leaf_dtype=args.leaf_dtype)
+manifest = save_bundle(engine, label_encoders, le_target, BUNDLE_DIR)
+print(f"   ✓ {len(engine.feature)} nodes, {len(engine.leaf_ptr) - 1} leaves across {engine.n_trees} trees")
+print(f"   ✓ {len(engine.leaf_probs)} sparse leaf entries ({args.leaf_dtype}), {engine.nbytes / 1e6:.1f}MB")
+print(f"   ✓ {BUNDLE_DIR} saved (schema {manifest['schema_version']}, "
+      f"encoders {manifest['encoder_fingerprint']}, {len(manifest['files'])} checksummed files)")
+
+# Files of older models that the bundle replaces; nothing reads them once it exists
+for stale in ['label_encoders.pkl', 'target_encoder.pkl', 'forest_arrays']:
+    if os.path.isdir(stale):
+        shutil.rmtree(stale)
+    elif os.path.exists(stale):
+        os.remove(stale)
+    else:
+        continue
+    print(f"   ✓ Removed stale {stale} (replaced by {BUNDLE_DIR})")
+
+# Form options, real counts and the course-by-location index, so the app can
+# render the Predict form without unpickling the encoders
+metadata = ModelMetadata.build(data, label_encoders)
+# Every artifact outside the bundle is stamped with its encoders and refused at load if they differ
+metadata.encoder_fingerprint = manifest['encoder_fingerprint']
+metadata.save(METADATA_FILE)
+print(f"   ✓ {METADATA_FILE} saved ({len(metadata.pairs)} course/location pairs)")
+
+# A compact forest from an earlier model no longer matches the new encoders
+if os.path.exists(COMPACT_DIR):
+    shutil.rmtree(COMPACT_DIR)
+    print(f"   ✓ Removed stale {COMPACT_DIR} (run compress_model.py again)")
+
+# Precompute top-7 results so the app can answer most queries without the forest
+if not args.no_lookup:
+    print("\n8. Building precomputed lookup table...")
+    n_courses = len(label_encoders['Course Name'].classes_)
+    n_locations = len(label_encoders['Location'].classes_)
+    if args.lookup_pairs == 'all':
+        pairs = [(c, l) for c in range(n_courses) for l in range(n_locations)]
+    else:
+        pairs = data[['Course Name', 'Location']].drop_duplicates().to_numpy()
+    # Scored by the bundle's forest, which answers the misses, so both share one leaf precision
+    lookup_table = LookupTable.build(engine, pairs, n_courses, n_locations, step=args.lookup_step)
+    lookup_table.encoder_fingerprint = manifest['encoder_fingerprint']
+    lookup_table.save(LOOKUP_DIR)
+    print(f"   ✓ {len(pairs)} course/location pairs x {lookup_table.n_points} percentiles")
+    print(f"   ✓ {LOOKUP_DIR} saved")
+elif os.path.exists(LOOKUP_DIR):
+    # A table from an earlier model would answer grid queries with that model's institute codes
+    shutil.rmtree(LOOKUP_DIR)
+    print(f"\n   ✓ Removed stale {LOOKUP_DIR} (not rebuilt with --no-lookup)")
 
-with open('target_encoder.pkl', 'wb') as target_file:
-    pickle.dump(le_target, target_file)
-print("   ✓ target_encoder.pkl saved")
+# Sorted percentile arrays per (course, location, institute) for the non-ML engine.
+# Nothing is fitted, so it keeps every admission; bench_cutoff.py builds a
+# training-split index to compare it with the forest on the held-out rows
+if not args.no_cutoff:
+    print("\n9. Building cutoff-index engine...")
+    cutoff_index = CutoffIndex.build(
+        data['Percentile'], data['Course Name'], data['Location'], data['Institute Name'],
+        len(label_encoders['Course Name'].classes_), len(label_encoders['Location'].classes_),
+        len(le_target.classes_), bandwidth=args.cutoff_bandwidth,
+    )
+    cutoff_index.encoder_fingerprint = manifest['encoder_fingerprint']
+    cutoff_index.save(CUTOFF_DIR)
+    print(f"   ✓ {cutoff_index.n_groups} institute cutoff distributions across {cutoff_index.n_pairs} "
+          f"course/location pairs, {cutoff_index.nbytes / 1e6:.1f}MB")
+    print(f"   ✓ {CUTOFF_DIR} saved")
+elif os.path.exists(CUTOFF_DIR):
+    shutil.rmtree(CUTOFF_DIR)
+    print(f"\n   ✓ Removed stale {CUTOFF_DIR} (not rebuilt with --no-cutoff)")
 
 print("\n" + "="*60)
 print("✅ MODEL TRAINING COMPLETE!")